@@ -0,0 +1,84 @@
+"""Time the construction of AD-based models and their first gradient.
+
+Functions are only taped when a derivative that needs them is first
+evaluated, so building a model is cheap and the first gradient only pays for
+taping the objective. The Lagrangian is taped on the first Hessian
+evaluation.
+
+The problem is a chained Rosenbrock function subject to chained quadratic
+equality constraints, in n variables.
+
+Usage: python bench_ad_taping.py [n]
+"""
+
+from nlp.tools.timing import cputime
+import numpy as np
+import sys
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+
+def make_model(base):
+    """Return a constrained chained Rosenbrock problem derived from `base`."""
+
+    class ChainedRosenbrock(base):
+
+        def __init__(self, n):
+            m = n - 1
+            super(ChainedRosenbrock, self).__init__(n, m=m,
+                                                    name='chnrose',
+                                                    x0=-np.ones(n),
+                                                    Lcon=np.zeros(m),
+                                                    Ucon=np.zeros(m))
+
+        def obj(self, x, **kwargs):
+            return (100 * (x[1:] - x[:-1]**2)**2 + (1 - x[:-1])**2).sum()
+
+        def cons(self, x, **kwargs):
+            return x[:-1]**2 + x[1:]**2 - 2
+
+    return ChainedRosenbrock
+
+
+backends = []
+
+try:
+    from nlp.model.adolcmodel import AdolcModel
+    backends.append(('adolc', make_model(AdolcModel)))
+except ImportError:
+    pass
+
+try:
+    from nlp.model.cppadmodel import CppADModel
+    backends.append(('cppad', make_model(CppADModel)))
+except ImportError:
+    pass
+
+try:
+    from nlp.model.algopymodel import AlgopyModel
+    backends.append(('algopy', make_model(AlgopyModel)))
+except ImportError:
+    pass
+
+if not backends:
+    sys.stderr.write('None of ADOL-C, CppAD or AlgoPy is installed\n')
+    sys.exit(1)
+
+sys.stdout.write('%-8s %-8s %-8s %-8s %-8s\n' %
+                 ('backend', 'n', 'init', 'grad', 'hess'))
+
+for (name, model_class) in backends:
+    t = cputime()
+    model = model_class(n)
+    t_init = cputime() - t
+
+    t = cputime()
+    model.grad(model.x0)
+    t_grad = cputime() - t
+
+    t = cputime()
+    model.hess(model.x0, model.pi0)
+    t_hess = cputime() - t
+
+    sys.stdout.write('%-8s %-8d %-8.3f %-8.3f %-8.3f\n' %
+                     (name, n, t_init, t_grad, t_hess))
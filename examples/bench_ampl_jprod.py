@@ -0,0 +1,53 @@
+"""Time Jacobian-vector products of an AMPL model at a fixed point.
+
+Compare 100 products with the transposed Jacobian when the Jacobian is
+evaluated anew for each product (as done by :meth:`AmplModel.jop`) and when
+the Jacobian is evaluated once and reused (as done by :meth:`AmplModel.jprod`
+and :meth:`AmplModel.jtprod`).
+
+Usage: python bench_ampl_jprod.py problem.nl [repeats]
+"""
+
+from nlp.model.amplmodel import AmplModel
+from nlp.tools.timing import cputime
+from pykrylov.linop import CoordLinearOperator
+import numpy as np
+import sys
+
+if len(sys.argv) < 2:
+    sys.stderr.write('Please specify problem name\n')
+    sys.exit(1)
+
+model = AmplModel(sys.argv[1])
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+if model.ncon == 0:
+    sys.stderr.write('Problem %s has no constraints\n' % model.name)
+    sys.exit(1)
+
+x = model.x0
+u = np.ones(model.ncon)
+
+
+def fresh_jtprod(x, u):
+    vals, rows, cols = model.jac(x)
+    J = CoordLinearOperator(vals, rows, cols,
+                            nargin=model.nvar, nargout=model.ncon)
+    return J.T * u
+
+t = cputime()
+for _ in xrange(repeats):
+    fresh_jtprod(x, u)
+t_fresh = cputime() - t
+
+t = cputime()
+for _ in xrange(repeats):
+    model.jtprod(x, u)
+t_cached = cputime() - t
+
+assert np.allclose(fresh_jtprod(x, u), model.jtprod(x, u))
+
+sys.stdout.write('%-12s %-8s %-8s %-8s %-8s\n' %
+                 ('problem', 'nnzj', 'repeats', 'fresh', 'cached'))
+sys.stdout.write('%-12s %-8d %-8d %-8.3f %-8.3f\n' %
+                 (model.name, model.nnzj, repeats, t_fresh, t_cached))
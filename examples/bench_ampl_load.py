@@ -0,0 +1,60 @@
+"""Time the loading of AMPL models.
+
+For each model, report the time to load the `nl` file and the time to set up
+the Hessian sparsity structure, which is deferred until the Hessian is
+first needed. First-order methods only pay for the former.
+
+The bundled `nl` files are used, along with a generalized Rosenbrock problem
+of size n generated by AMPL if the `ampl` executable is available.
+
+Usage: python bench_ampl_load.py [n [file1.nl file2.nl ...]]
+"""
+
+from nlp.model.amplmodel import AmplModel
+from nlp.tools.timing import cputime
+import distutils.spawn
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+test_path = os.path.join(this_path, '..', 'tests', 'model')
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+stubs = sys.argv[2:]
+if not stubs:
+    stubs = sorted(glob.glob(os.path.join(this_path, '*.nl')) +
+                   glob.glob(os.path.join(test_path, '*.nl')))
+
+tmpdir = None
+if distutils.spawn.find_executable('ampl') is not None:
+    tmpdir = tempfile.mkdtemp()
+    mod = os.path.join(tmpdir, 'genrose%d.mod' % n)
+    with open(mod, 'w') as f:
+        f.write("param n := %d;\n" % n)
+        f.write("var x{1..n} := 1 / (n + 1);\n")
+        f.write("minimize f: 1 + sum{i in 1..n-1} (100 * (x[i+1] - x[i]^2)^2"
+                " + (x[i] - 1)^2);\n")
+    AmplModel(mod)  # Only generates the nl file.
+    stubs.append(mod[:-4] + '.nl')
+
+headerfmt = "%-14s %-8s %-8s %-8s %-8s\n"
+fmt = "%-14s %-8d %-8d %-8.3f %-8.3f\n"
+sys.stdout.write(headerfmt % ("problem", "nvar", "ncon", "load", "nnzh"))
+
+for stub in stubs:
+    t = cputime()
+    model = AmplModel(stub)
+    t_load = cputime() - t
+
+    t = cputime()
+    model.nnzh
+    t_nnzh = cputime() - t
+
+    name = os.path.splitext(os.path.basename(stub))[0]
+    sys.stdout.write(fmt % (name, model.nvar, model.ncon, t_load, t_nnzh))
+
+if tmpdir is not None:
+    shutil.rmtree(tmpdir)
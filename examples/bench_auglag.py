@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Compare the slack and slack-free augmented Lagrangian formulations.
+
+The test problem has n variables and n inequality constraints
+
+    minimize    ½ ‖x‖² - Σ xᵢ
+    subject to  xᵢ + xᵢ₊₁² ≤ 1   (i = 1, ..., n, with xₙ₊₁ = x₁).
+
+For each formulation, report the number of variables of the augmented
+Lagrangian, the size of one iterate and the time to evaluate the objective,
+gradient and a Hessian-vector product a number of times.
+
+Usage: python bench_auglag.py [n [repeats]]
+"""
+
+from nlp.model.nlpmodel import NLPModel
+from nlp.model.augmented_lagrangian import AugmentedLagrangian
+from nlp.tools.timing import cputime
+import numpy as np
+import sys
+
+
+class CyclicInequalities(NLPModel):
+
+    def __init__(self, n, **kwargs):
+        super(CyclicInequalities, self).__init__(
+            n=n, m=n, Lcon=-np.inf * np.ones(n), Ucon=np.ones(n), **kwargs)
+
+    def obj(self, x):
+        return 0.5 * np.dot(x, x) - np.sum(x)
+
+    def grad(self, x):
+        return x - 1
+
+    def cons(self, x):
+        return x + np.roll(x, -1)**2
+
+    def jprod(self, x, v):
+        return v + 2 * np.roll(x * v, -1)
+
+    def jtprod(self, x, v):
+        return v + 2 * x * np.roll(v, 1)
+
+    def hprod(self, x, z, v):
+        return v - 2 * np.roll(z, 1) * v
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+nlp = CyclicInequalities(n)
+headerfmt = "%-10s %-9s %-9s %-8s %-8s %-8s\n"
+header = headerfmt % ("slack", "nvar", "MB/iter", "obj", "grad", "hprod")
+format = "%-10s %-9d %-9.2f %-8.3f %-8.3f %-8.3f\n"
+sys.stdout.write(header)
+
+for slack in [True, False]:
+    model = AugmentedLagrangian(nlp, slack=slack)
+    model.pi = np.ones(model.pi.size)
+    x = 0.5 * np.ones(model.nvar)
+    v = np.ones(model.nvar)
+
+    times = []
+    for func, args in [(model.obj, (x,)),
+                       (model.grad, (x,)),
+                       (model.hprod, (x, None, v))]:
+        t = cputime()
+        for _ in xrange(repeats):
+            func(*args)
+        times.append(cputime() - t)
+
+    sys.stdout.write(format % (slack, model.nvar, x.nbytes / 1.0e+6,
+                               times[0], times[1], times[2]))
@@ -0,0 +1,143 @@
+"""Time sparse Jacobians and Hessians recovered by graph coloring.
+
+Two hand-coded problems that only implement products with their Jacobian and
+Hessian are solved for growing n:
+
+* a banded problem with a pentadiagonal Hessian and a Jacobian of bandwidth
+  three,
+* an arrowhead problem whose Hessian and Jacobian have a dense last column.
+
+For each, report the number of colors, the time to color the sparsity
+patterns, and the time to assemble the Jacobian and Hessian from one product
+per color, compared to one product per column.
+
+Usage: python bench_coloring.py [nmax]
+"""
+
+from nlp.model.nlpmodel import NLPModel
+from nlp.model.coloredmodel import ColoredNLPModel
+from nlp.tools.timing import cputime
+import numpy as np
+import sys
+
+nmax = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+class Banded(NLPModel):
+    """f(x) = 1/4 sum (x[i] + x[i+1] + x[i+2])^4,
+    c[i](x) = x[i]^2 - x[i+1] * x[i+2] = 0."""
+
+    def __init__(self, n, **kwargs):
+        super(Banded, self).__init__(n, m=n - 2, Lcon=np.zeros(n - 2),
+                                     Ucon=np.zeros(n - 2), **kwargs)
+
+    def pattern(self):
+        i = np.arange(self.n)
+        hrows = np.concatenate((i, i[1:], i[2:]))
+        hcols = np.concatenate((i, i[:-1], i[:-2]))
+        i = np.arange(self.m)
+        jrows = np.concatenate((i, i, i))
+        jcols = np.concatenate((i, i + 1, i + 2))
+        return {'hess_pattern': (hrows, hcols), 'jac_pattern': (jrows, jcols)}
+
+    def jprod(self, x, v):
+        return 2 * x[:-2] * v[:-2] - x[2:] * v[1:-1] - x[1:-1] * v[2:]
+
+    def jtprod(self, x, w):
+        Jtw = np.zeros(self.n)
+        Jtw[:-2] += 2 * x[:-2] * w
+        Jtw[1:-1] -= x[2:] * w
+        Jtw[2:] -= x[1:-1] * w
+        return Jtw
+
+    def hprod(self, x, z, v):
+        s = x[:-2] + x[1:-1] + x[2:]
+        w = 3 * s**2 * (v[:-2] + v[1:-1] + v[2:])
+        Hv = np.zeros(self.n)
+        Hv[:-2] += w - 2 * z * v[:-2]
+        Hv[1:-1] += w + z * v[2:]
+        Hv[2:] += w + z * v[1:-1]
+        return Hv
+
+
+class Arrowhead(NLPModel):
+    """f(x) = sum (x[i]^2 - x[n-1])^2, c[i](x) = x[i] * x[n-1] = 0."""
+
+    def __init__(self, n, **kwargs):
+        super(Arrowhead, self).__init__(n, m=n - 1, Lcon=np.zeros(n - 1),
+                                        Ucon=np.zeros(n - 1), **kwargs)
+
+    def pattern(self):
+        i = np.arange(self.n)
+        hrows = np.concatenate((i, (self.n - 1) * np.ones(self.n - 1,
+                                                           dtype=np.int)))
+        hcols = np.concatenate((i, i[:-1]))
+        i = np.arange(self.m)
+        jrows = np.concatenate((i, i))
+        jcols = np.concatenate((i, (self.n - 1) * np.ones(self.m,
+                                                          dtype=np.int)))
+        return {'hess_pattern': (hrows, hcols), 'jac_pattern': (jrows, jcols)}
+
+    def jprod(self, x, v):
+        return x[-1] * v[:-1] + x[:-1] * v[-1]
+
+    def jtprod(self, x, w):
+        return np.append(x[-1] * w, np.dot(x[:-1], w))
+
+    def hprod(self, x, z, v):
+        n = self.n
+        d = 12 * x[:-1]**2 - 4 * x[-1]
+        o = -4 * x[:-1] - z
+        return np.append(d * v[:-1] + o * v[-1],
+                         np.dot(o, v[:-1]) + 2 * (n - 1) * v[-1])
+
+
+class ColoredBanded(ColoredNLPModel, Banded):
+    pass
+
+
+class ColoredArrowhead(ColoredNLPModel, Arrowhead):
+    pass
+
+
+def by_columns(model, x, z):
+    """Assemble the Jacobian and Hessian with one product per column."""
+    e = np.zeros(model.n)
+    for j in xrange(model.n):
+        e[j] = 1
+        model.jprod(x, e)
+        model.hprod(x, z, e)
+        e[j] = 0
+
+
+sys.stdout.write('%-10s %-7s %-4s %-4s %-8s %-8s %-8s\n' %
+                 ('problem', 'n', 'pJ', 'pH', 'color', 'colored', 'columns'))
+
+n = 100
+while n <= nmax:
+    for (name, model_class) in (('banded', ColoredBanded),
+                                ('arrowhead', ColoredArrowhead)):
+        pattern = model_class(n).pattern()
+        t = cputime()
+        model = model_class(n, x0=np.linspace(1, 2, n), **pattern)
+        t_color = cputime() - t
+
+        x = model.x0
+        z = np.ones(model.m)
+        t = cputime()
+        model.jac(x)
+        model.hess(x, z)
+        t_colored = cputime() - t
+
+        if n <= 10000:
+            t = cputime()
+            by_columns(model, x, z)
+            t_columns = '%-8.3f' % (cputime() - t)
+        else:
+            t_columns = '-'
+
+        sys.stdout.write('%-10s %-7d %-4d %-4d %-8.3f %-8.3f %-8s\n' %
+                         (name, n, model.jac_colors.max() + 1,
+                          model.hess_colors.max() + 1, t_color, t_colored,
+                          t_columns))
+    n *= 10
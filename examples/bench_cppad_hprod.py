@@ -0,0 +1,70 @@
+"""Time the truncated CG inner loop on a model differentiated by CppAD.
+
+Solve the trust-region subproblem at the initial point of a constrained
+chained Rosenbrock problem in n variables with :class:`TruncatedCG` and
+report how much of the time is spent computing Hessian-vector products in
+CppAD, first repeating the zero-order sweep at every product as was done
+previously, then reusing it across products.
+
+Usage: python bench_cppad_hprod.py [n [radius]]
+"""
+
+from nlp.model.cppadmodel import CppADModel
+from nlp.model.nlpmodel import QPModel
+from nlp.optimize.pcg import TruncatedCG
+from nlp.tools.timing import cputime
+from pykrylov.linop import LinearOperator
+import numpy as np
+import sys
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+radius = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+
+class ChainedRosenbrock(CppADModel):
+
+    def __init__(self, n):
+        m = n - 1
+        super(ChainedRosenbrock, self).__init__(n, m=m, name='chnrose',
+                                                x0=-np.ones(n),
+                                                pi0=np.ones(m),
+                                                Lcon=np.zeros(m),
+                                                Ucon=np.zeros(m))
+
+    def obj(self, x, **kwargs):
+        return (100 * (x[1:] - x[:-1]**2)**2 + (1 - x[:-1])**2).sum()
+
+    def cons(self, x, **kwargs):
+        return x[:-1]**2 + x[1:]**2 - 2
+
+
+model = ChainedRosenbrock(n)
+x = model.x0
+z = model.pi0
+g = model.grad(x)
+model.hess(x, z)  # Tape the Lagrangian outside of the timings.
+
+sys.stdout.write('%-8s %-6s %-6s %-8s %-8s %-6s\n' %
+                 ('sweeps', 'n', 'nprod', 'cg', 'hprod', '%ad'))
+
+for reuse in (False, True):
+    timer = {'hprod': 0.0, 'nprod': 0}
+
+    def matvec(v):
+        if not reuse:
+            model._cppad_sweeps.clear()
+        t = cputime()
+        Hv = model.hprod(x, z, v)
+        timer['hprod'] += cputime() - t
+        timer['nprod'] += 1
+        return Hv
+
+    H = LinearOperator(n, n, matvec, symmetric=True, dtype=np.float)
+    cg = TruncatedCG(QPModel(g, H))
+    t = cputime()
+    cg.solve(radius=radius)
+    t_cg = cputime() - t
+
+    sys.stdout.write('%-8s %-6d %-6d %-8.3f %-8.3f %-6.1f\n' %
+                     ('reuse' if reuse else 'repeat', n, timer['nprod'], t_cg,
+                      timer['hprod'], 100 * timer['hprod'] / max(t_cg, 1e-8)))
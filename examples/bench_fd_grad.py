@@ -0,0 +1,71 @@
+"""Time finite-difference gradients evaluated on pools of workers.
+
+The objective is a stand-in for an expensive simulation. In 'cpu' mode,
+each evaluation integrates a small system of differential equations with a
+pure Python loop. In 'wait' mode, it sleeps for a fixed time, as when the
+simulation runs elsewhere. The wall-clock time of a forward-difference
+gradient is reported for thread and process pools of growing size.
+
+Process pools should speed up 'cpu' evaluations up to the number of cores,
+whereas thread pools only speed up 'wait' evaluations.
+
+Usage: python bench_fd_grad.py [cpu|wait [n [maxworkers]]]
+"""
+
+from nlp.model.nlpmodel import UnconstrainedNLPModel
+from nlp.model.fdmodel import FDGradientModel
+import multiprocessing
+import numpy as np
+import sys
+import time
+
+mode = sys.argv[1] if len(sys.argv) > 1 else 'cpu'
+n = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+maxworkers = int(sys.argv[3]) if len(sys.argv) > 3 \
+    else 2 * multiprocessing.cpu_count()
+
+
+class Simulation(UnconstrainedNLPModel):
+    """Least-squares misfit of the final state of a damped oscillator chain.
+
+    Each variable is the stiffness of a spring.
+    """
+
+    def __init__(self, n, mode='cpu', **kwargs):
+        super(Simulation, self).__init__(n, x0=np.ones(n), **kwargs)
+        self.mode = mode
+
+    def obj(self, x):
+        if self.mode == 'wait':
+            time.sleep(0.05)
+            return float(np.dot(x - 2, x - 2))
+        k = list(x)
+        u = [0.0] * self.n
+        v = [1.0] * self.n
+        dt = 1.0e-3
+        for _ in xrange(2000):
+            for i in xrange(self.n):
+                a = -k[i] * u[i] - 0.1 * v[i]
+                v[i] += dt * a
+                u[i] += dt * v[i]
+        return sum((ui - 0.5)**2 for ui in u)
+
+
+model = Simulation(n, mode=mode)
+x = model.x0
+
+sys.stdout.write('%-5s %-4s %-8s %-8s %-8s\n' %
+                 ('mode', 'n', 'pool', 'workers', 'wall'))
+
+for processes in (False, True):
+    workers = 1
+    while workers <= maxworkers:
+        fd = FDGradientModel(model, workers=workers, processes=processes)
+        t = time.time()
+        fd.grad(x)
+        wall = time.time() - t
+        fd.close()
+        sys.stdout.write('%-5s %-4d %-8s %-8d %-8.3f\n' %
+                         (mode, n, 'process' if processes else 'thread',
+                          workers, wall))
+        workers *= 2
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Compare Levenberg-Marquardt and L-BFGS on nonlinear least squares.
+
+Each problem is solved by the trust-region Gauss-Newton method of
+`LevenbergMarquardt` and by `LBFGS`. For each solver, report the final
+objective and gradient norm, the number of iterations, the number of
+evaluations of the residuals and of their Jacobian, and the time.
+
+Usage: python bench_lsq.py [n]
+"""
+
+from nlp.model.lsqmodel import LSQModel
+from nlp.model.qnmodel import QuasiNewtonModel
+from nlp.optimize.lm import LevenbergMarquardt
+from nlp.optimize.lbfgs import LBFGS
+from pykrylov.linop import InverseLBFGSOperator
+import numpy as np
+import scipy.sparse as sp
+import sys
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+
+class ExpSum(LSQModel):
+    """Fit a sum of two decaying exponentials and a constant to data."""
+
+    def __init__(self, **kwargs):
+        self.t = np.linspace(0, 10, 100)
+        self.y = self.model(np.array([0.5, 1.5, -1.0, 0.3, 0.8]))
+        x0 = np.array([0.5, 1.0, -1.0, 0.1, 0.5])
+        super(ExpSum, self).__init__(5, self.t.size, name='expsum', x0=x0,
+                                     **kwargs)
+
+    def model(self, x):
+        e1 = np.exp(-x[3] * self.t)
+        e2 = np.exp(-x[4] * self.t)
+        return x[0] + x[1] * e1 + x[2] * e2
+
+    def res(self, x):
+        return self.model(x) - self.y
+
+    def jac_res(self, x):
+        e1 = np.exp(-x[3] * self.t)
+        e2 = np.exp(-x[4] * self.t)
+        return np.column_stack((np.ones(self.t.size), e1, e2,
+                                -x[1] * self.t * e1, -x[2] * self.t * e2))
+
+
+class Gaussians(LSQModel):
+    """Fit three Gaussian peaks on a linear background to noisy data."""
+
+    def __init__(self, **kwargs):
+        self.t = np.linspace(0, 10, 250)
+        xs = np.array([1.0, 0.1, 4.0, 2.0, 0.6, 3.0, 5.0, 0.5, 2.0, 7.5, 0.8])
+        np.random.seed(0)
+        self.y = self.model(xs) + 0.01 * np.random.standard_normal(self.t.size)
+        x0 = np.array([0.5, 0., 3.0, 1.8, 1.0, 2.5, 5.3, 1.0, 1.5, 7.0, 1.0])
+        super(Gaussians, self).__init__(11, self.t.size, name='gaussians',
+                                        x0=x0, **kwargs)
+
+    def peaks(self, x):
+        return [(x[k], x[k + 1], x[k + 2],
+                 np.exp(-((self.t - x[k + 1]) / x[k + 2])**2))
+                for k in (2, 5, 8)]
+
+    def model(self, x):
+        return x[0] + x[1] * self.t + sum(a * e for (a, c, w, e)
+                                          in self.peaks(x))
+
+    def res(self, x):
+        return self.model(x) - self.y
+
+    def jac_res(self, x):
+        cols = [np.ones(self.t.size), self.t]
+        for (a, c, w, e) in self.peaks(x):
+            u = (self.t - c) / w
+            cols += [e, 2 * a * e * u / w, 2 * a * e * u**2 / w]
+        return np.column_stack(cols)
+
+
+class ChainedRosenbrock(LSQModel):
+    """The chained Rosenbrock function as a sum of squares.
+
+    The Jacobian of the residuals is a sparse matrix.
+    """
+
+    def __init__(self, n, **kwargs):
+        x0 = -np.ones(n)
+        x0[::2] = -1.2
+        super(ChainedRosenbrock, self).__init__(n, 2 * (n - 1),
+                                                name='chnrose', x0=x0,
+                                                **kwargs)
+
+    def res(self, x):
+        return np.concatenate((10 * (x[1:] - x[:-1]**2), 1 - x[:-1]))
+
+    def jac_res(self, x):
+        m = self.n - 1
+        i = np.arange(m)
+        rows = np.concatenate((i, i, m + i))
+        cols = np.concatenate((i, i + 1, i))
+        vals = np.concatenate((-20 * x[:-1], 10 * np.ones(m), -np.ones(m)))
+        return sp.csr_matrix((vals, (rows, cols)), shape=(2 * m, self.n))
+
+
+def quasi_newton(cls):
+    """Return a version of `cls` with an inverse L-BFGS Hessian."""
+
+    class QN(QuasiNewtonModel, cls):
+        pass
+
+    return QN
+
+
+problems = [(ExpSum, ()), (Gaussians, ()), (ChainedRosenbrock, (n,))]
+
+hdr = "%-10s %-6s %-6s %-8s %-7s %-5s %-5s %-5s %-6s"
+fmt = "%-10s %-6s %-6d %-8.1e %-7.1e %-5d %-5d %-5d %-6.3f"
+sys.stdout.write((hdr + "\n") % ("problem", "solver", "nvar", "f", "|g|",
+                                 "iter", "#r", "#J", "time"))
+
+for (cls, args) in problems:
+    model = cls(*args)
+    lm = LevenbergMarquardt(model)
+    lm.solve()
+    sys.stdout.write((fmt + "\n") % (model.name, "lm", model.n, lm.f,
+                                     lm.gNorm, lm.iter, model.res.ncalls,
+                                     model.jac_res.ncalls, lm.tsolve))
+
+    model = quasi_newton(cls)(*args, H=InverseLBFGSOperator, scaling=True,
+                              npairs=5)
+    lbfgs = LBFGS(model)
+    lbfgs.solve()
+    sys.stdout.write((fmt + "\n") % (model.name, "lbfgs", model.n, lbfgs.f,
+                                     lbfgs.g_norm, lbfgs.iter,
+                                     model.res.ncalls, model.jac_res.ncalls,
+                                     lbfgs.tsolve))
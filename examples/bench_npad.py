@@ -0,0 +1,101 @@
+"""Compare array-level AD with the scalar AD backends.
+
+The problem is a chained Rosenbrock function subject to chained quadratic
+equality constraints, in n variables, written with NumPy array operations.
+For each available backend and growing n, report the time of the first
+gradient, which includes taping, and the average times of a gradient, a
+Lagrangian Hessian-vector product and a Jacobian-vector product at new
+points.
+
+Usage: python bench_npad.py [nmax]
+"""
+
+from nlp.model.npadmodel import NumPyADModel
+from nlp.tools.timing import cputime
+import numpy as np
+import sys
+
+nmax = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+nrep = 10
+
+
+def make_model(base):
+    """Return a constrained chained Rosenbrock problem derived from `base`."""
+
+    class ChainedRosenbrock(base):
+
+        def __init__(self, n):
+            m = n - 1
+            super(ChainedRosenbrock, self).__init__(n, m=m,
+                                                    name='chnrose',
+                                                    x0=-np.ones(n),
+                                                    Lcon=np.zeros(m),
+                                                    Ucon=np.zeros(m))
+
+        def obj(self, x, **kwargs):
+            return (100 * (x[1:] - x[:-1]**2)**2 + (1 - x[:-1])**2).sum()
+
+        def cons(self, x, **kwargs):
+            return x[:-1]**2 + x[1:]**2 - 2
+
+    return ChainedRosenbrock
+
+
+backends = [('numpy', make_model(NumPyADModel), nmax)]
+
+# Scalar tapes are too slow for the largest problems.
+try:
+    from nlp.model.adolcmodel import AdolcModel
+    backends.append(('adolc', make_model(AdolcModel), 10000))
+except ImportError:
+    pass
+
+try:
+    from nlp.model.cppadmodel import CppADModel
+    backends.append(('cppad', make_model(CppADModel), 10000))
+except ImportError:
+    pass
+
+try:
+    from nlp.model.algopymodel import AlgopyModel
+    backends.append(('algopy', make_model(AlgopyModel), 1000))
+except ImportError:
+    pass
+
+sys.stdout.write('%-8s %-7s %-8s %-8s %-8s %-8s\n' %
+                 ('backend', 'n', 'tape', 'grad', 'hprod', 'jprod'))
+
+n = 100
+while n <= nmax:
+    for (name, model_class, nlim) in backends:
+        if n > nlim:
+            continue
+        model = model_class(n)
+        x = model.x0
+        z = np.ones(model.m)
+
+        t = cputime()
+        model.grad(x)
+        model.hprod(x, z, x)
+        model.jprod(x, x)
+        t_tape = cputime() - t
+
+        points = [x + 0.1 * (k + 1) for k in xrange(nrep)]
+        t = cputime()
+        for y in points:
+            model.grad(y)
+        t_grad = (cputime() - t) / nrep
+
+        t = cputime()
+        for y in points:
+            model.hprod(y, z, y)
+        t_hprod = (cputime() - t) / nrep
+
+        t = cputime()
+        for y in points:
+            model.jprod(y, y)
+        t_jprod = (cputime() - t) / nrep
+
+        sys.stdout.write('%-8s %-7d %-8.4f %-8.4f %-8.4f %-8.4f\n' %
+                         (name, n, t_tape, t_grad, t_hprod, t_jprod))
+    n *= 10
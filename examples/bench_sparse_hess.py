@@ -0,0 +1,79 @@
+"""Time repeated Hessian evaluations with PySparse and CySparse matrices.
+
+Compare the evaluation of the Hessian when a new sparse matrix is allocated
+and filled at each evaluation and when a single matrix is allocated on the
+first evaluation and only its values are updated afterwards (as done by
+:class:`PySparseAmplModel` and :class:`CySparseAmplModel`).
+
+Usage: python bench_sparse_hess.py problem.nl [repeats]
+"""
+
+from nlp.model.amplmodel import AmplModel
+from nlp.tools.timing import cputime
+import sys
+
+if len(sys.argv) < 2:
+    sys.stderr.write('Please specify problem name\n')
+    sys.exit(1)
+
+stub = sys.argv[1]
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+backends = []
+
+try:
+    from pysparse.sparse import PysparseMatrix as psp
+    from nlp.model.pysparsemodel import PySparseAmplModel
+
+    def pysparse_fresh(model, x, z):
+        vals, rows, cols = AmplModel.hess(model, x, z)
+        H = psp(size=model.nvar, sizeHint=vals.size, symmetric=True)
+        H.put(vals, rows, cols)
+        return H
+
+    backends.append(('pysparse', PySparseAmplModel, pysparse_fresh))
+except ImportError:
+    pass
+
+try:
+    from cysparse.sparse.ll_mat import LLSparseMatrix
+    import cysparse.common_types.cysparse_types as types
+    from nlp.model.cysparsemodel import CySparseAmplModel
+
+    def cysparse_fresh(model, x, z):
+        vals, rows, cols = AmplModel.hess(model, x, z)
+        H = LLSparseMatrix(size=model.nvar, size_hint=vals.size,
+                           store_symmetric=True, itype=types.INT64_T,
+                           dtype=types.FLOAT64_T)
+        H.put_triplet(rows, cols, vals)
+        return H
+
+    backends.append(('cysparse', CySparseAmplModel, cysparse_fresh))
+except ImportError:
+    pass
+
+if not backends:
+    sys.stderr.write('Neither PySparse nor CySparse is installed\n')
+    sys.exit(1)
+
+sys.stdout.write('%-12s %-9s %-8s %-8s %-8s %-8s\n' %
+                 ('problem', 'backend', 'nnzh', 'repeats', 'fresh', 'refresh'))
+
+for (name, model_class, fresh_hess) in backends:
+    model = model_class(stub)
+    x = model.x0
+    z = model.pi0
+
+    t = cputime()
+    for _ in xrange(repeats):
+        fresh_hess(model, x, z)
+    t_fresh = cputime() - t
+
+    t = cputime()
+    for _ in xrange(repeats):
+        model.hess(x, z)
+    t_refresh = cputime() - t
+
+    sys.stdout.write('%-12s %-9s %-8d %-8d %-8.3f %-8.3f\n' %
+                     (model.name, name, model.nnzh, repeats,
+                      t_fresh, t_refresh))
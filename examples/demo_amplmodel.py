@@ -100,15 +100,15 @@ print
 for i in xrange(min(ncon, 5)):
     model.compute_scaling_cons(reset=True)
     sgi = model.sigrad(i, x0)
-    imax = max(sgi.values, key=lambda x: abs(sgi.values.get(x)))
-    imin = min(sgi.values, key=lambda x: abs(sgi.values.get(x)))
+    imax = sgi.ind[np.argmax(np.abs(sgi.val))]
+    imin = sgi.ind[np.argmin(np.abs(sgi.val))]
     print 'Constraint %3i: ' % i,
     print ' Max/Min gradient (unscaled): %12.5e (%3i) / %12.5e (%3i)' \
         % (sgi[imax], imax, sgi[imin], imin)
     model.compute_scaling_cons()
     sgi = model.sigrad(i, x0)
-    imax = max(sgi.values, key=lambda x: abs(sgi.values.get(x)))
-    imin = min(sgi.values, key=lambda x: abs(sgi.values.get(x)))
+    imax = sgi.ind[np.argmax(np.abs(sgi.val))]
+    imin = sgi.ind[np.argmin(np.abs(sgi.val))]
     print 'Constraint %3i: ' % i,
     print ' Max/Min gradient ( scaled): %12.5e (%3i) / %12.5e (%3i)' \
         % (sgi[imax], imax, sgi[imin], imin)
@@ -1,17 +1,35 @@
 #!/usr/bin/env python
 """Simple AMPL driver for the derivative checker."""
 
-from nlp.model.pysparsemodel import PySparseAmplModel
+from argparse import ArgumentParser
 from nlp.tools.dercheck import DerivativeChecker
 from nlp.tools.logs import config_logger
-import sys
 
-if len(sys.argv) == 1:
-    raise ValueError("Please supply problem name as argument")
+desc = """Check the derivatives of an AMPL model at its starting point by
+finite differences."""
+
+# Define allowed command-line options.
+parser = ArgumentParser(description=desc)
+group = parser.add_mutually_exclusive_group()
+group.add_argument("-s", "--sparse", action="store_true", dest="sparse",
+                   default=False,
+                   help="check the Jacobian and Hessians by compressed " +
+                   "finite differences over their sparsity structure")
+group.add_argument("-r", "--random", type=int, default=0, dest="random",
+                   help="check along this many random directions only")
+parser.add_argument("problem", help="AMPL problem name")
+args = parser.parse_args()
 
 # Create root logger.
 log = config_logger("nlp.der", "%(name)-10s %(levelname)-8s %(message)s")
 
-nlp = PySparseAmplModel(sys.argv[1])
+if args.sparse:
+    # Derivatives in coordinate format expose their sparsity structure.
+    from nlp.model.amplmodel import AmplModel
+    nlp = AmplModel(args.problem)
+else:
+    from nlp.model.pysparsemodel import PySparseAmplModel
+    nlp = PySparseAmplModel(args.problem)
+
 dcheck = DerivativeChecker(nlp, nlp.x0)
-dcheck.check()
+dcheck.check(sparse=args.sparse, random=args.random)
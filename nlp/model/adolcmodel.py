@@ -5,6 +5,7 @@ from nlp.model.qnmodel import QuasiNewtonModel
 from nlp.model.pysparsemodel import PySparseNLPModel
 from nlp.model.scipymodel import SciPyNLPModel
 import numpy as np
+import weakref
 
 try:
     import adolc
@@ -12,6 +13,35 @@ except:
     print "ADOL-C is not installed"
 
 
+# ADOL-C trace ids are global. Ids are allocated here for all models and
+# returned to the pool when the model that holds them is garbage collected.
+_free_trace_ids = []
+_trace_id_count = [0]
+_trace_id_owners = set()
+
+
+def new_trace_id():
+    """Return an ADOL-C trace id that is not used by any other model."""
+    if _free_trace_ids:
+        return _free_trace_ids.pop()
+    _trace_id_count[0] += 1
+    return _trace_id_count[0]
+
+
+def release_trace_ids(ids):
+    """Return the trace ids in `ids` to the pool of available ids."""
+    _free_trace_ids.extend(ids)
+    del ids[:]
+
+
+def _release_when_collected(model, ids):
+    """Release the trace ids in `ids` when `model` is garbage collected."""
+    def callback(ref):
+        _trace_id_owners.discard(ref)
+        release_trace_ids(ids)
+    _trace_id_owners.add(weakref.ref(model, callback))
+
+
 class AdolcModel(NLPModel):
     """Model with derivatives computed by ADOL-C.
 
@@ -19,47 +49,52 @@ class AdolcModel(NLPModel):
     are computed via algorithmic differentiation through ADOL-C. By
     default, the Jacobian and Hessian are returned in dense format.
     See the documentation of `NLPModel` for further information.
+
+    Each function is taped on the first evaluation of a derivative that
+    needs it, at the point where that derivative is requested. In
+    particular, the Lagrangian is only taped when a Hessian is needed.
     """
 
     def __init__(self, n, m=0, name='Adolc-Generic', **kwargs):
         """Initialize a model with `n` variables and `m` constraints."""
         super(AdolcModel, self).__init__(n, m=m, name=name, **kwargs)
 
-        # Trace objective and constraint functions.
         self._obj_trace_id = None
-        self._trace_obj(self.x0)
-
         self._con_trace_id = None
         self._cons_pos_trace_id = None
-        if self.m > 0:
-            self._trace_con(self.x0)
-            self._trace_cons_pos(self.x0)
-
         self._lag_trace_id = None
-        self._trace_lag(self.x0, self.pi0)
+
+        self._trace_ids = []
+        _release_when_collected(self, self._trace_ids)
 
     def _get_trace_id(self):
         """Return an available trace id."""
-        return 10 * self._id
+        trace_id = new_trace_id()
+        self._trace_ids.append(trace_id)
+        return trace_id
 
     @property
     def obj_trace_id(self):
         """Return the trace id for the objective function."""
+        self._trace_obj(self.x0)
         return self._obj_trace_id
 
     @property
     def con_trace_id(self):
         """Return the trace id for the constraints."""
+        self._trace_con(self.x0)
         return self._con_trace_id
 
     @property
     def cons_pos_trace_id(self):
         """Return the trace id for the reformulated constraints."""
+        self._trace_cons_pos(self.x0)
         return self._cons_pos_trace_id
 
     @property
     def lag_trace_id(self):
         """Return the trace id for the Lagrangian."""
+        self._trace_lag(self.x0, self.pi0)
         return self._lag_trace_id
 
     def _trace_obj(self, x):
@@ -74,7 +109,7 @@ class AdolcModel(NLPModel):
 
     def _trace_con(self, x):
         if self._con_trace_id is None and self.m > 0:
-            self._con_trace_id = self._get_trace_id() + 1
+            self._con_trace_id = self._get_trace_id()
             adolc.trace_on(self._con_trace_id)
             x = adolc.adouble(x)
             adolc.independent(x)
@@ -83,10 +118,8 @@ class AdolcModel(NLPModel):
             adolc.trace_off()
 
     def _trace_cons_pos(self, x):
-        if self._con_trace_id is None:
-            self._trace_con(x)
         if self._cons_pos_trace_id is None and self.m > 0:
-            self._cons_pos_trace_id = self._get_trace_id() + 2
+            self._cons_pos_trace_id = self._get_trace_id()
             adolc.trace_on(self._cons_pos_trace_id)
             x = adolc.adouble(x)
             adolc.independent(x)
@@ -95,16 +128,14 @@ class AdolcModel(NLPModel):
             adolc.trace_off()
 
     def _trace_lag(self, x, z):
-        self._trace_obj(x)
-        self._trace_con(x)
-        self._trace_cons_pos(x)
         unconstrained = self.m == 0 and self.nbounds == 0
         if self._lag_trace_id is None:
             if unconstrained:
+                self._trace_obj(x)
                 self._lag_trace_id = self._obj_trace_id
                 return
 
-            self._lag_trace_id = self._get_trace_id() + 3
+            self._lag_trace_id = self._get_trace_id()
             adolc.trace_on(self._lag_trace_id)
             x = adolc.adouble(x)
             z = adolc.adouble(z)
@@ -116,6 +147,7 @@ class AdolcModel(NLPModel):
 
     def _adolc_obj(self, x):
         """Evaluate the objective function."""
+        self._trace_obj(x)
         return adolc.function(self._obj_trace_id, x)
 
     def grad(self, x, **kwargs):
@@ -124,12 +156,14 @@ class AdolcModel(NLPModel):
 
     def _adolc_grad(self, x, **kwargs):
         """Evaluate the objective gradient."""
+        self._trace_obj(x)
         return adolc.gradient(self._obj_trace_id, x)
 
     def hess(self, x, z=None, **kwargs):
         """Return the dense Hessian of the objective at x."""
         if z is None:
             z = np.zeros(self.ncon)
+        self._trace_lag(x, z)
         xz = np.concatenate((x, z))
         H = adolc.hessian(self._lag_trace_id, xz)
         return H[:self.nvar, :self.nvar]
@@ -138,30 +172,56 @@ class AdolcModel(NLPModel):
         """Return the Hessian-vector product at (x,z) with v."""
         if z is None:
             z = np.zeros(self.ncon)
+        self._trace_lag(x, z)
         xz = np.concatenate((x, z))
         v0 = np.concatenate((v, np.zeros(self.ncon)))
         return adolc.hess_vec(self._lag_trace_id, xz, v0)[:self.nvar]
 
     def _adolc_cons(self, x, **kwargs):
         """Evaluate the constraints from the ADOL-C tape."""
+        self._trace_con(x)
         return adolc.function(self._con_trace_id, x)
 
     def jac(self, x, **kwargs):
         """Return dense constraints Jacobian at x."""
+        self._trace_con(x)
         return adolc.jacobian(self._con_trace_id, x)
 
     def jac_pos(self, x, **kwargs):
         """Return dense Jacobian of reformulated constraints at x."""
+        self._trace_cons_pos(x)
         return adolc.jacobian(self._cons_pos_trace_id, x)
 
     def jprod(self, x, v, **kwargs):
         """Return the product of v with the Jacobian at x."""
+        self._trace_con(x)
         return adolc.jac_vec(self._con_trace_id, x, v)
 
     def jtprod(self, x, v, **kwargs):
         """Return the product of v with the transpose Jacobian at x."""
+        self._trace_con(x)
         return adolc.vec_jac(self._con_trace_id, x, v)
 
+    def jprod_block(self, x, V, **kwargs):
+        """Return the products of the Jacobian at x with the columns of V.
+
+        All products are obtained from a single forward sweep with as many
+        directions as V has columns.
+        """
+        self._trace_con(x)
+        (_, JV) = adolc.fov_forward(self._con_trace_id, x, np.asarray(V))
+        return JV
+
+    def jtprod_block(self, x, U, **kwargs):
+        """Return the products of the transpose Jacobian at x with U.
+
+        After a zero-order forward sweep, all products are obtained from a
+        single reverse sweep with as many weights as U has columns.
+        """
+        self._trace_con(x)
+        adolc.zos_forward(self._con_trace_id, x, keep=1)
+        return adolc.fov_reverse(self._con_trace_id, np.asarray(U).T).T
+
 
 class SparseAdolcModel(AdolcModel):
     """`AdolcModel` with sparse Jacobian and Hessian.
@@ -186,6 +246,7 @@ class SparseAdolcModel(AdolcModel):
         options[1] = 1  # bug in adol-c?
         if z is None:
             z = np.zeros(self.ncon)
+        self._trace_lag(x, z)
         xz = np.concatenate((x, z))
         if self.__first_sparse_hess_eval:
             nnz, rind, cind, values =  \
@@ -213,6 +274,7 @@ class SparseAdolcModel(AdolcModel):
     def jac(self, x, **kwargs):
         """Return constraints Jacobian at x in sparse format."""
         options = np.zeros(4, dtype=int)
+        self._trace_con(x)
         if self.__first_sparse_jac_eval:
             nnz, rind, cind, values =  \
                 adolc.colpack.sparse_jac_no_repeat(self._con_trace_id,
@@ -225,7 +287,7 @@ class SparseAdolcModel(AdolcModel):
 
         else:
             nnz, rind, cind, values =  \
-                adolc.colpack.sparse_jac_repeat(self._jac_trace_id,
+                adolc.colpack.sparse_jac_repeat(self._con_trace_id,
                                                 x,
                                                 self.jac_rind,
                                                 self.jac_cind,
@@ -19,6 +19,14 @@ class AlgopyModel(NLPModel):
     are computed via algorithmic differentiation through AlgoPy.
     AlgoPy only supplies dense derivatives.
     See the documentation of `NLPModel` for further information.
+
+    Each function is traced on the first evaluation of a derivative that
+    needs it, at the point where that derivative is requested. In
+    particular, the Lagrangian is only traced when a Hessian is needed.
+
+    The Lagrangian is traced as the vector function [f(x), c(x)] of x
+    alone. Its Hessian is that of the combination of the components
+    weighted by the multipliers, so that only the n x n block is computed.
     """
 
     def __init__(self, n, m=0, name='Algopy-Generic', **kwargs):
@@ -36,24 +44,22 @@ class AlgopyModel(NLPModel):
         self._cg_cons = None
         self._cg_lag = None
 
-        self._trace_obj(self.x0)
-        self._trace_lag(self.x0, self.pi0)
-        if m > 0:
-            self._trace_cons(self.x0)
-
     @property
     def cg_obj(self):
         """Objective function call graph."""
+        self._trace_obj(self.x0)
         return self._cg_obj
 
     @property
     def cg_cons(self):
         """Constraint call graph."""
+        self._trace_cons(self.x0)
         return self._cg_cons
 
     @property
     def cg_lag(self):
-        """Lagrangian call graph."""
+        """Call graph of the objective and constraints, as in the Lagrangian."""
+        self._trace_lag(self.x0)
         return self._cg_lag
 
     def _trace_obj(self, x):
@@ -80,28 +86,38 @@ class AlgopyModel(NLPModel):
         cg.dependentFunctionList = [y]
         self._cg_cons = cg
 
-    def _trace_lag(self, x, z):
-        """Trace the Lagrangian evaluation."""
+    def _trace_lag(self, x):
+        """Trace the objective and constraints as a single function of x."""
         if self._cg_lag is not None:
             return
-        self._trace_obj(x)
-        self._trace_cons(x)
-        unconstrained = self.m == 0 and self.nbounds == 0
 
-        if unconstrained:
+        if self.m == 0:
+            self._trace_obj(x)
             self._cg_lag = self._cg_obj
             return
 
         cg = algopy.CGraph()
-        xz = np.concatenate((x, z))
-        xz = algopy.Function(xz)
-        l = self.lag(xz[:self.nvar], xz[self.nvar:])
-        cg.independentFunctionList = [xz]
-        cg.dependentFunctionList = [l]
+        x = algopy.Function(x)
+        y = algopy.zeros(self.m + 1, dtype=x)
+        y[0] = self.obj(x)
+        y[1:] = self.cons(x)
+        cg.trace_off()
+        cg.independentFunctionList = [x]
+        cg.dependentFunctionList = [y]
         self._cg_lag = cg
 
+    def _lag_weights(self, z):
+        """Return the weights of [f(x), c(x)] in the Lagrangian at z."""
+        w = np.ones(self.m + 1)
+        if z is None:
+            w[1:] = 0
+        else:
+            w[1:] = -self._cons_multipliers(z)
+        return w
+
     def grad(self, x, **kwargs):
         """Evaluate the objective gradient at x."""
+        self._trace_obj(x)
         return self._cg_obj.gradient(x)
 
     # Override lag because Algopy won't apply numpy.dot() between a
@@ -127,23 +143,40 @@ class AlgopyModel(NLPModel):
 
     def hess(self, x, z=None, **kwargs):
         """Return the Hessian of the objective at x."""
-        if z is None:
-            z = np.zeros(self.ncon)
-        xz = np.concatenate((x, z))
-        return self._cg_lag.hessian(xz)[:self.nvar, :self.nvar]
+        self._trace_lag(x)
+        if self.m == 0:
+            return self._cg_lag.hessian(x)
+        return self._cg_lag.vec_hess(self._lag_weights(z), x)
 
     def hprod(self, x, z, v, **kwargs):
         """Return the Hessian-vector product at x with v."""
-        xz = np.concatenate((x, z))
-        v0 = np.concatenate((v, np.zeros(self.ncon)))
-        return self._cg_lag.hess_vec(xz, v0)[:self.nvar]
+        self._trace_lag(x)
+        if self.m == 0:
+            return self._cg_lag.hess_vec(x, v)
+
+        # Second-order forward sweep in direction v followed by a reverse
+        # sweep weighted by the multipliers, as in CGraph.vec_hess_vec.
+        cg = self._cg_lag
+        xv = np.zeros((2, 1) + x.shape)
+        xv[0, 0] = x
+        xv[1, 0] = v
+        cg.pushforward([algopy.UTPM(xv)])
+        ybar = cg.dependentFunctionList[0].x.zeros_like()
+        ybar.data[0, 0] = self._lag_weights(z)
+        cg.pullback([ybar])
+        return cg.independentFunctionList[0].xbar.data[1, 0]
 
     def cons_pos(self, x):
         """Identical to `cons` for `AlgopyModel`s."""
         return self.cons(x)
 
+    def _cons_multipliers(self, z):
+        """Identical to `z[:m]` since :meth:`cons_pos` is `cons`."""
+        return z[:self.m]
+
     def jac(self, x, **kwargs):
         """Return constraints Jacobian at x."""
+        self._trace_cons(x)
         return self._cg_cons.jacobian(x)
 
     def jac_pos(self, x, **kwargs):
@@ -152,8 +185,10 @@ class AlgopyModel(NLPModel):
 
     def jprod(self, x, v, **kwargs):
         """Return the Jacobian-vector product at x with v."""
+        self._trace_cons(x)
         return self._cg_cons.jac_vec(x, v)
 
     def jtprod(self, x, v, **kwargs):
         """Return the transpose-Jacobian-vector product at x with v."""
+        self._trace_cons(x)
         return self._cg_cons.vec_jac(v, x)
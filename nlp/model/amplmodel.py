@@ -11,9 +11,14 @@ except ImportError:
 import numpy as np
 from nlp.model.nlpmodel import NLPModel
 from nlp.model.qnmodel import QuasiNewtonModel
-from pykrylov.linop import CoordLinearOperator
+from pykrylov.linop import CoordLinearOperator, LinearOperator
 from nlp.tools import sparse_vector_class as sv
 
+try:
+    from scipy import sparse as sp
+except ImportError:
+    sp = None
+
 import tempfile
 import os
 
@@ -60,6 +65,13 @@ def writestub(template):
     os.system("ampl %s" % template)
 
 
+class _ClosedAmpl(object):
+    """Stand-in for the ASL interface of a closed :class:`AmplModel`."""
+
+    def __getattr__(self, name):
+        raise ValueError('Model has been closed')
+
+
 class AmplModel(NLPModel):
     """
     AmplModel creates an instance of an AMPL model. If the `nl` file is
@@ -95,14 +107,13 @@ class AmplModel(NLPModel):
                                         name=kwargs.get('name', stub),
                                         x0=model.get_x0(),
                                         pi0=model.get_pi0(),
-                                        Lvar=model.get_Lvar(),
-                                        Uvar=model.get_Uvar(),
-                                        Lcon=model.get_Lcon(),
-                                        Ucon=model.get_Ucon())
+                                        Lvar=model.get_Lvar(copy=False),
+                                        Uvar=model.get_Uvar(copy=False),
+                                        Lcon=model.get_Lcon(copy=False),
+                                        Ucon=model.get_Ucon(copy=False))
 
         # Get basic info on problem
         self.minimize = (model.objtype == 0)
-        (self._lin, self._nln, self._net) = model.get_CType()  # Constr. types
         # Constraint types
         (self._lin, self._nln, self._net) = model.get_CType()
         self._nlin = len(self.lin)       # number of linear  constraints
@@ -111,23 +122,42 @@ class AmplModel(NLPModel):
 
         self._sparse_coord = True       # Sparse matrices in coord format
 
-        # Get sparsity info
+        # Get sparsity info. The Jacobian and Hessian sparsity structures
+        # are only set up when first needed. See :attr:`nnzh`.
         self.nnzj = model.get_nnzj()    # number of nonzeros in Jacobian
-        self.nnzh = model.get_nnzh()    # ...                   Hessian
 
         # Initialize scaling attributes
         self.scale_obj = None   # Objective scaling
         self.scale_con = None   # Constraint scaling
 
-    def __del__(self):
-        self.model._dealloc()
+        # Sparsity structures, computed on first use.
+        self._jac_structure = None
+        self._hess_structure = None
+
+        # Jacobian cache used by jprod and jtprod: (x, scale_con, J).
+        self._jac_cache = None
+        self._jac_perm = None
+
+    @property
+    def nnzh(self):
+        """Number of nonzeros in the Lagrangian Hessian.
+
+        The Hessian sparsity structure is set up on first access, so that
+        first-order methods never pay for it.
+        """
+        return self.model.get_nnzh()
 
     def writesol(self, x, z, msg):
         """Write primal-dual solution and message msg to `stub.sol`."""
         return self.model.ampl_sol(x, z, msg)
 
+    def get_x0(self):
+        """Return a copy of the initial point stored in the `nl` file."""
+        return self.model.get_x0()
+
     def get_pi0(self):
-        return self.model.pi0()
+        """Return a copy of the initial multipliers stored in the `nl` file."""
+        return self.model.get_pi0()
 
     def obj(self, x, obj_num=0):
         """Evaluate objective function value at x.
@@ -147,7 +177,7 @@ class AmplModel(NLPModel):
             f *= -1
         return f
 
-    def grad(self, x, obj_num=0):
+    def grad(self, x, obj_num=0, out=None):
         """Evaluate objective gradient at x.
 
         Returns a Numpy array. This method changes the sign of the objective
@@ -158,7 +188,7 @@ class AmplModel(NLPModel):
         if obj_num < 0 or obj_num >= self.model.n_obj:
             raise ValueError('Objective number is out of range.')
 
-        g = self.model.grad_obj(x)
+        g = self.model.grad_obj(x, out)
         if self.scale_obj:
             g *= self.scale_obj
         if not self.minimize:
@@ -171,7 +201,7 @@ class AmplModel(NLPModel):
         Returns a sparse vector. This method changes the sign of the objective
         gradient if the problem is a maximization problem.
         """
-        sg = sv.SparseVector(self.n, self.model.eval_sgrad(x))
+        sg = sv.SparseVector(self.n, *self.model.eval_sgrad(x))
         if self.scale_obj:
             sg *= self.scale_obj
         if not self.minimize:
@@ -185,14 +215,14 @@ class AmplModel(NLPModel):
         Return a sparse vector. This method changes the sign of the cost vector
         if the problem is a maximization problem.
         """
-        sc = sv.SparseVector(self.n, self.model.eval_cost())
+        sc = sv.SparseVector(self.n, *self.model.eval_cost())
         if self.scale_obj:
             sc *= self.scale_obj
         if not self.minimize:
             sc *= -1
         return sc
 
-    def cons(self, x):
+    def cons(self, x, out=None):
         """Evaluate vector of constraints at x.
 
         Returns a Numpy array.
@@ -205,7 +235,7 @@ class AmplModel(NLPModel):
 
         use the `permC` permutation vector.
         """
-        c = self.model.eval_cons(x)
+        c = self.model.eval_cons(x, out)
         if self.scale_con is not None:
             c *= self.scale_con
         return c
@@ -236,7 +266,7 @@ class AmplModel(NLPModel):
         Returns a sparse vector representing the sparse gradient
         in coordinate format.
         """
-        sci = sv.SparseVector(self.n, self.model.eval_sgi(i, x))
+        sci = sv.SparseVector(self.n, *self.model.eval_sgi(i, x))
         if self.scale_con is not None:
             sci *= self.scale_con[i]
         return sci
@@ -247,11 +277,33 @@ class AmplModel(NLPModel):
         Useful to obtain constraint rows when problem
         is a linear programming problem.
         """
-        sri = sv.SparseVector(self.n, self.model.eval_row(i))
+        sri = sv.SparseVector(self.n, *self.model.eval_row(i))
         if self.scale_con is not None:
             sri *= self.scale_con[i]
         return sri
 
+    def rows(self, idx=None):
+        """Evaluate the linear part of several constraints at once.
+
+        Useful to assemble the constraint matrix, or a block of it, when
+        problem is a linear programming problem.
+
+        :keywords:
+            :idx: indices of the constraints (default: all constraints)
+
+        Returns a SciPy CSR matrix with one row per index in `idx`.
+        """
+        if sp is None:
+            raise ImportError("Unable to import module scipy.sparse")
+        if idx is None:
+            idx = np.arange(self.m)
+        idx = np.asarray(idx, dtype=np.int)
+        indptr, indices, data = self.model.eval_rows(idx)
+        if self.scale_con is not None:
+            data *= np.repeat(self.scale_con[idx], np.diff(indptr))
+        return sp.csr_matrix((data, indices, indptr),
+                             shape=(len(idx), self.n))
+
     def A(self, *args, **kwargs):
         """Evaluate sparse Jacobian of the linear part of the constraints.
 
@@ -265,17 +317,41 @@ class AmplModel(NLPModel):
             vals *= self.scale_con[rows]
         return (vals, rows, cols)
 
+    def jac_structure(self):
+        """Return the sparsity structure of the constraints Jacobian.
+
+        Returns a tuple (rows, cols) of read-only index arrays. The
+        structure is computed on the first call only.
+        """
+        if self._jac_structure is None:
+            rows, cols = self.model.jac_structure()
+            rows.flags.writeable = False
+            cols.flags.writeable = False
+            self._jac_structure = (rows, cols)
+        return self._jac_structure
+
+    def jac_values(self, x, out=None):
+        """Evaluate the nonzeros of the sparse Jacobian of constraints at x.
+
+        The values are ordered as in :meth:`jac_structure`.
+
+        :keywords:
+            :out: array of size :attr:`nnzj` into which the values are
+                  written (default: a new array).
+        """
+        vals = self.model.jac_values(x, out)
+        if self.scale_con is not None:
+            vals *= self.scale_con[self.jac_structure()[0]]
+        return vals
+
     def jac(self, x, *args, **kwargs):
         """Evaluate sparse Jacobian of constraints at x.
 
-        Returns a sparse matrix in coordinate format.
+        Returns a sparse matrix in coordinate format. The index arrays are
+        those returned by :meth:`jac_structure`.
         """
-        store_zeros = kwargs.get('store_zeros', False)
-        store_zeros = 1 if store_zeros else 0
-        vals, rows, cols = self.model.eval_J(x, store_zeros)
-        if self.scale_con is not None:
-            vals *= self.scale_con[rows]
-        return (vals, rows, cols)
+        rows, cols = self.jac_structure()
+        return (self.jac_values(x), rows, cols)
 
     def jac_pos(self, x, **kwargs):
         """
@@ -303,67 +379,170 @@ class AmplModel(NLPModel):
         of the general constraints in the order above in which the sign of
         the 'less than' constraints is flipped, and `JR` is the Jacobian of
         the 'less than' side of range constraints.
+
+        Returns a sparse matrix in coordinate format.
         """
-        store_zeros = kwargs.get('store_zeros', False)
-        store_zeros = 1 if store_zeros else 0
-        n = self.n
-        m = self.m
-        nrangeC = self.nrangeC
-        upperC = self.upperC
-        rangeC = self.rangeC
-
-        # BROKEN
-        # Initialize sparse Jacobian
-        # J = BlockLinearOperator([[self.jop(x)],
-        #                         [ReducedLinearOperator(self.jop(x))]])
-        # Insert contribution of general constraints
-        J[:m, :n] = self.jac(x, **kwargs)
-        J[upperC, :n] *= -1        # Flip sign of 'upper' gradients.
-        J[m:, :n] = -J[rangeC, :n]   # Append 'upper' side of range const.
+        vals, rows, cols = AmplModel.jac(self, x, **kwargs)
+        return self._jac_pos_coord(vals, rows, cols)
+
+    def _cached_jac(self, x):
+        """Return the Jacobian at x as a matrix suitable for products.
+
+        The Jacobian is evaluated once per x and kept in compressed sparse
+        row format if SciPy is available, so that products with J and J^T
+        are cheap. It is reevaluated when x or the constraint scaling
+        changes.
+        """
+        cache = self._jac_cache
+        if cache is not None:
+            (xc, scale_con, J) = cache
+            if np.array_equal(x, xc) and \
+                    (scale_con is self.scale_con or
+                     np.array_equal(scale_con, self.scale_con)):
+                return J
+
+        if sp is not None and self.ncon > 0:
+            if self._jac_perm is None:
+                # Build the CSR matrix once and record where each nonzero
+                # returned by jac_values goes in its data array.
+                rows, cols = self.jac_structure()
+                perm = np.lexsort((cols, rows))
+                indptr = np.zeros(self.ncon + 1, dtype=np.int)
+                np.cumsum(np.bincount(rows, minlength=self.ncon),
+                          out=indptr[1:])
+                J = sp.csr_matrix((np.empty(self.nnzj), cols[perm], indptr),
+                                  shape=(self.ncon, self.nvar))
+                self._jac_perm = (perm, np.empty(self.nnzj), J)
+            (perm, vals, J) = self._jac_perm
+            self.jac_values(x, out=vals)
+            np.take(vals, perm, out=J.data)
+        else:
+            vals, rows, cols = AmplModel.jac(self, x)
+            J = CoordLinearOperator(vals, rows, cols,
+                                    nargin=self.nvar,
+                                    nargout=self.ncon,
+                                    symmetric=False)
+        scale_con = self.scale_con
+        if scale_con is not None:
+            scale_con = np.array(scale_con, copy=True)
+        self._jac_cache = (np.array(x, dtype=np.float, copy=True),
+                           scale_con, J)
         return J
 
     # Implement jop because AMPL models don't define jprod / jtprod.
     def jop(self, x, *args, **kwargs):
-        """Jacobian at x as a linear operator."""
-        vals, rows, cols = self.jac(x, *args, **kwargs)
-        return CoordLinearOperator(vals, rows, cols,
-                                   nargin=self.nvar,
-                                   nargout=self.ncon,
-                                   symmetric=False)
+        """Jacobian at x as a linear operator.
+
+        The operator holds its own copy of the Jacobian, and remains valid
+        after the Jacobian is evaluated at another point. Arguments other
+        than x are passed to :meth:`jac`.
+        """
+        if args or kwargs:
+            vals, rows, cols = self.jac(x, *args, **kwargs)
+            return CoordLinearOperator(vals, rows, cols,
+                                       nargin=self.nvar,
+                                       nargout=self.ncon,
+                                       symmetric=False)
+        J = self._cached_jac(x)
+        if sp is not None and sp.issparse(J):
+            # The cached matrix is refreshed in place at each new point.
+            J = J.copy()
+        return LinearOperator(self.nvar, self.ncon,
+                              lambda v: J * v,
+                              matvec_transp=lambda u: J.T * u,
+                              symmetric=False)
 
     def jprod(self, x, p, **kwargs):
-        """Evaluate Jacobian-vector product at x with p."""
-        return self.jop(x, **kwargs) * p
+        """Evaluate Jacobian-vector product at x with p.
+
+        The Jacobian is only evaluated if x changed since the last call to
+        :meth:`jprod` or :meth:`jtprod`.
+        """
+        return self._cached_jac(x) * p
 
     def jtprod(self, x, p, **kwargs):
-        """Evaluate transposed-Jacobian-vector product at x with p."""
-        return self.jop(x, **kwargs).T * p
+        """Evaluate transposed-Jacobian-vector product at x with p.
 
-    def hess(self, x, z=None, obj_num=0, *args, **kwargs):
-        """Evaluate Hessian.
+        The Jacobian is only evaluated if x changed since the last call to
+        :meth:`jprod` or :meth:`jtprod`.
+        """
+        return self._cached_jac(x).T * p
 
-        Evaluate sparse lower triangular Lagrangian Hessian at (x, z).
+    def jprod_block(self, x, V, **kwargs):
+        """Evaluate the products of the Jacobian at x with the columns of V.
+
+        With SciPy, all products are obtained from a single sparse
+        matrix-matrix product with the cached Jacobian.
+        """
+        J = self._cached_jac(x)
+        if sp is not None and sp.issparse(J):
+            return np.asarray(J.dot(V))
+        return super(AmplModel, self).jprod_block(x, V, **kwargs)
+
+    def jtprod_block(self, x, U, **kwargs):
+        """Evaluate the products of the transposed Jacobian at x with U.
+
+        With SciPy, all products are obtained from a single sparse
+        matrix-matrix product with the cached Jacobian.
+        """
+        J = self._cached_jac(x)
+        if sp is not None and sp.issparse(J):
+            return np.asarray(J.T.dot(U))
+        return super(AmplModel, self).jtprod_block(x, U, **kwargs)
+
+    def hess_structure(self):
+        """Return the sparsity structure of the Lagrangian Hessian.
+
+        Returns a tuple (rows, cols) of read-only index arrays describing
+        the lower triangle of the Hessian. The structure is computed on the
+        first call only.
+        """
+        if self._hess_structure is None:
+            rows, cols = self.model.hess_structure()
+            rows.flags.writeable = False
+            cols.flags.writeable = False
+            self._hess_structure = (rows, cols)
+        return self._hess_structure
+
+    def hess_values(self, x, z=None, out=None, **kwargs):
+        """Evaluate the nonzeros of the Lagrangian Hessian at (x, z).
+
+        The values are ordered as in :meth:`hess_structure`.
         By convention, the Lagrangian has the form L = f - c'z.
+
+        :keywords:
+            :out: array of size :attr:`nnzh` into which the values are
+                  written (default: a new array).
+            :obj_weight: weight of the Hessian of the objective function
+                         (default: 1).
         """
         obj_weight = kwargs.get('obj_weight', 1.0)
-        store_zeros = kwargs.get('store_zeros', False)
-        store_zeros = 1 if store_zeros else 0
         if z is None:
             z = np.zeros(self.m)
 
         if self.scale_obj:
             obj_weight *= self.scale_obj
-        if self.scale_con:
+        if self.scale_con is not None:
             z = z.copy()
             z *= self.scale_con
 
-        vals, rows, cols = self.model.eval_H(x, z, obj_weight, store_zeros)
+        vals = self.model.hess_values(x, z, obj_weight, out)
 
         if not self.minimize:
             vals *= -1
-        return (vals, rows, cols)
+        return vals
+
+    def hess(self, x, z=None, obj_num=0, *args, **kwargs):
+        """Evaluate Hessian.
+
+        Evaluate sparse lower triangular Lagrangian Hessian at (x, z).
+        By convention, the Lagrangian has the form L = f - c'z.
+        The index arrays are those returned by :meth:`hess_structure`.
+        """
+        rows, cols = self.hess_structure()
+        return (self.hess_values(x, z, **kwargs), rows, cols)
 
-    def hprod(self, x, z, v, **kwargs):
+    def hprod(self, x, z, v, out=None, **kwargs):
         """Hessian-vector product.
 
         Evaluate matrix-vector product H(x,z) * v, where H is the Hessian of
@@ -373,7 +552,8 @@ class AmplModel(NLPModel):
         Returns a Numpy array.
 
         Bug: x is ignored, and is determined as the point at which the
-        objective or gradient were last evaluated.
+        objective or gradient were last evaluated. Inside a
+        `with model.at(x)` block, that point is guaranteed to be x.
 
         :keywords:
           :obj_weight: Add a weight to the Hessian of the objective function.
@@ -387,15 +567,49 @@ class AmplModel(NLPModel):
 
         if self.scale_obj:
             obj_weight *= self.scale_obj
-        if self.scale_con:
+        if self.scale_con is not None:
             z = z.copy()
             z *= self.scale_con
 
-        Hv = self.model.H_prod(x, z, v, obj_weight)
+        Hv = self.model.H_prod(x, z, v, obj_weight, out)
         if not self.minimize:
             Hv *= -1
         return Hv
 
+    def hprod_block(self, x, z, V, **kwargs):
+        """Evaluate the products of the Lagrangian Hessian with a block.
+
+        Evaluate HV, where H is the Hessian of the Lagrangian at (x, z) and
+        V is an n x k array. The multipliers are passed to the ASL once for
+        all columns. Returns an n x k Numpy array.
+
+        :keywords:
+          :obj_weight: weight of the Hessian of the objective function
+                       (default: 1).
+        """
+        obj_weight = kwargs.get('obj_weight', 1.0)
+        if z is None:
+            z = np.zeros(self.m)
+
+        if self.scale_obj:
+            obj_weight *= self.scale_obj
+        if self.scale_con is not None:
+            z = z.copy()
+            z *= self.scale_con
+
+        if hasattr(self.model, 'H_prod_block'):
+            HV = self.model.H_prod_block(x, z, V, obj_weight)
+        else:
+            # Extension built without block products.
+            V = np.asarray(V, dtype=np.float)
+            HV = np.empty((self.n, V.shape[1]), order='F')
+            with self.at(x):
+                for k in xrange(V.shape[1]):
+                    self.model.H_prod(x, z, V[:, k], obj_weight, HV[:, k])
+        if not self.minimize:
+            HV *= -1
+        return HV
+
     def hiprod(self, x, i, v, **kwargs):
         """Constraint Hessian-vector product.
 
@@ -428,6 +642,23 @@ class AmplModel(NLPModel):
             return False
         return True
 
+    def close(self):
+        """Release the ASL resources held by this model.
+
+        Without this call, they are only released when the model is garbage
+        collected. The model cannot be evaluated afterwards, but its
+        attributes, such as x0 and bounds, remain valid.
+        """
+        model = self.model
+        if not self.closed:
+            self.model = _ClosedAmpl()
+            model.close()
+
+    @property
+    def closed(self):
+        """True if :meth:`close` has been called."""
+        return isinstance(self.model, _ClosedAmpl)
+
     def set_x(self, x):
         """Freeze independent variables.
 
@@ -439,9 +670,16 @@ class AmplModel(NLPModel):
         argument has changed since the last call. Calling `set_x()` skips this
         check.
 
-        See also :meth:`unset_x`.
+        The nonlinear objective and constraints are evaluated at x so that
+        Hessian products refer to x until :meth:`unset_x` is called.
+
+        See also :meth:`unset_x` and :meth:`at`.
         """
-        return self.model.set_x(x)
+        self.model.set_x(x)
+        if self.model.n_obj > 0:
+            self.model.eval_obj(x)
+        if self.model.nlc > 0:
+            self.model.eval_cons(x)
 
     def unset_x(self):
         """Release independent variables.
@@ -450,9 +688,9 @@ class AmplModel(NLPModel):
         etc., which is to check whether their argument has changed since the
         last call.
 
-        See also :meth:`set_x`.
+        See also :meth:`set_x` and :meth:`at`.
         """
-        return self.model.unset_x()
+        self.model.unset_x()
 
     def display_basic_info(self):
         """Display vital statistics about the current model."""
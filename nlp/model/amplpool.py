@@ -0,0 +1,151 @@
+"""A pool of loaded AMPL models for long-running processes."""
+
+from collections import OrderedDict
+import os
+
+__docformat__ = 'restructuredtext'
+
+
+def nl_path(stub):
+    """Return the absolute path of the `nl` file corresponding to `stub`."""
+    if not os.path.splitext(stub)[1]:
+        stub += '.nl'
+    return os.path.realpath(stub)
+
+
+def estimate_size(path, model):
+    """Estimate the memory used by a loaded model, in bytes.
+
+    The ASL structures are roughly proportional to the size of the `nl`
+    file. The remaining terms account for the vectors and sparsity
+    structures held by the model.
+    """
+    return os.path.getsize(path) + \
+        8 * (6 * model.n + 6 * model.m) + 24 * model.nnzj
+
+
+class AmplModelPool(object):
+    """Least-recently-used pool of loaded AMPL models.
+
+    Models are keyed by the path of their `nl` file and its modification time,
+    so that a model is reloaded if its `nl` file changes. When the estimated
+    memory used by the pool exceeds the budget, the least recently used models
+    are evicted and their ASL resources are released at once by
+    :meth:`AmplModel.close`. An evicted model can no longer be evaluated.
+
+    Each time a model is handed out by :meth:`get`, its call counters,
+    scaling, initial point and initial multipliers are reset.
+
+    The pool is not thread safe, and a model should only be used by one
+    caller at a time.
+    """
+
+    def __init__(self, max_bytes=1 << 30, max_models=None, **kwargs):
+        """Initialize an empty pool.
+
+        :keywords:
+            :max_bytes:   memory budget in bytes (default: 1 GiB)
+            :max_models:  maximum number of models (default: unlimited)
+            :model_class: class used to load models (default: `AmplModel`)
+            :sizeof:      function of the `nl` path and the model returning
+                          the memory used by the model in bytes
+                          (default: :func:`estimate_size`)
+
+        Other keyword arguments are passed to the constructor of each model.
+        """
+        model_class = kwargs.pop('model_class', None)
+        if model_class is None:
+            from nlp.model.amplmodel import AmplModel
+            model_class = AmplModel
+        self.model_class = model_class
+        self.sizeof = kwargs.pop('sizeof', estimate_size)
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.model_kwargs = kwargs
+
+        self._models = OrderedDict()  # path -> (mtime, size, model)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, stub):
+        return nl_path(stub) in self._models
+
+    @property
+    def stats(self):
+        """Dictionary of pool metrics."""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reloads': self.reloads,
+                'models': len(self._models),
+                'bytes': self.nbytes}
+
+    def get(self, stub):
+        """Return the model corresponding to `stub`, loading it if needed."""
+        path = nl_path(stub)
+        mtime = os.path.getmtime(path)
+
+        entry = self._models.pop(path, None)
+        if entry is not None:
+            if entry[0] == mtime:
+                self.hits += 1
+                self._models[path] = entry
+                model = entry[2]
+                self._reset(model)
+                return model
+
+            # The nl file changed since the model was loaded.
+            self.reloads += 1
+            self._release(entry)
+
+        self.misses += 1
+        model = self.model_class(path, **self.model_kwargs)
+        size = self.sizeof(path, model)
+        self._models[path] = (mtime, size, model)
+        self.nbytes += size
+        self._shrink()
+        return model
+
+    def release(self, stub):
+        """Remove the model corresponding to `stub` and free its resources."""
+        entry = self._models.pop(nl_path(stub), None)
+        if entry is not None:
+            self._release(entry)
+
+    def clear(self):
+        """Remove all models and free their resources."""
+        while self._models:
+            self._release(self._models.popitem(last=False)[1])
+
+    def _release(self, entry):
+        self.nbytes -= entry[1]
+        entry[2].close()
+
+    def _shrink(self):
+        """Evict least recently used models until the budget is met.
+
+        The most recently used model is never evicted.
+        """
+        while len(self._models) > 1 and \
+                (self.nbytes > self.max_bytes or
+                 (self.max_models is not None and
+                  len(self._models) > self.max_models)):
+            self._release(self._models.popitem(last=False)[1])
+            self.evictions += 1
+
+    def _reset(self, model):
+        """Restore the state of a model before handing it out again."""
+        if model._pinned_x is not None:
+            model._pinned_x = None
+            model.unset_x()
+        model.compute_scaling_obj(reset=True)
+        model.compute_scaling_cons(reset=True)
+        model.reset_counters()
+        model.x0 = model.get_x0()
+        model.pi0 = model.get_pi0()
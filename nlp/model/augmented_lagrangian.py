@@ -5,6 +5,7 @@ from nlp.model.nlpmodel import NLPModel, BoundConstrainedNLPModel
 from nlp.model.qnmodel import QuasiNewtonModel
 from nlp.model.snlp import SlackModel
 
+from contextlib import contextmanager
 import numpy as np
 
 
@@ -21,6 +22,16 @@ class AugmentedLagrangian(BoundConstrainedNLPModel):
     where π are the current Lagrange multiplier estimates, δ is the
     current penalty parameter, ρ is the current proximal parameter and xₖ is
     a fixed vector.
+
+    If `slack=False`, no slack variables are introduced. Constraints are
+    taken in the form returned by :meth:`NLPModel.cons_pos` and inequalities
+    are handled by the shifted penalty term of Rockafellar:
+
+        ψ(cᵢ, πᵢ; δ) := -πᵢ cᵢ + ½ δ cᵢ²   if πᵢ - δ cᵢ > 0,
+                        -½ πᵢ² / δ         otherwise,
+
+    while equalities contribute -πᵢ cᵢ + ½ δ cᵢ² as above. In that case,
+    π conforms to :meth:`NLPModel.cons_pos` and has size m + nrangeC.
     """
 
     def __init__(self, model, **kwargs):
@@ -34,12 +45,18 @@ class AugmentedLagrangian(BoundConstrainedNLPModel):
             :prox:     initial value for the proximal parameter (default: 0)
             :pi:       vector of initial multipliers (default: model.pi0)
             :xk:       initial value of the proximal vector (default: all zero)
+            :slack:    reformulate inequalities with slack variables
+                       (default: True)
         """
         if not isinstance(model, NLPModel):
             raise TypeError("model should be a subclass of NLPModel")
 
-        if not isinstance(model, SlackModel):
+        self.slack = kwargs.get("slack", True)
+
+        if self.slack and not isinstance(model, SlackModel):
             self.model = SlackModel(model, **kwargs)
+        else:
+            self.model = model
 
         super(AugmentedLagrangian, self).__init__(self.model.n,
                                                   name='Al-' + self.model.name,
@@ -52,9 +69,24 @@ class AugmentedLagrangian(BoundConstrainedNLPModel):
         self.prox_init = kwargs.get("prox", 0.)
         self._prox = self.prox_init
 
-        self.pi0 = np.zeros(self.model.m)
+        if self.slack:
+            self.pi0 = np.zeros(self.model.m)
+        else:
+            m = self.model.m
+            self.pi0 = np.zeros(m + self.model.nrangeC)
+
+            # Rows of cons_pos that are inequalities.
+            self._ineq = np.ones(m + self.model.nrangeC, dtype=np.bool)
+            self._ineq[self.model.equalC] = False
+
+            # Sign of each row of cons_pos relative to cons.
+            self._sign = np.ones(m)
+            self._sign[self.model.upperC] = -1
+            self._rangeC = np.array(self.model.rangeC, dtype=np.int)
+
         self.pi = self.pi0.copy()
         self.x0 = self.model.x0
+        self._work = np.empty(self.n)
 
         self.xk = kwargs.get("xk",
                              np.zeros(self.n) if self.prox_init > 0 else None)
@@ -79,23 +111,74 @@ class AugmentedLagrangian(BoundConstrainedNLPModel):
         self._prox = max(0, value)
         self.logger.debug("setting prox parameter to %7.1e", self.prox)
 
+    @contextmanager
+    def at(self, x):
+        """Pin x in the underlying model. See :meth:`NLPModel.at`."""
+        with self.model.at(x):
+            yield self
+
+    def _to_cons(self, y):
+        """Map multipliers conforming to `cons_pos` to `cons`.
+
+        Return z such that J(x)ᵀz is the sum of yᵢ times the gradient of the
+        i-th component of `cons_pos`.
+        """
+        m = self.model.m
+        z = self._sign * y[:m]
+        z[self._rangeC] -= y[m:]
+        return z
+
+    def _to_cons_pos(self, u):
+        """Map a vector conforming to `cons` to `cons_pos`.
+
+        This is the transpose of :meth:`_to_cons`.
+        """
+        m = self.model.m
+        e = np.empty(m + self.model.nrangeC)
+        np.multiply(self._sign, u, e[:m])
+        np.negative(u[self._rangeC], e[m:])
+        return e
+
+    def _shifted_cons(self, x):
+        """Return `cons_pos`, shifted multipliers and active rows at x."""
+        cons = self.model.cons_pos(x)
+        w = self.pi - self.penalty * cons
+        if self.penalty > 0:
+            active = ~self._ineq | (w > 0)
+        else:
+            active = np.ones(cons.size, dtype=np.bool)
+        return (cons, w, active)
+
     def obj(self, x, **kwargs):
         """Evaluate augmented Lagrangian."""
-        cons = self.model.cons(x)
+        with self.model.at(x):
+            alfunc = self.model.obj(x)
+
+            if self.slack:
+                cons = self.model.cons(x)
+                alfunc -= np.dot(self.pi, cons)
+                alfunc += 0.5 * self.penalty * np.dot(cons, cons)
+            else:
+                (cons, w, active) = self._shifted_cons(x)
+                # On active rows, -πc + ½δc² = -½(π + w)c.
+                # Inactive rows only occur if δ > 0.
+                pi = self.pi
+                psi = np.where(active, (pi + w) * cons,
+                               pi * pi / (self.penalty or 1))
+                alfunc -= 0.5 * np.sum(psi)
 
-        alfunc = self.model.obj(x)
-        alfunc -= np.dot(self.pi, cons)
-        alfunc += 0.5 * self.penalty * np.dot(cons, cons)
         if self.prox > 0:
             alfunc += 0.5 * self.prox * np.linalg.norm(x - self.xk)**2
         return alfunc
 
-    def grad(self, x, **kwargs):
+    def grad(self, x, out=None, **kwargs):
         """Evaluate augmented Lagrangian gradient."""
         model = self.model
-        J = model.jop(x)
-        cons = model.cons(x)
-        algrad = model.grad(x) + J.T * (self.penalty * cons - self.pi)
+        if out is None:
+            out = np.empty(self.n)
+        with model.at(x):
+            algrad = model.grad(x, out=out)
+            algrad -= model.jtprod(x, self._multipliers(x), out=self._work)
         if self.prox > 0:
             algrad += self.prox * (x - self.xk)
         return algrad
@@ -104,21 +187,55 @@ class AugmentedLagrangian(BoundConstrainedNLPModel):
         """Evaluate Lagrangian gradient."""
         model = self.model
         J = model.jop(x)
-        lgrad = model.grad(x) - J.T * self.pi
+        pi = self.pi if self.slack else self._to_cons(self.pi)
+        lgrad = model.grad(x) - J.T * pi
         return lgrad
 
-    def hprod(self, x, z, v, **kwargs):
+    def first_order_multipliers(self, x):
+        """Return first-order multiplier estimates at x.
+
+        In the slack formulation, the estimates are π - δ c(x). Otherwise,
+        they are π - δ c(x) projected onto the nonnegative orthant for
+        inequality constraints.
+        """
+        if self.slack:
+            return self.pi - self.penalty * self.model.cons(x)
+        (_, w, active) = self._shifted_cons(x)
+        w[~active] = 0
+        return w
+
+    def _multipliers(self, x):
+        """Return first-order multiplier estimates conforming to `cons`."""
+        y = self.first_order_multipliers(x)
+        return y if self.slack else self._to_cons(y)
+
+    def hprod(self, x, z, v, out=None, **kwargs):
         """Hessian-vector product.
 
         Compute the Hessian-vector product of the Hessian of the augmented
         Lagrangian with a vector v.
         """
         model = self.model
-        cons = model.cons(x)
+        if out is None:
+            out = np.empty(self.n)
+        with model.at(x):
+            if self.slack:
+                y = self.pi - self.penalty * model.cons(x)
+            else:
+                (_, y, active) = self._shifted_cons(x)
+                y[~active] = 0
+                y = self._to_cons(y)
+            Hv = model.hprod(x, y, v, out=out)
+
+            Jv = model.jprod(x, v)
+            if not self.slack:
+                Jv = self._to_cons_pos(Jv)
+                Jv[~active] = 0
+                Jv = self._to_cons(Jv)
+            JtJv = model.jtprod(x, Jv, out=self._work)
+        JtJv *= self.penalty
+        Hv += JtJv
 
-        w = model.hprod(x, self.pi - self.penalty * cons, v)
-        J = model.jop(x)
-        Hv = w + self.penalty * J.T * J * v
         if self.prox > 0:
             Hv += self.prox * v
         return Hv
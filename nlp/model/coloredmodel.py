@@ -0,0 +1,218 @@
+"""Models with sparse derivatives recovered by graph coloring.
+
+The mix-ins in this module assemble a sparse Jacobian or Hessian from a
+small number of products with seed vectors derived from a coloring of its
+sparsity pattern. They only require the host model to implement
+:meth:`jprod` and :meth:`hprod`, or :meth:`cons` and :meth:`grad` when
+finite differences are requested, and should appear first in the list of
+base classes, as in::
+
+    class MyModel(ColoredNLPModel, CppADModel):
+        ...
+
+The sparsity pattern is supplied at construction or detected by probing
+the first time a derivative is evaluated, at that point and at random
+points nearby. See :mod:`nlp.tools.coloring`.
+"""
+
+from nlp.model.nlpmodel import NLPModel
+from nlp.tools import coloring
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+def _probe_union(prod, x, n, npoints=3):
+    """Detect a sparsity pattern at x and at random points near x.
+
+    :parameters:
+        :prod:  function such that `prod(y, e)` returns the product of the
+                matrix at y with a vector e
+        :x:     point at which the pattern is requested
+        :n:     number of columns of the matrix
+
+    :keywords:
+        :npoints:  number of random points in addition to x (default: 3)
+
+    :returns:
+        (rows, cols), the union of the patterns detected at all points.
+
+    Elements that vanish at x but not identically, e.g., when x = 0, are
+    found at the random points. The points are the same from one call to
+    the next.
+    """
+    rng = np.random.RandomState(0)
+    keys = []
+    for k in xrange(npoints + 1):
+        y = x
+        if k > 0:
+            y = x + (1 + np.abs(x)) * rng.uniform(-0.5, 0.5, x.size)
+        rows, cols = coloring.probe_pattern(lambda e: prod(y, e), n)
+        keys.append(rows * n + cols)
+    return np.divmod(np.unique(np.concatenate(keys)), n)
+
+
+class ColoredJacobianModel(NLPModel):
+    """`NLPModel` whose sparse Jacobian is obtained by column coloring.
+
+    :meth:`jac` returns the Jacobian in coordinate format (vals, rows, cols)
+    from one product per color.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Instantiate a model with a compressed Jacobian.
+
+        :keywords:
+            :jac_pattern:  (rows, cols), indices of the nonzero elements of
+                           the Jacobian. If not given, the pattern is
+                           detected by probing on the first evaluation.
+            :fd:           obtain compressed columns by forward differences
+                           of :meth:`cons` instead of :meth:`jprod`
+                           (default: False).
+        """
+        pattern = kwargs.pop('jac_pattern', None)
+        self._jac_fd = kwargs.pop('fd', False)
+        super(ColoredJacobianModel, self).__init__(*args, **kwargs)
+        self._jac_pattern = None
+        self._jac_colors = None
+        if pattern is not None:
+            self._set_jac_pattern(*pattern)
+
+    @property
+    def jac_colors(self):
+        """Coloring of the Jacobian columns, or `None` if not known yet."""
+        return self._jac_colors
+
+    def _set_jac_pattern(self, rows, cols):
+        rows = np.asarray(rows, dtype=np.int)
+        cols = np.asarray(cols, dtype=np.int)
+        self._jac_pattern = (rows, cols)
+        self._jac_colors = coloring.column_coloring(rows, cols,
+                                                    (self.ncon, self.nvar))
+        self.nnzj = rows.size
+
+    def _jac_seed_products(self, x, S):
+        """Return the products of the Jacobian at x with the columns of S."""
+        if not self._jac_fd:
+            return self.jprod_block(x, S)
+        B = np.empty((self.ncon, S.shape[1]))
+        c = self.cons(x)
+        h = np.sqrt(np.finfo(np.double).eps) * max(1.0, np.max(np.abs(x)))
+        for k in xrange(S.shape[1]):
+            B[:, k] = (self.cons(x + h * S[:, k]) - c) / h
+        return B
+
+    def jac(self, x, **kwargs):
+        """Evaluate the constraints Jacobian at x in coordinate format."""
+        if self._jac_pattern is None:
+            self._set_jac_pattern(*_probe_union(
+                lambda y, e: self._jac_seed_products(y, e[:, None])[:, 0],
+                x, self.nvar))
+        rows, cols = self._jac_pattern
+        B = self._jac_seed_products(x, coloring.seed_matrix(self._jac_colors))
+        vals = coloring.recover_jacobian(B, rows, cols, self._jac_colors)
+        return (vals, rows, cols)
+
+
+class ColoredHessianModel(NLPModel):
+    """`NLPModel` whose sparse Hessian is obtained by star coloring.
+
+    :meth:`hess` returns the lower triangle of the Hessian of the
+    Lagrangian in coordinate format (vals, rows, cols) from one product per
+    color.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Instantiate a model with a compressed Hessian.
+
+        :keywords:
+            :hess_pattern:  (rows, cols), indices of the nonzero elements of
+                            the Hessian of the Lagrangian, in either or
+                            both triangles. If not given, the pattern is
+                            detected by probing on the first evaluation.
+            :fd:            obtain compressed columns by forward differences
+                            of the gradient of the Lagrangian instead of
+                            :meth:`hprod` (default: False).
+        """
+        pattern = kwargs.pop('hess_pattern', None)
+        self._hess_fd = kwargs.pop('fd', False)
+        super(ColoredHessianModel, self).__init__(*args, **kwargs)
+        self._hess_pattern = None
+        self._hess_colors = None
+        if pattern is not None:
+            self._set_hess_pattern(*pattern)
+
+    @property
+    def hess_colors(self):
+        """Star coloring of the Hessian, or `None` if not known yet."""
+        return self._hess_colors
+
+    def _set_hess_pattern(self, rows, cols):
+        rows = np.asarray(rows, dtype=np.int)
+        cols = np.asarray(cols, dtype=np.int)
+        n = self.nvar
+        lower = np.unique(np.maximum(rows, cols) * n + np.minimum(rows, cols))
+        rows, cols = np.divmod(lower, n)
+        self._hess_pattern = (rows, cols)
+        self._hess_colors = coloring.star_coloring(rows, cols, self.nvar)
+        self.nnzh = rows.size
+
+    def _lag_grad(self, x, z):
+        """Evaluate the gradient of the Lagrangian at (x, z)."""
+        g = self.grad(x)
+        if self.m > 0 and z is not None:
+            g = g - self.jtprod(x, self._cons_multipliers(z))
+        return g
+
+    def _hess_seed_products(self, x, z, S):
+        """Return the products of the Hessian at (x, z) with the columns of S.
+        """
+        if not self._hess_fd:
+            if z is None:
+                z = np.zeros(self.ncon)
+            return self.hprod_block(x, z, S)
+        B = np.empty((self.nvar, S.shape[1]))
+        g = self._lag_grad(x, z)
+        h = np.sqrt(np.finfo(np.double).eps) * max(1.0, np.max(np.abs(x)))
+        for k in xrange(S.shape[1]):
+            B[:, k] = (self._lag_grad(x + h * S[:, k], z) - g) / h
+        return B
+
+    def hess(self, x, z=None, **kwargs):
+        """Evaluate the lower triangle of the Lagrangian Hessian at (x, z).
+
+        The Hessian is returned in coordinate format.
+        """
+        if self._hess_pattern is None:
+            # Probe with nonzero multipliers so as not to miss the pattern
+            # of the constraint Hessians. Random multipliers prevent those
+            # Hessians from cancelling each other.
+            z_probe = np.random.RandomState(1).uniform(0.5, 1.5, self.ncon)
+            self._set_hess_pattern(*_probe_union(
+                lambda y, e: self._hess_seed_products(y, z_probe,
+                                                      e[:, None])[:, 0],
+                x, self.nvar))
+        rows, cols = self._hess_pattern
+        B = self._hess_seed_products(x, z,
+                                     coloring.seed_matrix(self._hess_colors))
+        vals = coloring.recover_hessian(B, rows, cols, self._hess_colors)
+        return (vals, rows, cols)
+
+
+class ColoredNLPModel(ColoredJacobianModel, ColoredHessianModel):
+    """`NLPModel` with sparse Jacobian and Hessian obtained by coloring."""
+
+    # MRO: 1. ColoredNLPModel
+    #      2. ColoredJacobianModel
+    #      3. ColoredHessianModel
+    #      4. NLPModel
+
+    def __init__(self, *args, **kwargs):
+        """Instantiate a model with a compressed Jacobian and Hessian.
+
+        See :class:`ColoredJacobianModel` and :class:`ColoredHessianModel`
+        for the keywords. The keyword `fd` applies to both derivatives.
+        """
+        fd = kwargs.pop('fd', False)
+        super(ColoredNLPModel, self).__init__(*args, **kwargs)
+        self._jac_fd = self._hess_fd = fd
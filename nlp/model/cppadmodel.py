@@ -16,6 +16,18 @@ class CppADModel(NLPModel):
     A class to represent optimization problems in which derivatives
     are computed via algorithmic differentiation through CPPAD.
     See the documentation of `NLPModel` for further information.
+
+    Each function is taped on the first evaluation of a derivative that
+    needs it, at the point where that derivative is requested. In
+    particular, the Lagrangian is only taped when a Hessian is needed.
+
+    The Lagrangian is taped as the vector function [f(x), c(x)] of x alone.
+    Its Hessian is that of the combination of the components weighted by
+    the multipliers, so that only the n x n block is computed.
+
+    The point of the last zero-order sweep is remembered for each tape, so
+    that repeated products at the same point, as performed by iterative
+    linear algebra, only evaluate directional derivatives.
     """
 
     def __init__(self, n, m=0, name='CppAD-Generic', **kwargs):
@@ -33,19 +45,49 @@ class CppADModel(NLPModel):
         self._cppad_adfun_cons_pos = None
         self._cppad_adfun_lag = None
 
-        # Trace objective and constraint functions.
-        self._trace_obj(self.x0)
-        self._trace_lag(self.x0, self.pi0)
-        if self.m > 0:
-            self._trace_cons(self.x0)
-            self._trace_cons_pos(self.x0)
+        # Point and value of the last zero-order sweep of each tape.
+        self._cppad_sweeps = {}
+
+    def _forward0(self, adfun, x):
+        """Run a zero-order sweep of `adfun` at x, unless it was the last one.
+
+        Return the value of the taped function at x.
+        """
+        key = id(adfun)
+        last = self._cppad_sweeps.get(key)
+        if last is not None and np.array_equal(last[0], x):
+            return last[1].copy()
+        y = adfun.forward(0, x)
+        self._cppad_sweeps[key] = (np.array(x, dtype=np.float), y)
+        return y
+
+    def _forget_sweep(self, adfun):
+        """Forget the last zero-order sweep of `adfun`.
+
+        Drivers such as `jacobian` and `hessian` overwrite the Taylor
+        coefficients stored in the tape.
+        """
+        self._cppad_sweeps.pop(id(adfun), None)
+
+    def _lag_weights(self, z):
+        """Return the weights of [f(x), c(x)] in the Lagrangian at z."""
+        w = np.ones(self.m + 1)
+        if z is None:
+            w[1:] = 0
+        elif self.m > 0:
+            w[1:] = -self._cons_multipliers(z)
+        return w
 
     def _trace_obj(self, x):
+        if self._cppad_adfun_obj is not None:
+            return
         ax = pycppad.independent(x)
         ay = self.obj(ax)
         self._cppad_adfun_obj = pycppad.adfun(ax, np.array([ay]))
 
     def _trace_cons(self, x):
+        if self._cppad_adfun_cons is not None:
+            return
         ax = pycppad.independent(x)
         ay = self.cons(ax)
 
@@ -55,6 +97,8 @@ class CppADModel(NLPModel):
         self._cppad_adfun_cons = pycppad.adfun(ax, ay)
 
     def _trace_cons_pos(self, x):
+        if self._cppad_adfun_cons_pos is not None:
+            return
         ax = pycppad.independent(x)
         ay = self.cons_pos(ax)
 
@@ -63,66 +107,132 @@ class CppADModel(NLPModel):
 
         self._cppad_adfun_cons_pos = pycppad.adfun(ax, ay)
 
-    def _trace_lag(self, x, z):
-        if self.m == 0 and self.nbounds == 0:
+    def _trace_lag(self, x):
+        if self._cppad_adfun_lag is not None:
+            return
+        if self.m == 0:
+            self._trace_obj(x)
             self._cppad_adfun_lag = self._cppad_adfun_obj
             return
-        axz = pycppad.independent(np.concatenate((x, z)))
-        ax = axz[:self.nvar]
-        az = axz[self.nvar:]
-        ay = self.lag(ax, az)
-        self._cppad_adfun_lag = pycppad.adfun(axz, np.array([ay]))
+        ax = pycppad.independent(x)
+        ay = np.concatenate(([self.obj(ax)], np.atleast_1d(self.cons(ax))))
+        self._cppad_adfun_lag = pycppad.adfun(ax, ay)
 
     def _cppad_obj(self, x):
         """Return the objective function from the CppAD tape."""
-        return self._cppad_adfun_obj.function(x)
+        self._trace_obj(x)
+        return self._forward0(self._cppad_adfun_obj, x)
 
     def grad(self, x, **kwargs):
         """Return the objective gradient at x."""
-        self._cppad_adfun_obj.forward(0, x)
+        self._trace_obj(x)
+        self._forward0(self._cppad_adfun_obj, x)
         return self._cppad_adfun_obj.reverse(1, np.array([1.]))
 
     def hess(self, x, z=None, **kwargs):
         """Return the Hessian of the Lagrangian at (x,z)."""
-        if z is None:
-            z = np.zeros(self.ncon)
-        xz = np.concatenate((x, z))
-        H = self._cppad_adfun_lag.hessian(xz, np.array([1.]))
-        return H[:self.nvar, :self.nvar]
+        self._trace_lag(x)
+        self._forget_sweep(self._cppad_adfun_lag)
+        return self._cppad_adfun_lag.hessian(x, self._lag_weights(z))
 
     def hprod(self, x, z, v, **kwargs):
         """Return the Hessian-vector product at x with v."""
+        self._trace_lag(x)
+
         # forward: order zero (computes function value)
-        xz = np.concatenate((x, z))
-        v0 = np.concatenate((v, np.zeros(self.ncon)))
-        self._cppad_adfun_lag.forward(0, xz)
+        self._forward0(self._cppad_adfun_lag, x)
+        return self._lag_hprod(v, self._lag_weights(z))
 
+    def hprod_block(self, x, z, V, **kwargs):
+        """Return the products of the Hessian at (x, z) with the columns of V.
+
+        :parameters:
+
+            :x: point at which the Hessian of the Lagrangian is evaluated
+            :z: Lagrange multipliers
+            :V: Numpy array of shape (n, k)
+
+        :returns:
+
+            Numpy array of shape (n, k).
+
+        A single zero-order sweep is performed for all k products.
+        """
+        self._trace_lag(x)
+        self._forward0(self._cppad_adfun_lag, x)
+        w = self._lag_weights(z)
+        V = np.asarray(V)
+        HV = np.empty((self.nvar, V.shape[1]))
+        for j in xrange(V.shape[1]):
+            HV[:, j] = self._lag_hprod(V[:, j], w)
+        return HV
+
+    def _lag_hprod(self, v, w):
+        """Return the Hessian-vector product with v after a zero-order sweep.
+
+        The components of the Lagrangian tape are weighted by w.
+        """
         # forward: order one (computes directional derivative)
-        self._cppad_adfun_lag.forward(1, v0)
+        self._cppad_adfun_lag.forward(1, v)
 
-        # reverse: order one (computes gradient of directional derivative)
-        return self._cppad_adfun_lag.reverse(2, np.array([1.]))[:self.nvar]
+        # reverse: order two (computes gradient of directional derivative)
+        dw = self._cppad_adfun_lag.reverse(2, w)
+        return dw.reshape((self.nvar, 2))[:, 1]
 
     def _cppad_cons(self, x, **kwargs):
         """Return the constraints from the CppAD tape."""
-        return self._cppad_adfun_cons.function(x)
+        self._trace_cons(x)
+        return self._forward0(self._cppad_adfun_cons, x)
 
     def jac(self, x, **kwargs):
         """Return constraints Jacobian at x."""
+        self._trace_cons(x)
+        self._forget_sweep(self._cppad_adfun_cons)
         return self._cppad_adfun_cons.jacobian(x)
 
     def jprod(self, x, v, **kwargs):
         """Return the product of v with the Jacobian at x."""
+        self._trace_cons(x)
+
         # forward: order zero (computes function value)
-        self._cppad_adfun_cons.forward(0, x)
+        self._forward0(self._cppad_adfun_cons, x)
 
         # forward: order one (computes directional derivative)
         return self._cppad_adfun_cons.forward(1, v)
 
     def jtprod(self, x, v, **kwargs):
         """Return the product of v with the transpose Jacobian at x."""
+        self._trace_cons(x)
+
         # forward: order zero (computes function value)
-        self._cppad_adfun_cons.forward(0, x)
+        self._forward0(self._cppad_adfun_cons, x)
 
-        # forward: order one (computes directional derivative)
+        # reverse: order one (computes transpose directional derivative)
         return self._cppad_adfun_cons.reverse(1, v)
+
+    def jprod_block(self, x, V, **kwargs):
+        """Return the products of the Jacobian at x with the columns of V.
+
+        pycppad only exposes single-direction forward mode. A single
+        zero-order sweep is performed and reused for all k products.
+        """
+        self._trace_cons(x)
+        self._forward0(self._cppad_adfun_cons, x)
+        V = np.asarray(V)
+        JV = np.empty((self.ncon, V.shape[1]))
+        for j in xrange(V.shape[1]):
+            JV[:, j] = self._cppad_adfun_cons.forward(1, V[:, j])
+        return JV
+
+    def jtprod_block(self, x, U, **kwargs):
+        """Return the products of the transpose Jacobian at x with U.
+
+        A single zero-order sweep is performed for all k products.
+        """
+        self._trace_cons(x)
+        self._forward0(self._cppad_adfun_cons, x)
+        U = np.asarray(U)
+        JTU = np.empty((self.nvar, U.shape[1]))
+        for j in xrange(U.shape[1]):
+            JTU[:, j] = self._cppad_adfun_cons.reverse(1, U[:, j])
+        return JTU
@@ -7,6 +7,7 @@ except:
 from nlp.model.nlpmodel import NLPModel
 from nlp.model.snlp import SlackModel
 from nlp.model.qnmodel import QuasiNewtonModel
+from nlp.tools.utils import same_structure
 from pykrylov.linop import CysparseLinearOperator
 import numpy as np
 
@@ -16,8 +17,18 @@ class CySparseNLPModel(NLPModel):
     An `NLPModel` where sparse matrices are returned as CySparse matrices.
     The `NLPModel`'s `jac` and `hess` methods should return sparse
     Jacobian and Hessian in coordinate format: (vals, rows, cols).
+
+    The Jacobian and Hessian are allocated on their first evaluation.
+    Subsequent evaluations only update their values, as long as their
+    sparsity structure does not change. The same matrix is then returned
+    by every call, so that it should be copied if it is to be kept.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(CySparseNLPModel, self).__init__(*args, **kwargs)
+        self._jac_mat = None  # (rows, cols, J), built on first evaluation
+        self._hess_mat = None  # (rows, cols, H), built on first evaluation
+
     def hess(self, *args, **kwargs):
         """Evaluate Lagrangian Hessian at (x, z).
 
@@ -25,18 +36,24 @@ class CySparseNLPModel(NLPModel):
         sparse matrix in the coordinate format (COO).
         """
         vals, rows, cols = super(CySparseNLPModel, self).hess(*args, **kwargs)
-        H = LLSparseMatrix(size=self.nvar, size_hint=vals.size,
-                           store_symmetric=True, itype=types.INT64_T,
-                           dtype=types.FLOAT64_T)
+        if not same_structure(self._hess_mat, rows, cols):
+            H = LLSparseMatrix(size=self.nvar, size_hint=vals.size,
+                               store_symmetric=True, itype=types.INT64_T,
+                               dtype=types.FLOAT64_T)
+            self._hess_mat = (rows, cols, H)
+        H = self._hess_mat[2]
         H.put_triplet(rows, cols, vals)
         return H
 
     def jac(self, *args, **kwargs):
         """Evaluate constraints Jacobian at x."""
         vals, rows, cols = super(CySparseNLPModel, self).jac(*args, **kwargs)
-        J = LLSparseMatrix(nrow=self.ncon, ncol=self.nvar,
-                           size_hint=vals.size, store_symmetric=False,
-                           itype=types.INT64_T, dtype=types.FLOAT64_T)
+        if not same_structure(self._jac_mat, rows, cols):
+            J = LLSparseMatrix(nrow=self.ncon, ncol=self.nvar,
+                               size_hint=vals.size, store_symmetric=False,
+                               itype=types.INT64_T, dtype=types.FLOAT64_T)
+            self._jac_mat = (rows, cols, J)
+        J = self._jac_mat[2]
         J.put_triplet(rows, cols, vals)
         return J
 
@@ -77,7 +94,9 @@ class CySparseSlackModel(SlackModel):
     """
     Reformulate an optimization problem using slack variables.
 
-    New model represents matrices as `CySparse` matrices.
+    New model represents matrices as `CySparse` matrices. As in
+    `CySparseNLPModel`, the Jacobian and Hessian are allocated on their
+    first evaluation and only their values are updated afterwards.
 
     :parameters:
         :model:  Original model to be transformed into a slack form.
@@ -91,6 +110,8 @@ class CySparseSlackModel(SlackModel):
             msg += " or a derived class of it."
             raise TypeError(msg)
         super(CySparseSlackModel, self).__init__(model)
+        self._jac_mat = None  # Jacobian, allocated on first evaluation
+        self._hess_mat = None  # Hessian, allocated on first evaluation
 
     def _jac(self, x, lp=False):
         """Helper method to assemble the Jacobian matrix.
@@ -105,6 +126,12 @@ class CySparseSlackModel(SlackModel):
         model = self.model
         on = self.original_n
 
+        if not lp and self._jac_mat is not None:
+            # The slack part is constant.
+            J = self._jac_mat
+            J[:on, :on] = model.jac(x[:on])
+            return J
+
         lowerC = np.array(model.lowerC, dtype=np.int64)
         nlowerC = model.nlowerC
         upperC = np.array(model.upperC, dtype=np.int64)
@@ -137,6 +164,8 @@ class CySparseSlackModel(SlackModel):
         J.put_triplet(rangeC, on + nlowerC + nupperC + rrangeC,
                       -1.0 * np.ones(nrangeC, dtype=np.float64))
 
+        if not lp:
+            self._jac_mat = J
         return J
 
     def hess(self, x, z=None, *args, **kwargs):
@@ -150,8 +179,12 @@ class CySparseSlackModel(SlackModel):
 
         on = model.n
 
-        H = LLSparseMatrix(size=self.nvar, size_hint=self.model.nnzh,
-                           store_symmetric=True, itype=types.INT64_T,
-                           dtype=types.FLOAT64_T)
+        if self._hess_mat is None:
+            self._hess_mat = LLSparseMatrix(size=self.nvar,
+                                            size_hint=self.model.nnzh,
+                                            store_symmetric=True,
+                                            itype=types.INT64_T,
+                                            dtype=types.FLOAT64_T)
+        H = self._hess_mat
         H[:on, :on] = self.model.hess(x[:on], z, *args, **kwargs)
         return H
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""Models with derivatives approximated by finite differences."""
+
+from nlp.model.nlpmodel import NLPModel
+import multiprocessing
+import multiprocessing.dummy
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+class _WrappedModel(NLPModel):
+    """Model that forwards its evaluations to another model."""
+
+    def __init__(self, model, prefix):
+        if not isinstance(model, NLPModel):
+            raise TypeError("model should be a subclass of NLPModel")
+        self.model = model
+        super(_WrappedModel, self).__init__(model.n, m=model.m,
+                                            name=prefix + model.name,
+                                            x0=model.x0, pi0=model.pi0,
+                                            Lvar=model.Lvar,
+                                            Uvar=model.Uvar,
+                                            Lcon=model.Lcon,
+                                            Ucon=model.Ucon)
+
+    def obj(self, x, **kwargs):
+        """Evaluate the objective function at x."""
+        return self.model.obj(x, **kwargs)
+
+    def grad(self, x, **kwargs):
+        """Evaluate the objective gradient at x."""
+        return self.model.grad(x, **kwargs)
+
+    def cons(self, x, **kwargs):
+        """Evaluate the constraints at x."""
+        return self.model.cons(x, **kwargs)
+
+    def jac(self, x, **kwargs):
+        """Evaluate the constraints Jacobian at x."""
+        return self.model.jac(x, **kwargs)
+
+    def jprod(self, x, p, **kwargs):
+        """Evaluate Jacobian-vector product at x with p."""
+        return self.model.jprod(x, p, **kwargs)
+
+    def jtprod(self, x, p, **kwargs):
+        """Evaluate transposed-Jacobian-vector product at x with p."""
+        return self.model.jtprod(x, p, **kwargs)
+
+    def hess(self, x, z=None, **kwargs):
+        """Evaluate Lagrangian Hessian at (x, z)."""
+        return self.model.hess(x, z, **kwargs)
+
+    def hprod(self, x, z, p, **kwargs):
+        """Evaluate Lagrangian Hessian-vector product at (x, z) with p."""
+        return self.model.hprod(x, z, p, **kwargs)
+
+
+class FDHessianModel(_WrappedModel):
+    u"""Model with Hessian-vector products approximated by finite differences.
+
+    An instance of this class wraps a model that only supplies first
+    derivatives and approximates products with the Hessian of the Lagrangian
+    by differences of gradients of the Lagrangian:
+
+        ∇²L(x) v ≈ (∇L(x + hv) - ∇L(x)) / h,
+
+    or, in central mode,
+
+        ∇²L(x) v ≈ (∇L(x + hv) - ∇L(x - hv)) / 2h.
+
+    The objective gradient at the most recent point is cached, so that in
+    forward mode each product costs a single additional gradient evaluation.
+    The Hessian is available as a linear operator through :meth:`hop`, so
+    that gradient-only models may be solved by Newton-CG methods such as
+    :class:`Trunk`.
+    """
+
+    def __init__(self, model, **kwargs):
+        """Instantiate a finite-difference Hessian wrapper around `model`.
+
+        :parameters:
+            :model:    `NLPModel` supplying `obj` and `grad`, and `cons` and
+                       `jtprod` if it has constraints.
+
+        :keywords:
+            :central:  use central differences (default: False)
+        """
+        self.central = kwargs.get('central', False)
+        super(FDHessianModel, self).__init__(model, 'FDH-')
+        self._x = None  # Point at which the gradient is cached.
+        self._g = None  # Cached objective gradient.
+
+    def grad(self, x, **kwargs):
+        """Evaluate the objective gradient at x and cache it."""
+        if self._x is not None and np.array_equal(self._x, x):
+            return self._g.copy()
+        g = self.model.grad(x, **kwargs)
+        self._x = np.array(x, dtype=np.float)
+        self._g = g.copy()
+        return g
+
+    def _lag_grad(self, x, y, cached=False):
+        """Evaluate the gradient of f(x) - y'c(x).
+
+        The objective gradient is taken from the cache if `cached` is True.
+        """
+        g = self.grad(x) if cached else self.model.grad(x)
+        if y is not None:
+            g -= self.model.jtprod(x, y)
+        return g
+
+    def _step(self, x, v):
+        """Return the finite-difference step along v from x."""
+        eps = np.finfo(np.double).eps
+        scale = (1 + np.linalg.norm(x)) / np.linalg.norm(v)
+        if self.central:
+            return eps**(1. / 3) * scale
+        return np.sqrt(eps) * scale
+
+    def hprod(self, x, z, v, **kwargs):
+        """Approximate the Hessian of the Lagrangian at (x, z) times v."""
+        if not np.any(v):
+            return np.zeros(self.n)
+        y = None
+        if self.m > 0 and z is not None and np.any(z[:self.m + self.nrangeC]):
+            y = self._cons_multipliers(z)
+        h = self._step(x, v)
+        g_plus = self._lag_grad(x + h * v, y)
+        if self.central:
+            g_plus -= self._lag_grad(x - h * v, y)
+            g_plus /= 2 * h
+        else:
+            g_plus -= self._lag_grad(x, y, cached=True)
+            g_plus /= h
+        return g_plus
+
+    def hess(self, x, z=None, **kwargs):
+        """Assemble a dense approximation of the Hessian at (x, z).
+
+        The approximation is obtained from n Hessian-vector products and is
+        symmetrized.
+        """
+        e = np.zeros(self.n)
+        H = np.empty((self.n, self.n))
+        for j in xrange(self.n):
+            e[j] = 1
+            H[:, j] = self.hprod(x, z, e)
+            e[j] = 0
+        H += H.T
+        H *= 0.5
+        return H
+
+
+# Model evaluated by the workers of a process pool. It is set when the
+# workers are started, so that only points are sent to them.
+_worker_model = [None]
+
+
+def init_worker(model):
+    """Initialize a worker process of a pool used by `FDGradientModel`.
+
+    Pass as `initializer` with `initargs=(model,)` when creating a
+    `multiprocessing.Pool` to be given to :class:`FDGradientModel`.
+    """
+    _worker_model[0] = model
+
+
+def _eval_perturbed(model, x, idx, steps):
+    """Evaluate the objective of `model` at the points x + steps[k] e_idx[k].
+
+    The points are formed one at a time, or as a single block if `model`
+    has a method `obj_block`.
+    """
+    k = idx.size
+    if hasattr(model, 'obj_block'):
+        X = np.empty((x.size, k), dtype=x.dtype)
+        X[:] = x[:, None]
+        X[idx, np.arange(k)] += steps
+        return np.atleast_1d(model.obj_block(X))
+    f = np.empty(k, dtype=x.dtype)
+    for i in xrange(k):
+        y = x.copy()
+        y[idx[i]] += steps[i]
+        f[i] = model.obj(y)
+    return f
+
+
+def _worker_perturbed(task):
+    return _eval_perturbed(_worker_model[0], *task)
+
+
+class FDGradientModel(_WrappedModel):
+    u"""Model with objective gradient approximated by finite differences.
+
+    An instance of this class wraps a model that only supplies objective
+    values and approximates the gradient by forward differences
+
+        ∂f/∂xⱼ ≈ (f(x + hⱼeⱼ) - f(x)) / hⱼ,
+
+    central differences
+
+        ∂f/∂xⱼ ≈ (f(x + hⱼeⱼ) - f(x - hⱼeⱼ)) / 2hⱼ,
+
+    or, if the objective accepts complex arguments, complex steps
+
+        ∂f/∂xⱼ ≈ Im f(x + ihⱼeⱼ) / hⱼ.
+
+    The n + 1, 2n or n perturbed points are evaluated concurrently on a thread
+    or process pool if one is supplied. Each worker receives x and forms its
+    share of the perturbed points, so that they are never all stored at
+    once. If the wrapped model has a method `obj_block(X)` returning the
+    objective values at the columns of the n x k array X, perturbed points
+    are evaluated in blocks, one block per worker. The most recent objective
+    value is cached, so that f(x) is only evaluated once at each point in
+    forward mode.
+
+    Other evaluations are forwarded to the wrapped model.
+    """
+
+    def __init__(self, model, **kwargs):
+        """Instantiate a finite-difference gradient wrapper around `model`.
+
+        :parameters:
+            :model:      `NLPModel` supplying `obj`.
+
+        :keywords:
+            :method:     'forward', 'central' or 'complex'
+                         (default: 'forward')
+            :pool:       pool of workers with a `map` method, e.g., an
+                         instance of `multiprocessing.dummy.Pool`
+            :workers:    number of workers. It is required if `pool` is
+                         given. Otherwise, if `workers` > 1, a pool with
+                         that many workers is created (default: 1)
+            :processes:  the pool runs in separate processes (default:
+                         False). A process pool given as `pool` must have
+                         been created with the initializer
+                         :func:`init_worker` and arguments `(model,)`.
+        """
+        self.method = kwargs.get('method', 'forward')
+        if self.method not in ('forward', 'central', 'complex'):
+            raise ValueError('Unknown method: %s' % self.method)
+        super(FDGradientModel, self).__init__(model, 'FDG-')
+
+        self._pool = kwargs.get('pool', None)
+        self._own_pool = False
+        self._processes = kwargs.get('processes', False)
+        if self._pool is not None and 'workers' not in kwargs:
+            raise ValueError('The number of workers of the pool is required')
+        workers = kwargs.get('workers', 1)
+        if self._pool is None and workers > 1:
+            if self._processes:
+                self._pool = multiprocessing.Pool(workers,
+                                                  initializer=init_worker,
+                                                  initargs=(model,))
+            else:
+                self._pool = multiprocessing.dummy.Pool(workers)
+            self._own_pool = True
+        self.workers = workers
+
+        self._x = None  # Point at which the objective is cached.
+        self._f = None  # Cached objective value.
+
+    def close(self):
+        """Terminate the pool of workers created by this model, if any."""
+        if self._own_pool:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._own_pool = False
+
+    def obj(self, x, **kwargs):
+        """Evaluate the objective function at x and cache it."""
+        if self._x is not None and np.array_equal(self._x, x):
+            return self._f
+        f = self.model.obj(x, **kwargs)
+        self._x = np.array(x, dtype=np.float)
+        self._f = f
+        return f
+
+    def _map_perturbed(self, x, idx, steps):
+        """Evaluate the objective at x + steps[k] e_idx[k] for all k.
+
+        With a pool, the points are split in one batch per worker and each
+        worker forms the points of its batch.
+        """
+        if self._pool is None:
+            return _eval_perturbed(self.model, x, idx, steps)
+        chunks = np.array_split(np.arange(idx.size),
+                                min(idx.size, self.workers))
+        tasks = [(x, idx[chunk], steps[chunk]) for chunk in chunks]
+        if self._processes:
+            values = self._pool.map(_worker_perturbed, tasks)
+        else:
+            model = self.model
+            values = self._pool.map(lambda task: _eval_perturbed(model, *task),
+                                    tasks)
+        return np.concatenate(values)
+
+    def grad(self, x, **kwargs):
+        """Approximate the objective gradient at x."""
+        n = self.n
+        eps = np.finfo(np.double).eps
+        scale = np.maximum(1.0, np.abs(x))
+        idx = np.arange(n)
+
+        if self.method == 'complex':
+            h = 1.0e-20 * scale
+            f = self._map_perturbed(np.asarray(x, dtype=np.complex), idx,
+                                    1j * h)
+            return np.imag(f) / h
+
+        x = np.asarray(x, dtype=np.float)
+        if self.method == 'central':
+            h = eps**(1. / 3) * scale
+        else:
+            h = np.sqrt(eps) * scale
+        # Use steps that are exactly representable.
+        h = (x + h) - x
+
+        if self.method == 'central':
+            f = self._map_perturbed(x, np.concatenate((idx, idx)),
+                                    np.concatenate((h, -h)))
+            return (f[:n] - f[n:]) / (2 * h)
+
+        if self._x is not None and np.array_equal(self._x, x):
+            return (self._map_perturbed(x, idx, h) - self._f) / h
+
+        # Evaluate f(x), i.e., a zero step, along with the perturbed points.
+        f = self._map_perturbed(x, np.append(idx, 0), np.append(h, 0.0))
+        self._x = x.copy()
+        self._f = f[n]
+        return (f[:n] - f[n]) / h
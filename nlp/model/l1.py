@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from nlp.model import NLPModel
+from nlp.model.nlpmodel import NLPModel
 from pysparse.sparse import spmatrix
 from pysparse.sparse.pysparseMatrix import PysparseMatrix as sp
 
@@ -90,6 +90,8 @@ class L1MeritFunction(NLPModel):
         self.nBounds = nB
         self.nBounds2 = nB2
 
+        self._setup_plans()
+
         eqC = model.equalC
         lC = model.lowerC
         uC = model.upperC
@@ -132,12 +134,10 @@ class L1MeritFunction(NLPModel):
         # Set initial elastics so (x0, s0) is strictly feasible.
         # Note that a single elastic suffices for a range constraint.
         # s is ordered exactly like c.
-        c = self.cons_pos(x0)
+        c = np.maximum(0.0, -self.cons_pos(x0))
         self.s = self.x0[n:n+m]
-        self.s[eqC] = np.maximum(0.0, -c[eqC])
-        self.s[lC + uC] = np.maximum(0.0, -c[lC + uC])
-        self.s[rC] = np.maximum(0.0, -c[m:])
-        self.s[rC] = np.maximum(self.s[rC], -c[rC])
+        self.s[:] = c[:m]
+        self.s[rC] = np.maximum(self.s[rC], c[m:])
         self.s += self.ethresh
 
         # Shortcuts
@@ -151,16 +151,80 @@ class L1MeritFunction(NLPModel):
         # Set initial elastics for the bound constraints so (x0, t0)
         # strictly satisfies the bounds. Single elastic for 2-sided bounds.
         # t = [ lowerB | upperB | rangeB ].
+        b = x0[self._b_rows]
+        b -= self._b_shift
+        b *= -self._b_sign
+        b = np.maximum(0.0, b)
         self.t = self.x0[n+m:]
-        self.t[:nlB] = np.maximum(0.0, Lvar[lB]-x0[lB])
-        self.t[nlB:nlB+nuB] = np.maximum(0.0, x0[uB] - Uvar[uB])
-
-        self.t[nlB+nuB:nB] = np.maximum(0.0, Lvar[rB]-x0[rB])
-        self.t[nlB+nuB:nB] = np.maximum(self.t[nlB+nuB:nB], x0[rB]-Uvar[rB])
+        self.t[:] = b[:nB]
+        self.t[nlB+nuB:] = np.maximum(self.t[nlB+nuB:], b[nB:])
         self.t += self.ethresh
 
         return
 
+    def _setup_plans(self):
+        """Precompute index arrays, sign vectors and shifts.
+
+        With those, :meth:`cons_pos`, :meth:`cons` and their derivatives are
+        evaluated in a few vectorized passes without rebuilding index sets.
+        """
+        model = self.model
+        n = model.n
+        m = model.m
+        nrC = model.nrangeC
+        nlB = model.nlowerB
+        nuB = model.nupperB
+        nrB = model.nrangeB
+        nB = self.nBounds
+        nB2 = self.nBounds2
+
+        def Index(idx):
+            return np.array(idx, dtype=np.int)
+
+        self._eqC = Index(model.equalC)
+        self._ineqC = Index(model.lowerC + model.upperC + model.rangeC)
+        self._uC = Index(model.upperC)
+        self._rC = Index(model.rangeC)
+        lB = Index(model.lowerB)
+        uB = Index(model.upperB)
+        rB = Index(model.rangeB)
+
+        # Indicator of equality constraints.
+        self._eE = np.zeros(m)
+        self._eE[self._eqC] = 1
+
+        # cons_pos(x) = sign * (c(x)[rows] - shift). The same rows select
+        # the elastic associated to each reformulated constraint.
+        self._c_rows = np.concatenate((np.arange(m, dtype=np.int), self._rC))
+        self._c_sign = np.ones(m + nrC)
+        self._c_sign[self._uC] = -1
+        self._c_sign[m:] = -1
+        self._c_shift = model.Lcon[self._c_rows]
+        self._c_shift[self._uC] = model.Ucon[self._uC]
+        self._c_shift[m:] = model.Ucon[self._rC]
+
+        # Former bounds: sign * (x[rows] - shift) + t[t_rows].
+        self._b_rows = np.concatenate((lB, uB, rB, rB))
+        self._b_sign = np.concatenate((np.ones(nlB), -np.ones(nuB),
+                                       np.ones(nrB), -np.ones(nrB)))
+        self._b_shift = np.concatenate((model.Lvar[lB], model.Uvar[uB],
+                                        model.Lvar[rB], model.Uvar[rB]))
+        self._t_rows = np.concatenate((np.arange(nB, dtype=np.int),
+                                       nlB + nuB + np.arange(nrB,
+                                                             dtype=np.int)))
+
+        # Constant part of the Jacobian: elastics and former bounds.
+        r_cons = np.arange(m + nrC, dtype=np.int)
+        r_bnds = m + nrC + np.arange(nB2, dtype=np.int)
+        self._jac_rows = np.concatenate((r_cons, r_bnds, r_bnds))
+        self._jac_cols = np.concatenate((n + self._c_rows, self._b_rows,
+                                         n + m + self._t_rows))
+        self._jac_vals = np.concatenate((np.ones(m + nrC), self._b_sign,
+                                         np.ones(nB2)))
+
+        # Work vector for the constraints of the original problem.
+        self._c = np.empty(m)
+
     @property
     def nuE(self):
         return self._nuE
@@ -230,18 +294,13 @@ class L1MeritFunction(NLPModel):
 
     def nlp_multipliers(self, y, shift=True):
         """(yE, yL, yU, yRL, yRU) -> (yE-nuE, yL, -yU, yRL-yRU)"""
-        model = self.model
-        m = model.m
-        eC = model.equalC
-        uC = model.upperC
-        rC = model.rangeC
+        m = self.model.m
         (nuE, nuS, nuT) = self.get_penalty_parameters()
 
-        y_model = y[:m].copy()
+        y_model = self._c_sign[:m] * y[:m]
         if shift:
-            y_model[eC] -= nuE
-        y_model[uC] *= -1
-        y_model[rC] -= y[m:]
+            y_model[self._eqC] -= nuE
+        y_model[self._rC] -= y[m:]
         return y_model
 
     def obj(self, xst, f=None, c=None):
@@ -258,10 +317,7 @@ class L1MeritFunction(NLPModel):
 
         # Shortcuts.
         model = self.model
-        eqC = model.equalC
-        lC = model.lowerC
-        uC = model.upperC
-        rC = model.rangeC
+        eqC = self._eqC
 
         (x, s, t) = self.get_xst(xst)
 
@@ -270,9 +326,9 @@ class L1MeritFunction(NLPModel):
             c = self.cons_pos(x)
 
         # Add contribution from ...
-        p += self.nuE * np.sum(c[eqC] + 2*s[eqC])  # ... equalities
-        p += self.nuS * np.sum(s[lC + uC + rC])    # ... inequalities
-        p += self.nuT * np.sum(t)                  # ... bounds
+        p += self.nuE * (np.sum(c[eqC]) + 2 * np.sum(s[eqC]))  # equalities
+        p += self.nuS * np.sum(s[self._ineqC])  # ... inequalities
+        p += self.nuT * np.sum(t)               # ... bounds
 
         return p
 
@@ -297,39 +353,16 @@ class L1MeritFunction(NLPModel):
             :c:  constraint vector of original problem, if available.
         """
 
-        # Shortcuts.
-        model = self.model
-        n = model.n
-        m = model.m
-        nB = self.nBounds
-        nB2 = self.nBounds2
-        eqC = model.equalC
-        lC = model.lowerC
-        uC = model.upperC
-        rC = model.rangeC
-        nrC = model.nrangeC
-        Lcon = model.Lcon
-        Ucon = model.Ucon
-
-        ec = np.empty(self.m)  # Reformulated constraints.
-
-        # General constraints.
-        ec[:m] = model.cons(x) if c is None else c[:]
-        ec[m:m+nrC] = ec[rC]
-        ec[eqC] -= Lcon[eqC]
-        ec[lC] -= Lcon[lC]
-
-        ec[uC] -= Ucon[uC]
-        ec[uC] *= -1
-
-        ec[rC] -= Lcon[rC]
-
-        ec[m:m+nrC] -= Ucon[rC]
-        ec[m:m+nrC] *= -1
+        if c is None:
+            c = self.model.cons(x, out=self._c)
 
+        # Reformulated constraints.
+        ec = c[self._c_rows]
+        ec -= self._c_shift
+        ec *= self._c_sign
         return ec
 
-    def cons(self, xst, c=None):
+    def cons(self, xst, c=None, out=None):
         u"""
         Return the vector of constraints of the L1 elastic problem based on
         the constraints of the original NLP:
@@ -352,61 +385,37 @@ class L1MeritFunction(NLPModel):
 
         :keywords:
             :c:  constraint vector of original problem, if available.
+            :out: vector in which to store the result, if specified.
         """
 
         # Shortcuts.
         model = self.model
-        n = model.n
-        m = model.m
-        nB = self.nBounds
-        nB2 = self.nBounds2
-        eqC = model.equalC
-        lC = model.lowerC
-        uC = model.upperC
-        rC = model.rangeC
-        nrC = model.nrangeC
-        Lcon = model.Lcon
-        Ucon = model.Ucon
-        lB = model.lowerB
-        nlB = model.nlowerB
-        uB = model.upperB
-        nuB = model.nupperB
-        rB = model.rangeB
-        nrB = model.nrangeB
-        Lvar = model.Lvar
-        Uvar = model.Uvar
+        mC = model.m + model.nrangeC
 
         (x, s, t) = self.get_xst(xst)
+        if c is None:
+            c = model.cons(x, out=self._c)
 
-        ec = np.empty(m + nrC + nB2)  # Elastic constraints.
+        # Elastic constraints.
+        ec = np.empty(self.m) if out is None else out
 
         # General constraints.
-        ec[:m] = model.cons(x) if c is None else c[:]
-        ec[m:m+nrC] = ec[rC]
-        ec[eqC] -= Lcon[eqC]
-        ec[lC] -= Lcon[lC]
-
-        ec[uC] -= Ucon[uC]
-        ec[uC] *= -1
-
-        ec[rC] -= Lcon[rC]
-        ec[m:m+nrC] -= Ucon[rC]
-        ec[m:m+nrC] *= -1
-        ec[:m] += s
-        ec[m:m+nrC] += s[rC]
+        ec1 = ec[:mC]
+        np.take(c, self._c_rows, out=ec1)
+        ec1 -= self._c_shift
+        ec1 *= self._c_sign
+        ec1 += s[self._c_rows]
 
         # Former bounds that became linear inequalities.
-        ec2 = ec[m+nrC:]
-        ec2[:nlB] = x[lB] - Lvar[lB]
-        ec2[nlB:nlB+nuB] = Uvar[uB] - x[uB]
-        ec2[nlB+nuB:nB] = x[rB] - Lvar[rB]
-        ec2[nB:] = Uvar[rB] - x[rB]
-        ec2[:nB] += t
-        ec2[nB:] += t[nlB+nuB:]
+        ec2 = ec[mC:]
+        np.take(x, self._b_rows, out=ec2)
+        ec2 -= self._b_shift
+        ec2 *= self._b_sign
+        ec2 += t[self._t_rows]
 
         return ec
 
-    def grad(self, xst, g=None):
+    def grad(self, xst, g=None, out=None):
         """
         Return the gradient vector of the L1 merit function.
 
@@ -415,41 +424,34 @@ class L1MeritFunction(NLPModel):
 
         :keywords:
             :g:  gradient vector of the objective function, if available.
+            :out: vector in which to store the result, if specified.
         """
 
         # Shortcuts.
         model = self.model
         n = model.n
         m = model.m
-        eqC = model.equalC
-        neqC = model.nequalC
-        lC = model.lowerC
-        uC = model.upperC
-        rC = model.rangeC
-        nlB = model.nlowerB
-        nuB = model.nupperB
-        nrB = model.nrangeB
-        nB = self.nBounds
         (x, s, t) = self.get_xst(xst)
 
-        grad = np.empty(self.n)
+        grad = np.empty(self.n) if out is None else out
 
         # Assemble x-part of gradient.
-        grad[:n] = model.grad(x) if g is None else g[:]
-        if neqC > 0:
-            _JE = model.jac(x)[eqC, :]
-            JE = PysparseLinearOperator(_JE)
-            eE = np.ones(neqC)
-            grad[:n] += self.nuE * (JE.T * eE)
+        if g is None:
+            model.grad(x, out=grad[:n])
+        else:
+            grad[:n] = g
+        if model.nequalC > 0:
+            # Sum of the gradients of the equality constraints.
+            grad[:n] += self.nuE * model.jtprod(x, self._eE)
 
         # Assemble s-part of gradient.
         grads = grad[n:n+m]
-        grads[lC+uC+rC] = self.nuS
-        grads[eqC] = 2*self.nuE
+        grads[:] = 0
+        grads[self._ineqC] = self.nuS
+        grads[self._eqC] = 2 * self.nuE
 
         # Assemble t-part of gradient.
-        gradt = grad[n+m:]
-        gradt[:] = self.nuT * np.ones(nB)
+        grad[n+m:] = self.nuT
 
         return grad
 
@@ -512,27 +514,11 @@ class L1MeritFunction(NLPModel):
                  method.
         """
 
-        def Range(*args):
-            return np.arange(*args, dtype=np.int)
-
         # Shortcuts.
         model = self.model
         n = model.n
         m = model.m
-        eqC = model.equalC
-        neqC = model.nequalC
-        lC = model.lowerC
-        nlC = model.nlowerC
-        uC = model.upperC
-        nuC = model.nupperC
-        rC = model.rangeC
         nrC = model.nrangeC
-        lB = model.lowerB
-        nlB = model.nlowerB
-        uB = model.upperB
-        nuB = model.nupperB
-        rB = model.rangeB
-        nrB = model.nrangeB
         nB = self.nBounds
         nB2 = self.nBounds2
         (x, s, t) = self.get_xst(xst)
@@ -553,43 +539,12 @@ class L1MeritFunction(NLPModel):
                 sizeHint=model.nnzj+10*nrC+2*m+2*nB+nB2)
 
         # Contributions from original problem variables.
-        r_lB = Range(nlB)
-        r_uB = Range(nuB)
-        r_rB = Range(nrB)
         Jp[:m+nrC, :n] = self.jac_pos(x) if J is None else J[:, :]
-        Jp.put(1, m + nrC + r_lB, lB)              # l ≤  x.
-        Jp.put(-1, m + nrC + nlB + r_uB, uB)       # x  ≤ u.
-        Jp.put(1, m + nrC + nlB + nuB + r_rB, rB)  # l ≤  x (≤ u).
-        Jp.put(-1, m + nrC + nB + r_rB, rB)        # (l ≤) x  ≤ u.
-
-        # Contributions from elastics on original bound constraints.
-        Jp.put(1, m + nrC + r_lB, n + m + r_lB)              # xL + tL ≥  l.
-        Jp.put(1, m + nrC + nlB + r_uB, n + m + nlB + r_uB)  # -xU + tU ≥ -u.
-        # xR + tR ≥ l  and  -xR + tR ≥ -u.
-        Jp.put(1, m + nrC + nlB + nuB + r_rB, n + m + nlB + nuB + r_rB)
-        Jp.put(1, m + nrC + nlB + nuB + nrB + r_rB, n + m + nlB + nuB + r_rB)
-
-        # Note that in the Jacobian, the elastics are ordered exactly like the
-        # constraints of the original problem.
-
-        # Contributions from elastics for equality constraints.
-        a_eqC = np.array(eqC)
-        Jp.put(1, eqC, n + a_eqC)                     # cE(x) + sE ≥ 0.
-
-        # Contributions from elastics for lower inequality constraints.
-        # r_lC = Range(nlC)
-        a_lC = np.array(lC)
-        Jp.put(1, lC, n + a_lC)
-
-        # Contributions from elastics for upper inequality constraints.
-        a_uC = np.array(uC)
-        Jp.put(1, uC, n + a_uC)
-
-        # Contributions from elastics for range constraints.
-        r_rC = Range(nrC)
-        a_rC = np.array(rC)
-        Jp.put(1, rC, n + a_rC)
-        Jp.put(1, m + r_rC, n + a_rC)
+
+        # Contributions from former bounds and from elastics, which are
+        # ordered exactly like the constraints of the original problem.
+        # Those are precomputed in _setup_plans().
+        Jp.put(self._jac_vals, self._jac_rows, self._jac_cols)
 
         return Jp
 
@@ -774,6 +729,12 @@ class L1BarrierMeritFunction(NLPModel):
         self.x0 = self.l1.x0
         self.pi0 = self.l1.pi0
         self._mu = mu
+
+        # Persistent barrier Hessian and its sparsity pattern.
+        self._hbar = None
+        self._hkeys = None
+        self._hrows = None
+        self._hcols = None
         return
 
     @property
@@ -867,6 +828,8 @@ class L1BarrierMeritFunction(NLPModel):
             :c:  Constraint vector of the l1 problem, if available.
             :J:  Jacobian of the constraints of the l1 problem, if available.
             :H:  Hessian of the Lagrangian of the l1 problem, or an estimate.
+                 Only its lower triangle is used, so that `H` may be stored
+                 as a symmetric or as a general matrix.
         """
 
         # Shortcuts
@@ -886,13 +849,57 @@ class L1BarrierMeritFunction(NLPModel):
         uv = yzuv[l1.m:]
 
         # Hbar = H(xst) + J(xst)' C(xst)^{-1} YZ J(xst) + bits with u and v.
-        Hbar = l1.hess(xst, yzuv) if H is None else H.copy()
-        _JCYJ = spmatrix.symdot(J.matrix, yz / c)
-        JCYJ = sp(matrix=_JCYJ)
-        Hbar += JCYJ
-        r1 = range(n, self.n - 1)
-        Hbar.addAt(uv / st, r1, r1)
-        return Hbar
+        if H is None:
+            H = l1.hess(xst, yzuv)
+        JCYJ = spmatrix.symdot(J.matrix, yz / c)
+        (hvals, hrows, hcols) = H.find()
+        lower = hrows >= hcols
+        (hvals, hrows, hcols) = (hvals[lower], hrows[lower], hcols[lower])
+        (jvals, jrows, jcols) = JCYJ.find()
+        r1 = np.arange(n, self.n, dtype=np.int)
+        vals = np.concatenate((hvals, jvals, uv / st))
+        rows = np.concatenate((hrows, jrows, r1))
+        cols = np.concatenate((hcols, jcols, r1))
+        return self._update_hbar(vals, rows, cols)
+
+    def _update_hbar(self, vals, rows, cols):
+        """Sum triplets into the persistent barrier Hessian.
+
+        Each off-diagonal entry must appear in a single triangle, as entries
+        above the diagonal are moved below it and summed with the others.
+        The sparsity pattern of the barrier Hessian is determined on the first
+        call. Subsequent calls only update its values in place, unless new
+        nonzeros appear, in which case the pattern is extended.
+
+        The matrix returned is updated by subsequent calls.
+        """
+        # Only the lower triangle of symmetric matrices is stored.
+        (rows, cols) = (np.maximum(rows, cols), np.minimum(rows, cols))
+        keys = rows * self.n + cols
+
+        hkeys = self._hkeys
+        pos = None
+        if hkeys is not None and hkeys.size > 0:
+            pos = np.searchsorted(hkeys, keys)
+            pos[pos == hkeys.size] = 0
+            if not np.all(hkeys[pos] == keys):
+                pos = None
+
+        if pos is None:
+            # (Re)compute sparsity pattern.
+            if hkeys is None:
+                self._hkeys = np.unique(keys)
+            else:
+                self._hkeys = np.union1d(hkeys, keys)
+            pos = np.searchsorted(self._hkeys, keys)
+            self._hrows = self._hkeys // self.n
+            self._hcols = self._hkeys % self.n
+            self._hbar = sp(nrow=self.n, ncol=self.n, symmetric=True,
+                            sizeHint=self._hkeys.size, storeZeros=True)
+
+        hvals = np.bincount(pos, weights=vals, minlength=self._hkeys.size)
+        self._hbar.put(hvals, self._hrows, self._hcols)
+        return self._hbar
 
     def hop(self, *args, **kwargs):
         """Obtain Lagrangian Hessian as a linear operator."""
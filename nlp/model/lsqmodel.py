@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Nonlinear least-squares models with a Gauss-Newton Hessian."""
+
+from nlp.model.nlpmodel import NLPModel
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+def _matvec(A, v):
+    """Return the product of a matrix or operator with v."""
+    if isinstance(A, np.ndarray):
+        return np.dot(A, v)
+    return A * v
+
+
+class LSQModel(NLPModel):
+    u"""Nonlinear least-squares problem.
+
+        minimize  ½‖r(x)‖²
+
+    where r(x) is a vector of `nres` residuals, possibly subject to the
+    bounds and constraints of `NLPModel`. Subclasses implement :meth:`res`
+    and :meth:`jac_res`, or :meth:`res`, :meth:`jprod_res` and
+    :meth:`jtprod_res` if the Jacobian J(x) of the residuals is only
+    available through products.
+
+    The gradient is J(x)ᵀr(x) and the Hessian is replaced by the
+    Gauss-Newton matrix J(x)ᵀJ(x), which neglects the second derivatives of
+    the residuals. The multipliers are ignored, i.e., the constraints are
+    assumed to be linear. The residuals and their Jacobian are evaluated
+    once per x, so that :meth:`obj`, :meth:`grad` and the products with the
+    Hessian at the same x share them.
+    """
+
+    # Residual evaluations are counted in addition to the usual methods.
+    _counted_meths = NLPModel._counted_meths + ["res", "jac_res"]
+
+    def __init__(self, n, nres, name='LSQ-Generic', **kwargs):
+        """Initialize a model with `n` variables and `nres` residuals.
+
+        :parameters:
+
+            :n:       number of variables
+            :nres:    number of residuals
+            :name:    model name (default: 'LSQ-Generic')
+
+        See the documentation of `NLPModel` for the keywords.
+        """
+        self._nres = nres
+        self._res_cache = None
+        self._jac_res_cache = None
+        super(LSQModel, self).__init__(n, name=name, **kwargs)
+
+    @property
+    def nres(self):
+        """Number of residuals."""
+        return self._nres
+
+    def res(self, x):
+        """Evaluate the residuals at x."""
+        raise NotImplementedError('This method must be subclassed.')
+
+    def jac_res(self, x):
+        """Evaluate the Jacobian of the residuals at x.
+
+        Return a Numpy array, a SciPy sparse matrix or a linear operator.
+        """
+        raise NotImplementedError('This method must be subclassed.')
+
+    def _cached_res(self, x):
+        """Return the residuals at x, evaluating them only if x changed."""
+        cache = self._res_cache
+        if cache is not None and np.array_equal(cache[0], x):
+            return cache[1]
+        r = self.res(x)
+        self._res_cache = (np.array(x, dtype=np.float, copy=True), r)
+        return r
+
+    def _cached_jac_res(self, x):
+        """Return the residual Jacobian at x, evaluating it if x changed."""
+        cache = self._jac_res_cache
+        if cache is not None and np.array_equal(cache[0], x):
+            return cache[1]
+        J = self.jac_res(x)
+        self._jac_res_cache = (np.array(x, dtype=np.float, copy=True), J)
+        return J
+
+    def _dense_jac_res(self, x):
+        """Return the residual Jacobian at x if it is an array, else None."""
+        try:
+            J = self._cached_jac_res(x)
+        except NotImplementedError:
+            return None
+        return J if isinstance(J, np.ndarray) else None
+
+    def jprod_res(self, x, v):
+        """Evaluate the product of the residual Jacobian at x with v."""
+        return _matvec(self._cached_jac_res(x), v)
+
+    def jtprod_res(self, x, u):
+        """Evaluate the product of the transposed residual Jacobian with u."""
+        J = self._cached_jac_res(x)
+        if isinstance(J, np.ndarray):
+            return np.dot(u, J)
+        return J.T * u
+
+    def obj(self, x):
+        u"""Evaluate the objective ½‖r(x)‖² at x."""
+        r = self._cached_res(x)
+        return 0.5 * np.dot(r, r)
+
+    def grad(self, x):
+        u"""Evaluate the objective gradient J(x)ᵀr(x) at x."""
+        return self.jtprod_res(x, self._cached_res(x))
+
+    def hess(self, x, z=None, **kwargs):
+        u"""Evaluate the Gauss-Newton Hessian J(x)ᵀJ(x).
+
+        A dense array is returned if :meth:`jac_res` returns an array, and a
+        linear operator otherwise.
+
+        :keywords:
+            :obj_weight: weight of the objective (default: 1)
+        """
+        obj_weight = kwargs.get('obj_weight', 1.0)
+        J = self._dense_jac_res(x)
+        if J is not None:
+            return obj_weight * np.dot(J.T, J)
+        return self.hop(x, z, **kwargs)
+
+    def hprod(self, x, z, v, **kwargs):
+        u"""Evaluate the product of the Gauss-Newton Hessian with v.
+
+        The product J(x)ᵀ(J(x) v) is formed without J(x)ᵀJ(x).
+
+        :keywords:
+            :obj_weight: weight of the objective (default: 1)
+        """
+        obj_weight = kwargs.get('obj_weight', 1.0)
+        Hv = self.jtprod_res(x, self.jprod_res(x, v))
+        if obj_weight != 1.0:
+            Hv *= obj_weight
+        return Hv
+
+    def hprod_block(self, x, z, V, **kwargs):
+        """Evaluate the products of the Gauss-Newton Hessian with a block.
+
+        When :meth:`jac_res` returns an array, all products are obtained
+        from two matrix-matrix products.
+        """
+        J = self._dense_jac_res(x)
+        if J is None:
+            return super(LSQModel, self).hprod_block(x, z, V, **kwargs)
+        HV = np.dot(J.T, np.dot(J, V))
+        obj_weight = kwargs.get('obj_weight', 1.0)
+        if obj_weight != 1.0:
+            HV *= obj_weight
+        return HV
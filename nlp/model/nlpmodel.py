@@ -4,13 +4,30 @@
 import logging
 import os
 import sys
+from contextlib import contextmanager
 import numpy as np
 from nlp.model.kkt import KKTresidual
-from nlp.tools.decorators import deprecated, counter
+from nlp.tools.decorators import deprecated, counter, optional_out
 from nlp.tools.utils import where
-from pykrylov.linop.linop import LinearOperator, DiagonalOperator, \
-    ReducedLinearOperator
-from pykrylov.linop.blkop import BlockLinearOperator
+from pykrylov.linop.linop import LinearOperator
+
+try:
+    from scipy import sparse as sp
+except ImportError:
+    sp = None
+
+
+def _is_matrix(A):
+    """Return True if A is a Numpy array or a SciPy sparse matrix."""
+    return isinstance(A, np.ndarray) or (sp is not None and sp.issparse(A))
+
+
+def _zeros(n, out=None):
+    """Return a vector of `n` zeros, stored in `out` if specified."""
+    if out is None:
+        return np.zeros(n, dtype=np.float)
+    out[:] = 0
+    return out
 
 
 class NLPModel(object):
@@ -23,6 +40,14 @@ class NLPModel(object):
 
     _id = -1
 
+    # Methods that accept an optional `out` keyword argument.
+    _out_meths = ["grad", "cons", "jprod", "jtprod", "hprod"]
+
+    # Methods whose number of calls is counted.
+    _counted_meths = ["obj", "grad", "hess", "cons", "icons", "igrad",
+                      "sigrad", "jac", "jprod", "jtprod", "hprod", "hiprod",
+                      "ghivprod", "jprod_block", "jtprod_block", "hprod_block"]
+
     def __init__(self, n, m=0, name='Generic', **kwargs):
         """Initialize a model with `n` variables and `m` constraints.
 
@@ -149,6 +174,8 @@ class NLPModel(object):
         self.permB = self.fixedB + self.lowerB + self.upperB + \
             self.rangeB + self.freeB
 
+        self._setup_pos_maps()
+
         # Define default stopping tolerances
         self._stop_d = 1.0e-6    # Dual feasibility
         self._stop_c = 1.0e-6    # Complementarty
@@ -159,6 +186,9 @@ class NLPModel(object):
         self.scale_obj = None   # Objective scaling
         self.scale_con = None   # Constraint scaling
 
+        # Point pinned by `at`, if any.
+        self._pinned_x = None
+
         # Problem-specific logger.
         self.__class__._id += 1
         self._id = self.__class__._id
@@ -170,11 +200,64 @@ class NLPModel(object):
         self.logger.addHandler(hndlr)
         self._setup_counters()
 
+    def _setup_pos_maps(self):
+        """Precompute the affine maps behind :meth:`cons_pos` and :meth:`bounds`.
+
+        The constraints are reformulated as
+
+          cons_pos(x) = sign * c(x)[rows] + offset,
+
+        where `rows` lists all constraints in natural order followed by range
+        constraints a second time. Similarly,
+
+          bounds(x) = bsign * x[brows] + boffset.
+        """
+        m = self.m
+        nrC = self.nrangeC
+        equalC = np.array(self.equalC, dtype=np.int)
+        lowerC = np.array(self.lowerC, dtype=np.int)
+        upperC = np.array(self.upperC, dtype=np.int)
+        rangeC = np.array(self.rangeC, dtype=np.int)
+
+        self._pos_rows = np.concatenate((np.arange(m, dtype=np.int), rangeC))
+        self._pos_sign = np.ones(m + nrC)
+        self._pos_sign[upperC] = -1
+        self._pos_sign[m:] = -1
+        shift = np.zeros(m + nrC)
+        shift[equalC] = self.Lcon[equalC]
+        shift[lowerC] = self.Lcon[lowerC]
+        shift[rangeC] = self.Lcon[rangeC]
+        shift[upperC] = self.Ucon[upperC]
+        shift[m:] = self.Ucon[rangeC]
+        self._pos_offset = -self._pos_sign * shift
+
+        # Row of cons_pos that duplicates each constraint, or -1.
+        self._pos_dup = -np.ones(m, dtype=np.int)
+        self._pos_dup[rangeC] = m + np.arange(nrC, dtype=np.int)
+
+        lowerB = np.array(self.lowerB, dtype=np.int)
+        upperB = np.array(self.upperB, dtype=np.int)
+        rangeB = np.array(self.rangeB, dtype=np.int)
+        self._bnd_rows = np.concatenate((lowerB, upperB, rangeB, rangeB))
+        self._bnd_sign = np.concatenate((np.ones(self.nlowerB),
+                                         -np.ones(self.nupperB),
+                                         np.ones(self.nrangeB),
+                                         -np.ones(self.nrangeB)))
+        shift = np.concatenate((self.Lvar[lowerB], self.Uvar[upperB],
+                                self.Lvar[rangeB], self.Uvar[rangeB]))
+        self._bnd_offset = -self._bnd_sign * shift
+
     def _setup_counters(self):
-        meths = ["obj", "grad", "hess", "cons", "icons", "igrad", "sigrad",
-                 "jac", "jprod", "jtprod", "hprod", "hiprod", "ghivprod"]
-        for meth in meths:
-            setattr(self, meth, counter(getattr(self, meth)))
+        for meth in self._counted_meths:
+            func = getattr(self, meth)
+            if meth in self._out_meths:
+                func = optional_out(func)
+            setattr(self, meth, counter(func))
+
+    def reset_counters(self):
+        """Reset the number of calls to each evaluation method."""
+        for meth in self._counted_meths:
+            getattr(self, meth).ncalls = 0
 
     @property
     def nvar(self):
@@ -327,9 +410,10 @@ class NLPModel(object):
 
         # Remove scaling if requested
         if reset:
-            self.scale_con = None
-            self.Lcon = self.model.get_Lcon()  # lower bounds on constraints
-            self.Ucon = self.model.get_Ucon()  # upper bounds on constraints
+            if self.scale_con is not None:
+                (self.Lcon, self.Ucon) = self._unscaled_con_bounds
+                self.scale_con = None
+                self._setup_pos_maps()
             return
 
         # Quick return if the problem is already scaled
@@ -359,8 +443,10 @@ class NLPModel(object):
         self.scale_con = d_c
 
         # Scale constraint bounds: componentwise multiplications
-        self.Lcon *= d_c        # lower bounds on constraints
-        self.Ucon *= d_c        # upper bounds on constraints
+        self._unscaled_con_bounds = (self.Lcon, self.Ucon)
+        self.Lcon = self.Lcon * d_c  # lower bounds on constraints
+        self.Ucon = self.Ucon * d_c  # upper bounds on constraints
+        self._setup_pos_maps()
 
         # Return largest row norm and its index
         return (imaxNorm, gmaxNorm)
@@ -518,21 +604,8 @@ class NLPModel(object):
 
         [lowerB | upperB | rangeB (lower) | rangeB (upper) ].
         """
-        lB = self.lowerB
-        uB = self.upperB
-        rB = self.rangeB
-        nlB = self.nlowerB
-        nuB = self.nupperB
-        nrB = self.nrangeB
-        nB = self.nbounds
-        Lvar = self.Lvar
-        Uvar = self.Uvar
-
-        b = np.empty(nB + nrB, dtype=x.dtype)
-        b[:nlB] = x[lB] - Lvar[lB]
-        b[nlB:nlB + nuB] = Uvar[uB] - x[uB]
-        b[nlB + nuB:nlB + nuB + nrB] = x[rB] - Lvar[rB]
-        b[nlB + nuB + nrB:] = Uvar[rB] - x[rB]
+        b = self._bnd_sign * x[self._bnd_rows]
+        b += self._bnd_offset
         return b
 
     def obj(self, x, **kwargs):
@@ -540,14 +613,19 @@ class NLPModel(object):
         raise NotImplementedError('This method must be subclassed.')
 
     def grad(self, x, **kwargs):
-        """Evaluate the objective gradient at x."""
+        """Evaluate the objective gradient at x.
+
+        If the keyword argument `out` is specified, the gradient is stored
+        in `out`. The same holds for :meth:`cons`, :meth:`jprod`,
+        :meth:`jtprod` and :meth:`hprod`.
+        """
         raise NotImplementedError('This method must be subclassed.')
 
     def cons(self, x, **kwargs):
         """Evaluate vector of constraints at x."""
         raise NotImplementedError('This method must be subclassed.')
 
-    def cons_pos(self, x):
+    def cons_pos(self, x, out=None):
         """Convenience function to return constraints as non negative ones.
 
         Constraints are reformulated as
@@ -562,25 +640,17 @@ class NLPModel(object):
         Scaling should be applied in cons().
         """
         m = self.m
-        equalC = self.equalC
-        lowerC = self.lowerC
-        upperC = self.upperC
-        rangeC = self.rangeC
-        nrangeC = self.nrangeC
 
         # Set the type of c to the type of x to allow for object arrays.
         # This is useful to AD packages.
-        c = np.empty(m + nrangeC, dtype=x.dtype)
-        c[:m] = self.cons(x)
-        c[m:] = c[rangeC]
-
-        c[equalC] -= self.Lcon[equalC]
-        c[lowerC] -= self.Lcon[lowerC]
-        c[upperC] -= self.Ucon[upperC]
-        c[upperC] *= -1
-        c[rangeC] -= self.Lcon[rangeC]
-        c[m:] -= self.Ucon[rangeC]
-        c[m:] *= -1
+        if out is None:
+            c = np.empty(m + self.nrangeC, dtype=x.dtype)
+        else:
+            c = out
+        self.cons(x, out=c[:m])
+        np.take(c[:m], self._pos_rows[m:], out=c[m:])
+        c *= self._pos_sign
+        c += self._pos_offset
 
         return c
 
@@ -604,6 +674,30 @@ class NLPModel(object):
         """Evaluate the Jacobian of :meth:`cons_pos` at x."""
         raise NotImplementedError('This method must be subclassed.')
 
+    def _jac_pos_coord(self, vals, rows, cols):
+        """Map the Jacobian of :meth:`cons` to that of :meth:`cons_pos`.
+
+        Both Jacobians are given in coordinate format. Each nonzero is scaled
+        by the sign of its row, and nonzeros in range constraints are repeated
+        with a flipped sign in the rows appended by :meth:`cons_pos`.
+        """
+        dup = self._pos_dup[rows]
+        rdup = np.where(dup >= 0)[0]
+        pvals = np.concatenate((self._pos_sign[rows] * vals, -vals[rdup]))
+        prows = np.concatenate((rows, dup[rdup]))
+        pcols = np.concatenate((cols, cols[rdup]))
+        return (pvals, prows, pcols)
+
+    def _cons_multipliers(self, z):
+        """Map multipliers of :meth:`cons_pos` to multipliers of :meth:`cons`.
+
+        Return y such that the Hessian of the Lagrangian at (x, z) is that of
+        f(x) - y'c(x). Bound constraints are linear and do not contribute.
+        """
+        m = self.m
+        weights = self._pos_sign * z[:m + self.nrangeC]
+        return np.bincount(self._pos_rows, weights=weights, minlength=m)
+
     def jprod(self, x, p, **kwargs):
         """Evaluate Jacobian-vector product at x with p."""
         raise NotImplementedError('This method must be subclassed')
@@ -612,6 +706,34 @@ class NLPModel(object):
         """Evaluate transposed-Jacobian-vector product at x with p."""
         raise NotImplementedError('This method must be subclassed')
 
+    def jprod_block(self, x, V, **kwargs):
+        """Evaluate the products of the Jacobian at x with the columns of V.
+
+        V is an n x k array and the result is an m x k array. By default,
+        :meth:`jprod` is called once per column with x pinned by :meth:`at`.
+        Subclasses that can apply the Jacobian to several directions at once
+        should override this method.
+        """
+        V = np.asarray(V, dtype=np.float)
+        JV = np.empty((self.m, V.shape[1]))
+        with self.at(x):
+            for k in xrange(V.shape[1]):
+                JV[:, k] = self.jprod(x, V[:, k], **kwargs)
+        return JV
+
+    def jtprod_block(self, x, U, **kwargs):
+        """Evaluate the products of the transposed Jacobian at x with U.
+
+        U is an m x k array and the result is an n x k array. By default,
+        :meth:`jtprod` is called once per column with x pinned by :meth:`at`.
+        """
+        U = np.asarray(U, dtype=np.float)
+        JTU = np.empty((self.n, U.shape[1]))
+        with self.at(x):
+            for k in xrange(U.shape[1]):
+                JTU[:, k] = self.jtprod(x, U[:, k], **kwargs)
+        return JTU
+
     def jop(self, x):
         """Obtain Jacobian at x as a linear operator."""
         return LinearOperator(self.n, self.m,
@@ -623,13 +745,23 @@ class NLPModel(object):
     def jop_pos(self, x):
         """Jacobian of :meth:`cons_pos` at x as a linear operator."""
         J = self.jop(x)
-        e = np.ones(self.ncon + self.nrangeC)
-        e[self.upperC] = -1
-        e[self.ncon:] = -1
-        JR = ReducedLinearOperator(J, self.rangeC, range(self.nvar))
-        Jpos = BlockLinearOperator([[J], [JR]], dtype=np.float)
-        D = DiagonalOperator(e)
-        return D * Jpos  # Flip sign of 'upper' constraints.
+        m = self.m
+        rows = self._pos_rows
+        sign = self._pos_sign
+
+        def matvec(v):
+            Jv = J * v
+            Jv = Jv[rows]
+            Jv *= sign
+            return Jv
+
+        def matvec_transp(u):
+            return J.T * np.bincount(rows, weights=sign * u, minlength=m)
+
+        return LinearOperator(self.n, m + self.nrangeC, matvec,
+                              matvec_transp=matvec_transp,
+                              symmetric=False,
+                              dtype=np.float)
 
     def lag(self, x, z, **kwargs):
         """Evaluate Lagrangian at (x, z).
@@ -661,6 +793,21 @@ class NLPModel(object):
         """
         raise NotImplementedError('This method must be subclassed.')
 
+    def hprod_block(self, x, z, V, **kwargs):
+        """Evaluate the products of the Lagrangian Hessian with a block.
+
+        Evaluate the products between the Hessian of the Lagrangian at
+        (x, z) and the columns of the n x k array V. The result is an n x k
+        array. By default, :meth:`hprod` is called once per column with x
+        pinned by :meth:`at`. The keywords are passed on to :meth:`hprod`.
+        """
+        V = np.asarray(V, dtype=np.float)
+        HV = np.empty((self.n, V.shape[1]))
+        with self.at(x):
+            for k in xrange(V.shape[1]):
+                HV[:, k] = self.hprod(x, z, V[:, k], **kwargs)
+        return HV
+
     def hiprod(self, i, x, p, **kwargs):
         """Constraint Hessian-vector product.
 
@@ -684,6 +831,51 @@ class NLPModel(object):
                               symmetric=True,
                               dtype=np.float)
 
+    def set_x(self, x):
+        """Declare x as the point at which subsequent evaluations occur.
+
+        Models that can reuse work across evaluations at the same point
+        should override this method and :meth:`unset_x`. By default, it does
+        nothing. Prefer :meth:`at` to calling this method directly.
+        """
+        pass
+
+    def unset_x(self):
+        """Release the point declared by :meth:`set_x`."""
+        pass
+
+    @contextmanager
+    def at(self, x):
+        """Context manager pinning x for the evaluations in its block.
+
+        Use as in::
+
+            with model.at(x):
+                f = model.obj(x)
+                g = model.grad(x)
+                Hv = model.hprod(x, z, v)
+
+        All evaluations inside the block must be performed at x. Blocks may
+        be nested. On exit, the point pinned by the enclosing block, if
+        any, is restored. A copy of x is pinned, so that a nested block
+        notices if x was changed in place.
+        """
+        pinned = self._pinned_x
+        if pinned is not None and np.array_equal(pinned, x):
+            yield self
+            return
+
+        self.set_x(x)
+        self._pinned_x = np.array(x, copy=True)
+        try:
+            yield self
+        finally:
+            self._pinned_x = pinned
+            if pinned is None:
+                self.unset_x()
+            else:
+                self.set_x(pinned)
+
     def display_basic_info(self):
         """Display vital statistics about the current model."""
         write = self.logger.info
@@ -786,16 +978,16 @@ class QPModel(NLPModel):
         cHx += self.c
         return np.dot(cHx, x)
 
-    def grad(self, x):
+    def grad(self, x, out=None):
         """Evaluate the objective gradient at x."""
-        Hx = self.hprod(x, 0, x)
+        Hx = self.hprod(x, 0, x, out=out)
         Hx += self.c
         return Hx
 
-    def cons(self, x):
+    def cons(self, x, out=None):
         """Evaluate the constraints at x."""
         if isinstance(self.A, np.ndarray):
-            return np.dot(self.A, x)
+            return np.dot(self.A, x, out=out)
         return self.A * x
 
     def A(self, x):
@@ -806,30 +998,60 @@ class QPModel(NLPModel):
         """Evaluate the constraints Jacobian at x."""
         return self.A
 
-    def jprod(self, x, p):
+    def jprod(self, x, p, out=None):
         """Evaluate Jacobian-vector product at x with p."""
-        return self.cons(p)
+        return self.cons(p, out=out)
 
-    def jtprod(self, x, p):
+    def jtprod(self, x, p, out=None):
         """Evaluate transposed-Jacobian-vector product at x with p."""
         if isinstance(self.A, np.ndarray):
-            return np.dot(self.A.T, p)
+            return np.dot(self.A.T, p, out=out)
         return self.A.T * p
 
+    def jprod_block(self, x, V):
+        """Evaluate the products of the Jacobian with the columns of V.
+
+        When A is an array or a sparse matrix, all products are obtained
+        from a single matrix-matrix product.
+        """
+        if _is_matrix(self.A):
+            return np.asarray(self.A.dot(V))
+        return super(QPModel, self).jprod_block(x, V)
+
+    def jtprod_block(self, x, U):
+        """Evaluate the products of the transposed Jacobian with U.
+
+        When A is an array or a sparse matrix, all products are obtained
+        from a single matrix-matrix product.
+        """
+        if _is_matrix(self.A):
+            return np.asarray(self.A.T.dot(U))
+        return super(QPModel, self).jtprod_block(x, U)
+
     def hess(self, x, z):
         """Evaluate Lagrangian Hessian at (x, z)."""
         return self.H
 
-    def hprod(self, x, z, p):
+    def hprod(self, x, z, p, out=None):
         """Hessian-vector product.
 
         Evaluate matrix-vector product between the Hessian of the Lagrangian at
         (x, z) and p.
         """
         if isinstance(self.H, np.ndarray):
-            return np.dot(self.H, p)
+            return np.dot(self.H, p, out=out)
         return self.H * p
 
+    def hprod_block(self, x, z, V):
+        """Evaluate the products of the Hessian with the columns of V.
+
+        When H is an array or a sparse matrix, all products are obtained
+        from a single matrix-matrix product.
+        """
+        if _is_matrix(self.H):
+            return np.asarray(self.H.dot(V))
+        return super(QPModel, self).hprod_block(x, z, V)
+
 
 class LPModel(QPModel):
     u"""Generic class to represent a linear programming (LP) problem.
@@ -888,17 +1110,17 @@ class BoundConstrainedNLPModel(NLPModel):
                                                        Uvar=Uvar,
                                                        **kwargs)
 
-    def cons(self, x):
+    def cons(self, x, out=None):
         """Evaluate the constraints at x."""
-        return np.zeros(self.m, dtype=np.float)
+        return _zeros(self.m, out)
 
-    def jprod(self, x, v):
+    def jprod(self, x, v, out=None):
         """Evaluate Jacobian-vector product at x with p."""
-        return np.zeros(self.m, dtype=np.float)
+        return _zeros(self.m, out)
 
-    def jtprod(self, x, v):
+    def jtprod(self, x, v, out=None):
         """Evaluate transposed-Jacobian-vector product at x with p."""
-        return np.zeros(self.n, dtype=np.float)
+        return _zeros(self.n, out)
 
 
 class UnconstrainedNLPModel(NLPModel):
@@ -918,14 +1140,14 @@ class UnconstrainedNLPModel(NLPModel):
         kwargs.pop('Uvar', None)
         super(UnconstrainedNLPModel, self).__init__(nvar, **kwargs)
 
-    def cons(self, x):
+    def cons(self, x, out=None):
         """Evaluate the constraints at x."""
-        return np.zeros(self.m, dtype=np.float)
+        return _zeros(self.m, out)
 
-    def jprod(self, x, v):
+    def jprod(self, x, v, out=None):
         """Evaluate Jacobian-vector product at x with p."""
-        return np.zeros(self.m, dtype=np.float)
+        return _zeros(self.m, out)
 
-    def jtprod(self, x, v):
+    def jtprod(self, x, v, out=None):
         """Evaluate transposed-Jacobian-vector product at x with p."""
-        return np.zeros(self.n, dtype=np.float)
+        return _zeros(self.n, out)
@@ -0,0 +1,579 @@
+"""Read linear and quadratic programs from AMPL `nl` files without ASL.
+
+The `nl` file is memory-mapped and only the information needed to build
+an :class:`LPModel` or a :class:`QPModel` is extracted: the linear parts of
+the constraints and objective, the bounds, the initial guesses and, for
+quadratic programs, the quadratic part of the objective. Both the text and
+the binary formats are supported.
+
+A description of the `nl` format may be found in D. M. Gay, *Writing .nl
+Files*, Sandia National Laboratories, 2005.
+"""
+
+from nlp.model.nlpmodel import LPModel, QPModel
+from scipy import sparse as sp
+import numpy as np
+import mmap
+import os
+import struct
+
+__docformat__ = 'restructuredtext'
+
+# Number of operands of the operators that may appear in expression graphs.
+# N-ary operators are followed by their number of operands.
+_NARY = -1
+_ARITY = {}
+for _op in (0, 1, 2, 3, 4, 5, 6, 20, 21, 22, 23, 24, 28, 29, 30, 48, 55, 56,
+            57, 58, 62, 63, 66, 67, 68, 69, 73, 76, 78):
+    _ARITY[_op] = 2
+for _op in (13, 14, 15, 16, 34, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47,
+            49, 50, 51, 52, 53, 77):
+    _ARITY[_op] = 1
+for _op in (35, 65, 72):
+    _ARITY[_op] = 3
+for _op in (11, 12, 54, 59, 60, 61, 70, 71, 74, 75):
+    _ARITY[_op] = _NARY
+
+# Number of values that follow each type of bound.
+#   0: l <= body <= u, 1: body <= u, 2: l <= body, 3: free, 4: body = c,
+#   5: complementarity (two integers).
+_NBOUNDS = np.array([2, 1, 1, 0, 1, 2])
+
+
+# Quadratic polynomials are represented as tuples (c, lin, quad) where c is a
+# constant, lin is a dictionary {i: coefficient of x_i} and quad is a
+# dictionary {(i, j): coefficient of x_i x_j} with i >= j. The value None
+# stands for an expression that is not a quadratic polynomial.
+
+def _constant(c):
+    return (float(c), {}, {})
+
+
+def _degree(p):
+    return 2 if p[2] else (1 if p[1] else 0)
+
+
+def _add(p, q, s=1.0):
+    """Return p + s * q."""
+    if p is None or q is None:
+        return None
+    lin = p[1].copy()
+    for i, a in q[1].iteritems():
+        lin[i] = lin.get(i, 0.0) + s * a
+    quad = p[2].copy()
+    for k, a in q[2].iteritems():
+        quad[k] = quad.get(k, 0.0) + s * a
+    return (p[0] + s * q[0], lin, quad)
+
+
+def _scale(p, s):
+    if p is None:
+        return None
+    return (s * p[0],
+            dict((i, s * a) for (i, a) in p[1].iteritems()),
+            dict((k, s * a) for (k, a) in p[2].iteritems()))
+
+
+def _mul(p, q):
+    if p is None or q is None or _degree(p) + _degree(q) > 2:
+        return None
+    if _degree(p) == 0:
+        return _scale(q, p[0])
+    if _degree(q) == 0:
+        return _scale(p, q[0])
+    # Product of two affine functions.
+    r = _add(_scale(q, p[0]), _scale(p, q[0]))
+    r = (r[0] - p[0] * q[0], r[1], r[2])
+    quad = r[2]
+    for i, a in p[1].iteritems():
+        for j, b in q[1].iteritems():
+            k = (i, j) if i >= j else (j, i)
+            quad[k] = quad.get(k, 0.0) + a * b
+    return r
+
+
+def _pow(p, q):
+    if p is None or q is None or _degree(q) > 0:
+        return None
+    e = q[0]
+    if _degree(p) == 0:
+        return _constant(p[0] ** e)
+    if e == 0:
+        return _constant(1.0)
+    if e == 1:
+        return p
+    if e == 2:
+        return _mul(p, p)
+    return None
+
+
+def _combine(op, args):
+    """Apply operator `op` to quadratic polynomials `args`."""
+    if op == 0:
+        return _add(args[0], args[1])
+    if op == 1:
+        return _add(args[0], args[1], -1.0)
+    if op == 2:
+        return _mul(args[0], args[1])
+    if op == 3:
+        if args[1] is None or _degree(args[1]) > 0 or args[1][0] == 0:
+            return None
+        return _scale(args[0], 1.0 / args[1][0])
+    if op in (5, 76, 78):
+        return _pow(args[0], args[1])
+    if op == 16:
+        return _scale(args[0], -1.0)
+    if op == 77:
+        return _mul(args[0], args[0])
+    if op == 54:
+        r = _constant(0.0)
+        for p in args:
+            r = _add(r, p)
+        return r
+    return None
+
+
+class _TextStream(object):
+    """Cursor over the segments of an `nl` file in text format."""
+
+    def __init__(self, mm, start):
+        self.mm = mm
+        self.pos = start
+        self.tokens = []
+
+    def _line(self):
+        end = self.mm.find('\n', self.pos)
+        if end < 0:
+            end = len(self.mm)
+        line = self.mm[self.pos:end]
+        self.pos = end + 1
+        return line.split('#', 1)[0]
+
+    def eof(self):
+        return self.pos >= len(self.mm)
+
+    def key(self):
+        """Return the key letter of the next segment or expression node."""
+        line = self._line()
+        while not line.strip():
+            if self.eof():
+                return ''
+            line = self._line()
+        line = line.lstrip()
+        self.tokens = line[1:].split()
+        if line[0] == 'h':
+            self.tokens = [line[1:]]
+        return line[0]
+
+    def _token(self):
+        while not self.tokens:
+            self.tokens = self._line().split()
+        return self.tokens.pop(0)
+
+    def int(self):
+        return int(self._token())
+
+    def short(self):
+        return int(self._token())
+
+    long = short
+
+    def float(self):
+        return float(self._token())
+
+    def string(self):
+        tok = ' '.join(self.tokens) if self.tokens else self._line()
+        self.tokens = []
+        length, s = tok.split(':', 1)
+        return s[:int(length)]
+
+    def name(self):
+        """Return the rest of the line, which holds a name."""
+        name = ' '.join(self.tokens) if self.tokens else self._line().strip()
+        self.tokens = []
+        return name
+
+    def _block(self, k):
+        """Return the next `k` lines as a string."""
+        start = self.pos
+        for _ in xrange(k):
+            self.pos = self.mm.find('\n', self.pos) + 1
+            if self.pos == 0:
+                self.pos = len(self.mm)
+        return self.mm[start:self.pos]
+
+    def _numbers(self, k):
+        """Read all numbers on the next `k` lines."""
+        if k == 0:
+            return np.empty(0)
+        block = self._block(k)
+        if '#' in block:
+            block = '\n'.join(l.split('#', 1)[0] for l in block.splitlines())
+        return np.fromstring(block, sep=' ')
+
+    def pairs(self, k, real=True):
+        """Read `k` pairs (index, value) and return them as two arrays."""
+        vals = self._numbers(k).reshape((k, 2))
+        idx = vals[:, 0].astype(np.int)
+        return (idx, vals[:, 1] if real else vals[:, 1].astype(np.int))
+
+    def ints(self, k):
+        return self._numbers(k).astype(np.int)
+
+    def bounds(self, k):
+        """Read `k` bounds and return their types and values."""
+        start = self.pos
+        vals = self._numbers(k)
+        # Each line holds a type followed by _NBOUNDS[type] values.
+        types = np.empty(k, dtype=np.int)
+        lines = self.mm[start:self.pos].splitlines()
+        for i in xrange(k):
+            types[i] = int(lines[i].split()[0])
+        offsets = np.zeros(k, dtype=np.int)
+        np.cumsum(1 + _NBOUNDS[types[:-1]], out=offsets[1:])
+        return types, vals, offsets + 1
+
+
+class _BinaryStream(object):
+    """Cursor over the segments of an `nl` file in binary format."""
+
+    _pair = np.dtype([('i', 'i4'), ('v', 'f8')])
+    _ipair = np.dtype([('i', 'i4'), ('v', 'i4')])
+
+    def __init__(self, mm, start):
+        self.mm = mm
+        self.pos = start
+
+    def eof(self):
+        return self.pos >= len(self.mm)
+
+    def _unpack(self, fmt):
+        val = struct.unpack_from(fmt, self.mm, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return val
+
+    def key(self):
+        if self.eof():
+            return ''
+        self.pos += 1
+        return self.mm[self.pos - 1]
+
+    def int(self):
+        return self._unpack('=i')
+
+    def short(self):
+        return self._unpack('=h')
+
+    def long(self):
+        return self._unpack('=i')
+
+    def float(self):
+        return self._unpack('=d')
+
+    def string(self):
+        length = self.int()
+        self.pos += length
+        return self.mm[self.pos - length:self.pos]
+
+    # Names are stored as strings in binary files.
+    name = string
+
+    def pairs(self, k, real=True):
+        dtype = self._pair if real else self._ipair
+        vals = np.frombuffer(self.mm, dtype=dtype, count=k, offset=self.pos)
+        self.pos += k * dtype.itemsize
+        return (vals['i'].astype(np.int), vals['v'].copy())
+
+    def ints(self, k):
+        vals = np.frombuffer(self.mm, dtype='i4', count=k, offset=self.pos)
+        self.pos += 4 * k
+        return vals.astype(np.int)
+
+    def bounds(self, k):
+        types = np.empty(k, dtype=np.int)
+        vals = np.empty(2 * k)
+        offsets = np.empty(k, dtype=np.int)
+        pos = 0
+        for i in xrange(k):
+            t = types[i] = ord(self.key()) - ord('0')
+            offsets[i] = pos
+            if t == 5:
+                vals[pos:pos + 2] = struct.unpack_from('=ii', self.mm,
+                                                       self.pos)
+                self.pos += 8
+            else:
+                nb = _NBOUNDS[t]
+                vals[pos:pos + nb] = struct.unpack_from('=%dd' % nb, self.mm,
+                                                        self.pos)
+                self.pos += 8 * nb
+            pos += _NBOUNDS[t]
+        return types, vals, offsets
+
+
+class NlReader(object):
+    """Reader of the linear and quadratic parts of an AMPL `nl` file.
+
+    The file is read once, when the reader is created, in a single pass over
+    a memory map of the file. Nonlinear expressions are parsed and the
+    quadratic part of the objective is kept when the objective is a
+    quadratic function. Other nonlinear expressions are discarded.
+
+    After reading, the following attributes are available:
+
+    :n, m:        number of variables and constraints
+    :A:           linear part of the constraints as a SciPy CSR matrix, with
+                  the same entries as :meth:`AmplModel.A`
+    :c:           dense linear part of the objective
+    :c0:          constant term of the objective
+    :H:           Hessian of the objective as a SciPy CSR matrix if the
+                  objective is quadratic, `None` otherwise
+    :Lvar, Uvar:  bounds on the variables
+    :Lcon, Ucon:  bounds on the constraints
+    :x0, pi0:     initial primal and dual guesses
+    :minimize:    `False` if the objective is to be maximized
+    :nlc, nlo:    number of nonlinear constraints and objectives
+    """
+
+    def __init__(self, stub):
+        if not os.path.splitext(stub)[1]:
+            stub += '.nl'
+        self.path = stub
+        self.name = os.path.splitext(os.path.basename(stub))[0]
+
+        with open(stub, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read(mm)
+        finally:
+            mm.close()
+
+    def _read_header(self, mm):
+        pos = 0
+        lines = []
+        for _ in xrange(10):
+            end = mm.find('\n', pos)
+            lines.append(mm[pos:end].split('#', 1)[0].split())
+            pos = end + 1
+        fmt = lines[0][0][0]
+        if fmt not in 'gb':
+            raise ValueError('%s: unknown nl format %s' % (self.path, fmt))
+        header = [[int(tok) for tok in line] for line in lines[1:]]
+        self.n, self.m, self.nobj = header[0][:3]
+        self.nlc, self.nlo = header[1][:2]
+        self.nzc, self.nzo = header[6][:2]
+        stream_class = _TextStream if fmt == 'g' else _BinaryStream
+        return stream_class(mm, pos)
+
+    def _read(self, mm):
+        s = self._read_header(mm)
+        n, m = self.n, self.m
+
+        self.x0 = np.zeros(n)
+        self.pi0 = np.zeros(m)
+        self.Lvar = -np.inf * np.ones(n)
+        self.Uvar = np.inf * np.ones(n)
+        self.Lcon = -np.inf * np.ones(m)
+        self.Ucon = np.inf * np.ones(m)
+        self.c = np.zeros(n)
+        self.c0 = 0.0
+        self.minimize = True
+        self._defvars = {}
+        obj_expr = None
+
+        # Rows of the linear part of the constraints in order of appearance.
+        row_idx = []
+        row_cols = []
+        row_vals = []
+
+        key = s.key()
+        while key:
+            if key == 'C' or key == 'L':
+                s.int()
+                self._expr(s)
+            elif key == 'O':
+                i = s.int()
+                sigma = s.int()
+                expr = self._expr(s)
+                if i == 0:
+                    self.minimize = (sigma == 0)
+                    obj_expr = expr
+            elif key == 'V':
+                i = s.int()
+                k = s.int()
+                s.int()
+                idx, vals = s.pairs(k)
+                lin = dict(zip(idx.tolist(), vals.tolist()))
+                self._defvars[i] = _add((0.0, lin, {}), self._expr(s))
+            elif key == 'F':
+                s.int()
+                s.int()
+                s.int()
+                s.name()
+            elif key == 'S':
+                kind = s.int()
+                k = s.int()
+                s.name()
+                s.pairs(k, real=bool(kind & 4))
+            elif key == 'x' or key == 'd':
+                k = s.int()
+                idx, vals = s.pairs(k)
+                if key == 'x':
+                    self.x0[idx] = vals
+                else:
+                    self.pi0[idx] = vals
+            elif key == 'r':
+                self._set_bounds(s.bounds(m), self.Lcon, self.Ucon)
+            elif key == 'b':
+                self._set_bounds(s.bounds(n), self.Lvar, self.Uvar)
+            elif key == 'k' or key == 'K':
+                s.ints(s.int())
+            elif key == 'J':
+                i = s.int()
+                idx, vals = s.pairs(s.int())
+                row_idx.append(i)
+                row_cols.append(idx)
+                row_vals.append(vals)
+            elif key == 'G':
+                i = s.int()
+                idx, vals = s.pairs(s.int())
+                if i == 0:
+                    self.c[idx] = vals
+            else:
+                raise ValueError('%s: unknown segment %s' %
+                                 (self.path, key))
+            key = s.key()
+
+        self._build_A(row_idx, row_cols, row_vals)
+        self._build_H(obj_expr)
+        del self._defvars
+
+    def _set_bounds(self, bounds, lower, upper):
+        types, vals, offsets = bounds
+        for t in (0, 2, 4):
+            idx = np.flatnonzero(types == t)
+            lower[idx] = vals[offsets[idx]]
+        idx = np.flatnonzero(types == 0)
+        upper[idx] = vals[offsets[idx] + 1]
+        for t in (1, 4):
+            idx = np.flatnonzero(types == t)
+            upper[idx] = vals[offsets[idx]]
+
+    def _expr(self, s):
+        """Parse an expression and return it as a quadratic polynomial.
+
+        Return `None` if the expression is not a quadratic polynomial.
+        """
+        key = s.key()
+        if key == 'n':
+            return _constant(s.float())
+        if key == 's':
+            return _constant(s.short())
+        if key == 'l':
+            return _constant(s.long())
+        if key == 'v':
+            i = s.int()
+            if i < self.n:
+                return (0.0, {i: 1.0}, {})
+            return self._defvars.get(i)
+        if key == 'h':
+            s.string()
+            return None
+        if key == 'f':
+            s.int()
+            nargs = s.int()
+            for _ in xrange(nargs):
+                self._expr(s)
+            return None
+        if key == 'o':
+            op = s.int()
+            arity = _ARITY.get(op)
+            if arity is None:
+                raise ValueError('%s: unsupported operator o%d' %
+                                 (self.path, op))
+            if arity == _NARY:
+                arity = s.int()
+            args = [self._expr(s) for _ in xrange(arity)]
+            return _combine(op, args)
+        raise ValueError('%s: unknown expression node %s' % (self.path, key))
+
+    def _build_A(self, row_idx, row_cols, row_vals):
+        m, n = self.m, self.n
+        counts = np.zeros(m, dtype=np.int)
+        counts[row_idx] = [len(cols) for cols in row_cols]
+        indptr = np.zeros(m + 1, dtype=np.int)
+        np.cumsum(counts, out=indptr[1:])
+        if row_idx != sorted(row_idx):
+            order = np.argsort(row_idx, kind='mergesort')
+            row_cols = [row_cols[k] for k in order]
+            row_vals = [row_vals[k] for k in order]
+        if row_cols:
+            indices = np.concatenate(row_cols)
+            data = np.concatenate(row_vals)
+        else:
+            indices = np.empty(0, dtype=np.int)
+            data = np.empty(0)
+        self.A = sp.csr_matrix((data, indices, indptr), shape=(m, n))
+
+    def _build_H(self, obj_expr):
+        n = self.n
+        self.H = None
+        if self.nlo == 0:
+            if obj_expr is not None:
+                self.c0 = obj_expr[0]
+            return
+        if obj_expr is None:
+            return
+
+        c0, lin, quad = obj_expr
+        self.c0 = c0
+        for i, a in lin.iteritems():
+            self.c[i] += a
+        if quad:
+            rows, cols = np.array(quad.keys(), dtype=np.int).T
+            vals = np.array(quad.values())
+        else:
+            rows = cols = np.empty(0, dtype=np.int)
+            vals = np.empty(0)
+        diag = rows == cols
+        # H_ii = 2 q_ii and H_ij = H_ji = q_ij for i != j.
+        H = sp.coo_matrix((np.concatenate((np.where(diag, 2 * vals, vals),
+                                           vals[~diag])),
+                           (np.concatenate((rows, cols[~diag])),
+                            np.concatenate((cols, rows[~diag])))),
+                          shape=(n, n))
+        self.H = H.tocsr()
+
+    def model(self, **kwargs):
+        """Return an :class:`LPModel` or a :class:`QPModel`.
+
+        An `LPModel` is returned if the objective is linear and a `QPModel`
+        if it is quadratic. Maximization problems are turned into
+        minimization problems by changing the sign of the objective.
+        The constant term of the objective is not included.
+
+        Keyword arguments are passed to the constructor of the model.
+
+        :raises ValueError: if some constraints are nonlinear or the
+                            objective is neither linear nor quadratic.
+        """
+        if self.nlc > 0:
+            raise ValueError('%s has nonlinear constraints' % self.name)
+        if self.nlo > 0 and self.H is None:
+            raise ValueError('%s has a nonquadratic objective' % self.name)
+
+        sign = 1.0 if self.minimize else -1.0
+        A = self.A if self.m > 0 else None
+        kwargs.setdefault('name', self.name)
+        for key in ('x0', 'pi0', 'Lvar', 'Uvar', 'Lcon', 'Ucon'):
+            kwargs.setdefault(key, getattr(self, key))
+        if self.nlo == 0:
+            return LPModel(sign * self.c, A, **kwargs)
+        return QPModel(sign * self.c, sign * self.H, A, **kwargs)
+
+
+def read_nl(stub, **kwargs):
+    """Read an `nl` file and return an :class:`LPModel` or a :class:`QPModel`.
+
+    See :meth:`NlReader.model` for more information.
+    """
+    return NlReader(stub).model(**kwargs)
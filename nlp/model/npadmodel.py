@@ -0,0 +1,145 @@
+"""Models with derivatives computed from NumPy array operations.
+
+The objective and constraints are written with NumPy array operations and
+recorded on tapes by :mod:`nlp.tools.npad`, one entry per array operation.
+They must only use the operations supported by that module. In particular,
+the constraints must be assembled with `npad.concatenate` or `npad.hstack`
+rather than by assignment into an array.
+"""
+
+from nlp.model.nlpmodel import NLPModel
+from nlp.tools import npad
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+class NumPyADModel(NLPModel):
+    """Model with derivatives computed by array-level reverse-mode AD.
+
+    A class to represent optimization problems in which derivatives are
+    computed by recording the NumPy array operations of :meth:`obj` and
+    :meth:`cons` on a tape with :mod:`nlp.tools.npad`. Only dense
+    derivatives are supplied. See the documentation of `NLPModel` for
+    further information.
+
+    Each function is taped on the first evaluation of a derivative that
+    needs it, at the point where that derivative is requested, and the tape
+    is replayed at other points. The Lagrangian is taped as the pair
+    (f(x), c(x)) and its Hessian-vector products are obtained in
+    forward-over-reverse mode with weights given by the multipliers.
+    """
+
+    def __init__(self, n, m=0, name='NumPyAD-Generic', **kwargs):
+        """Initialize a model with `n` variables and `m` constraints.
+
+        :parameters:
+
+            :n:       number of variables
+            :m:       number of general (non bound) constraints (default: 0)
+            :name:    model name (default: 'Generic')
+        """
+        super(NumPyADModel, self).__init__(n, m=m, name=name, **kwargs)
+
+        self._tape_obj = None
+        self._tape_cons = None
+        self._tape_lag = None
+
+    def _trace_obj(self, x):
+        """Tape the objective function evaluation."""
+        if self._tape_obj is None:
+            self._tape_obj = npad.trace(self.obj, x)
+
+    def _trace_cons(self, x):
+        """Tape the constraints evaluation."""
+        if self._tape_cons is None:
+            self._tape_cons = npad.trace(self.cons, x)
+
+    def _trace_lag(self, x):
+        """Tape the objective and constraints as a single function of x."""
+        if self._tape_lag is not None:
+            return
+
+        if self.m == 0:
+            self._trace_obj(x)
+            self._tape_lag = self._tape_obj
+            return
+
+        self._tape_lag = npad.trace(lambda y: (self.obj(y), self.cons(y)), x)
+
+    def _lag_weights(self, z, obj_weight=1.0):
+        """Return the weights of (f(x), c(x)) in the Lagrangian at z."""
+        if self.m == 0:
+            return [obj_weight]
+        if z is None:
+            return [obj_weight, None]
+        return [obj_weight, -self._cons_multipliers(z)]
+
+    def grad(self, x, **kwargs):
+        """Evaluate the objective gradient at x."""
+        self._trace_obj(x)
+        return self._tape_obj.vjp(x, [1.0])
+
+    def hess(self, x, z=None, **kwargs):
+        """Evaluate the Lagrangian Hessian at (x, z) as a dense array.
+
+        The Hessian is assembled from n Hessian-vector products.
+
+        :keywords:
+            :obj_weight: weight of the objective (default: 1)
+        """
+        n = self.nvar
+        H = np.empty((n, n))
+        e = np.zeros(n)
+        for j in xrange(n):
+            e[j] = 1
+            H[:, j] = self.hprod(x, z, e, **kwargs)
+            e[j] = 0
+        return H
+
+    def hprod(self, x, z, v, **kwargs):
+        """Evaluate the Lagrangian Hessian at (x, z) times v.
+
+        :keywords:
+            :obj_weight: weight of the objective (default: 1)
+        """
+        self._trace_lag(x)
+        w = self._lag_weights(z, kwargs.get('obj_weight', 1.0))
+        return self._tape_lag.hvp(x, w, v)
+
+    def jac(self, x, **kwargs):
+        """Evaluate the constraints Jacobian at x as a dense array.
+
+        The Jacobian is assembled from m transposed-Jacobian-vector products
+        or n Jacobian-vector products, whichever is fewer.
+        """
+        (m, n) = (self.ncon, self.nvar)
+        J = np.empty((m, n))
+        if m <= n:
+            e = np.zeros(m)
+            for i in xrange(m):
+                e[i] = 1
+                J[i, :] = self.jtprod(x, e)
+                e[i] = 0
+        else:
+            e = np.zeros(n)
+            for j in xrange(n):
+                e[j] = 1
+                J[:, j] = self.jprod(x, e)
+                e[j] = 0
+        return J
+
+    def jac_pos(self, x, **kwargs):
+        """Evaluate the Jacobian of :meth:`cons_pos` at x."""
+        J = self.jac(x, **kwargs)
+        return self._pos_sign[:, None] * J[self._pos_rows, :]
+
+    def jprod(self, x, v, **kwargs):
+        """Evaluate the Jacobian-vector product at x with v."""
+        self._trace_cons(x)
+        return self._tape_cons.jvp(x, v)[0]
+
+    def jtprod(self, x, v, **kwargs):
+        """Evaluate the transposed-Jacobian-vector product at x with v."""
+        self._trace_cons(x)
+        return self._tape_cons.vjp(x, [v])
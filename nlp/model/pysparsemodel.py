@@ -9,6 +9,7 @@ except:
 from nlp.model.nlpmodel import NLPModel
 from nlp.model.snlp import SlackModel
 from nlp.model.qnmodel import QuasiNewtonModel
+from nlp.tools.utils import same_structure
 from pykrylov.linop.linop import PysparseLinearOperator
 
 import numpy as np
@@ -19,12 +20,25 @@ class PySparseNLPModel(NLPModel):
     An `NLPModel` where sparse matrices are returned in PySparse format.
     The `NLPModel`'s `jac` and `hess` methods should return that sparse
     Jacobian and Hessian in coordinate format: (vals, rows, cols).
+
+    The Jacobian and Hessian are allocated on their first evaluation.
+    Subsequent evaluations only update their values, as long as their
+    sparsity structure does not change. The same matrix is then returned
+    by every call, so that it should be copied if it is to be kept.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(PySparseNLPModel, self).__init__(*args, **kwargs)
+        self._jac_mat = None  # (rows, cols, J), built on first evaluation
+        self._hess_mat = None  # (rows, cols, H), built on first evaluation
+
     def hess(self, *args, **kwargs):
         """Evaluate Lagrangian Hessian at (x, z)."""
         vals, rows, cols = super(PySparseNLPModel, self).hess(*args, **kwargs)
-        H = psp(size=self.nvar, sizeHint=vals.size, symmetric=True)
+        if not same_structure(self._hess_mat, rows, cols):
+            H = psp(size=self.nvar, sizeHint=vals.size, symmetric=True)
+            self._hess_mat = (rows, cols, H)
+        H = self._hess_mat[2]
         H.put(vals, rows, cols)
         return H
 
@@ -32,8 +46,11 @@ class PySparseNLPModel(NLPModel):
         """Evaluate constraints Jacobian at x."""
         vals, rows, cols = super(PySparseNLPModel,
                                  self).jac(*args, **kwargs)
-        J = psp(nrow=self.ncon, ncol=self.nvar,
-                sizeHint=vals.size, symmetric=False)
+        if not same_structure(self._jac_mat, rows, cols):
+            J = psp(nrow=self.ncon, ncol=self.nvar,
+                    sizeHint=vals.size, symmetric=False)
+            self._jac_mat = (rows, cols, J)
+        J = self._jac_mat[2]
         J.put(vals, rows, cols)
         return J
 
@@ -77,6 +94,9 @@ except ImportError:
 class PySparseSlackModel(SlackModel):
     """SlackModel in wich matrices are PySparse matrices.
 
+    As in `PySparseNLPModel`, the Jacobian and Hessian are allocated on their
+    first evaluation and only their values are updated afterwards.
+
     :keywords:
         :model:  Original model to be transformed into a slack form.
 
@@ -87,6 +107,8 @@ class PySparseSlackModel(SlackModel):
             raise TypeError("The model in `model` should be a PySparseNLPModel"
                             "or a derived class of it.")
         super(PySparseSlackModel, self).__init__(model)
+        self._jac_mat = None  # Jacobian, allocated on first evaluation
+        self._hess_mat = None  # Hessian, allocated on first evaluation
 
     def _jac(self, x, lp=False):
         """Helper method to assemble the Jacobian matrix.
@@ -102,6 +124,12 @@ class PySparseSlackModel(SlackModel):
         model = self.model
         on = self.original_n
 
+        if not lp and self._jac_mat is not None:
+            # The slack part is constant.
+            J = self._jac_mat
+            J[:on, :on] = model.jac(x[:on])
+            return J
+
         lowerC = np.array(model.lowerC)
         nlowerC = model.nlowerC
         upperC = np.array(model.upperC)
@@ -129,6 +157,8 @@ class PySparseSlackModel(SlackModel):
         J.put(-1.0, upperC, on + nlowerC + rupperC)
         J.put(-1.0, rangeC, on + nlowerC + nupperC + rrangeC)
 
+        if not lp:
+            self._jac_mat = J
         return J
 
     def hess(self, x, z=None, obj_num=0, *args, **kwargs):
@@ -144,7 +174,9 @@ class PySparseSlackModel(SlackModel):
         model = self.model
         on = self.original_n
 
-        H = psp(nrow=self.n, ncol=self.n, symmetric=True,
-                sizeHint=self.model.nnzh)
+        if self._hess_mat is None:
+            self._hess_mat = psp(nrow=self.n, ncol=self.n, symmetric=True,
+                                 sizeHint=self.model.nnzh)
+        H = self._hess_mat
         H[:on, :on] = model.hess(x[:on], z, obj_num, *args, **kwargs)
         return H
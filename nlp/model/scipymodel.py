@@ -1,4 +1,4 @@
-"""Models with sparse matrices in SciPy coordinate (COO) format."""
+"""Models with sparse matrices in SciPy format."""
 
 from scipy import sparse as sp
 
@@ -6,6 +6,7 @@ from nlp.model.nlpmodel import NLPModel
 from nlp.model.amplmodel import AmplModel
 from nlp.model.snlp import SlackModel
 from nlp.model.qnmodel import QuasiNewtonModel
+from pykrylov.linop import LinearOperator
 from pykrylov.linop.linop import linop_from_ndarray
 import numpy as np
 
@@ -34,12 +35,22 @@ class SciPyNLPModel(NLPModel):
 
 
 class SciPyAmplModel(AmplModel):
-    """`AmplModel` with sparse matrices n SciPy coordinate (COO) format."""
+    """`AmplModel` with sparse matrices in SciPy format.
+
+    The Jacobian is returned in coordinate (COO) format and the Hessian in
+    compressed sparse row (CSR) format.
+    """
 
     # MRO: 1. SciPyAmplModel
     #      2. AmplModel
     #      3. NLPModel
 
+    def __init__(self, *args, **kwargs):
+        super(SciPyAmplModel, self).__init__(*args, **kwargs)
+        self._J = None   # Jacobian, allocated on first evaluation
+        self._H = None   # Hessian, allocated on first evaluation
+        self._L = None   # Lower triangle, allocated on first evaluation
+
     def A(self, *args, **kwargs):
         """Evaluate sparse Jacobian of the linear part of the constraints.
 
@@ -50,44 +61,94 @@ class SciPyAmplModel(AmplModel):
         return sp.coo_matrix((vals, (rows, cols)),
                              shape=(self.ncon, self.nvar))
 
-    def jac(self, *args, **kwargs):
-        """Evaluate sparse constraints Jacobian."""
+    def jac(self, x, *args, **kwargs):
+        """Evaluate sparse constraints Jacobian.
+
+        The same matrix is returned by every call. Only its values are
+        updated, so that it should be copied if it is to be kept.
+        """
         if self.ncon == 0:  # SciPy cannot create sparse matrix of size 0.
             return linop_from_ndarray(np.empty((0, self.nvar), dtype=np.float))
 
-        vals, rows, cols = super(SciPyAmplModel, self).jac(*args, **kwargs)
-        return sp.coo_matrix((vals, (rows, cols)),
-                             shape=(self.ncon, self.nvar))
+        if self._J is None:
+            rows, cols = self.jac_structure()
+            self._J = sp.coo_matrix((np.empty(self.nnzj), (rows, cols)),
+                                    shape=(self.ncon, self.nvar))
+        self.jac_values(x, out=self._J.data)
+        return self._J
 
-    def hess(self, *args, **kwargs):
-        """Evaluate Lagrangian Hessian at (x, z)."""
-        l_vals, l_rows, l_cols = super(SciPyAmplModel, self).hess(*args,
-                                                                  **kwargs)
-
-        # AMPL only returns the upper triangular part of the Hessian and
-        # `scipy.coo_matrix` doesn't have a `symmetric` attribute, so we
-        # need to copy the upper part of the matrix
-        diag_idx = np.where(l_rows == l_cols)
-
-        # strict upper triangle of H is obtained by switching rows and
-        # cols indices and removing values on the diagonal.
-        u_rows = np.delete(l_cols, diag_idx)  # creates a copy
-        u_cols = np.delete(l_rows, diag_idx)
-        u_vals = np.delete(l_vals, diag_idx)
-
-        H = sp.coo_matrix((np.concatenate((l_vals, u_vals)),
-                           (np.concatenate((l_rows, u_rows)),
-                            np.concatenate((l_cols, u_cols)))),
+    def _csr_pattern(self, rows, cols, src):
+        """Allocate a CSR matrix for the nonzeros at (rows, cols).
+
+        The k-th nonzero takes the value of the `src[k]`-th Hessian value
+        returned by :meth:`hess_values`. Return the matrix and the index of
+        the Hessian value that goes in each entry of its data array.
+        """
+        perm = np.lexsort((cols, rows))
+        indptr = np.zeros(self.nvar + 1, dtype=np.int)
+        np.cumsum(np.bincount(rows, minlength=self.nvar), out=indptr[1:])
+        M = sp.csr_matrix((np.empty(len(rows)), cols[perm], indptr),
                           shape=(self.nvar, self.nvar))
+        return (M, src[perm])
+
+    def _hess_lower(self, x, z=None, **kwargs):
+        """Evaluate the lower triangle of the Hessian as a CSR matrix."""
+        if self._L is None:
+            l_rows, l_cols = self.hess_structure()
+            self._L = self._csr_pattern(l_rows, l_cols,
+                                        np.arange(self.nnzh))
+        (L, src) = self._L
+        np.take(self.hess_values(x, z, **kwargs), src, out=L.data)
+        return L
+
+    def hess(self, x, z=None, *args, **kwargs):
+        """Evaluate Lagrangian Hessian at (x, z).
+
+        The Hessian is returned in CSR format with both triangles stored.
+        The same matrix is returned by every call. Only its values are
+        updated, so that it should be copied if it is to be kept.
+        """
+        if self._H is None:
+            # AMPL only returns the lower triangular part of the Hessian.
+            # The strict upper triangle is obtained by switching rows and
+            # cols indices of off-diagonal entries. The order of the entries
+            # in CSR format is computed once and for all.
+            l_rows, l_cols = self.hess_structure()
+            offdiag = np.flatnonzero(l_rows != l_cols)
+            self._H = self._csr_pattern(
+                np.concatenate((l_rows, l_cols[offdiag])),
+                np.concatenate((l_cols, l_rows[offdiag])),
+                np.concatenate((np.arange(self.nnzh), offdiag)))
+
+        (H, src) = self._H
+        np.take(self.hess_values(x, z, **kwargs), src, out=H.data)
         return H
 
+    def hess_op(self, x, z=None, **kwargs):
+        """Lagrangian Hessian at (x, z) as a symmetric linear operator.
+
+        Only the lower triangle L of the Hessian is stored and products are
+        computed as L v + L'v - diag(L) v. The operator shares its matrix
+        with subsequent calls and is only valid until the next call.
+        """
+        L = self._hess_lower(x, z, **kwargs)
+        d = L.diagonal()
+
+        def matvec(v):
+            return L * v + L.T * v - d * v
+
+        return LinearOperator(self.nvar, self.nvar, matvec, symmetric=True)
+
     def jop(self, *args, **kwargs):
         """Obtain Jacobian at x as a linear operator."""
         return self.jac(*args, **kwargs)
 
 
 class SciPySlackModel(SlackModel):
-    """`SlackModel` with sparse matrices in SciPy coordinate (COO) format.
+    """`SlackModel` with sparse matrices in SciPy format.
+
+    The Jacobian is returned in coordinate (COO) format and the Hessian in
+    compressed sparse row (CSR) format.
 
     :keywords:
         :model:  Original model to be transformed into a slack form.
@@ -151,9 +212,11 @@ class SciPySlackModel(SlackModel):
         if z is None:
             z = np.zeros(self.m)
 
-        H = model.hess(x, z, **kwargs)
-        vals = H.data
-        rows = H.row
-        cols = H.col
-        return sp.coo_matrix((vals, (rows, cols)),
+        # Pad the Hessian of the original model with empty rows and columns
+        # for the slacks.
+        H = model.hess(x[:self.original_n], z, **kwargs).tocsr()
+        indptr = np.concatenate((H.indptr,
+                                 np.repeat(H.indptr[-1],
+                                           self.nvar - self.original_n)))
+        return sp.csr_matrix((H.data, H.indices, indptr),
                              shape=(self.nvar, self.nvar))
@@ -1,9 +1,9 @@
 """A slack framework for NLP.py."""
 
 
+from contextlib import contextmanager
 import numpy as np
 from nlp.model.nlpmodel import NLPModel
-from pysparse.sparse.pysparseMatrix import PysparseMatrix as sp
 
 __docformat__ = 'restructuredtext'
 
@@ -74,7 +74,7 @@ class SlackModel(NLPModel):
 
         # Update effective number of variables and constraints
         n = self.original_n + n_slacks
-        m = self.original_m + model.nrangeC
+        m = self.original_m
 
         Lvar = -np.infty * np.ones(n)
         Uvar = +np.infty * np.ones(n)
@@ -124,6 +124,12 @@ class SlackModel(NLPModel):
         self.x0[self.original_n:] = val
         return
 
+    @contextmanager
+    def at(self, x):
+        """Pin x in the original model. See :meth:`NLPModel.at`."""
+        with self.model.at(x[:self.original_n]):
+            yield self
+
     def obj(self, x):
         """Evaluate the objective function at x..
 
@@ -134,18 +140,20 @@ class SlackModel(NLPModel):
 
         return f
 
-    def grad(self, x):
+    def grad(self, x, out=None):
         """Evaluate the objective gradient at x.
 
         This function is specialized since the original objective function only
         depends on a subvector of `x`.
         """
-        g = np.zeros(self.n)
-        g[:self.original_n] = self.model.grad(x[:self.original_n])
+        on = self.original_n
+        g = np.empty(self.n) if out is None else out
+        self.model.grad(x[:on], out=g[:on])
+        g[on:] = 0
 
         return g
 
-    def cons(self, x):
+    def cons(self, x, out=None):
         """Evaluate vector of constraints at x.
 
         Constraints are stored in the order in which they appear in the
@@ -159,7 +167,7 @@ class SlackModel(NLPModel):
         upperC = model.upperC
         rangeC = model.rangeC
 
-        c = model.cons(x[:on])
+        c = model.cons(x[:on], out=out)
 
         c[equalC] -= model.Lcon[equalC]
         c[lowerC] -= x[self.sL]
@@ -168,7 +176,7 @@ class SlackModel(NLPModel):
 
         return c
 
-    def jprod(self, x, v, **kwargs):
+    def jprod(self, x, v, out=None, **kwargs):
         """Evaluate Jacobian-vector product at x with p.
 
         See the documentation of :meth:`jac` for more details on how the
@@ -181,7 +189,7 @@ class SlackModel(NLPModel):
         upperC = model.upperC
         rangeC = model.rangeC
 
-        p = model.jprod(x[:on], v[:on])
+        p = model.jprod(x[:on], v[:on], out=out)
 
         # Insert contribution of slacks on general constraints
         p[lowerC] -= v[self.sL]
@@ -189,7 +197,7 @@ class SlackModel(NLPModel):
         p[rangeC] -= v[self.sR]
         return p
 
-    def jtprod(self, x, v, **kwargs):
+    def jtprod(self, x, v, out=None, **kwargs):
         """Evaluate transposed-Jacobian-vector product at x with p.
 
         See the documentation of :meth:`jac` for more details on how the
@@ -203,13 +211,16 @@ class SlackModel(NLPModel):
         upperC = model.upperC
         rangeC = model.rangeC
 
-        p = np.zeros(n)
-        p[:on] = model.jtprod(x[:on], v)
+        p = np.empty(n) if out is None else out
+        model.jtprod(x[:on], v, out=p[:on])
 
         # Insert contribution of slacks on general constraints
-        p[self.sL] = -v[lowerC]
-        p[self.sU] = -v[upperC]
-        p[self.sR] = -v[rangeC]
+        nlC = model.nlowerC
+        nuC = model.nupperC
+        ps = p[on:]
+        np.negative(v[lowerC], ps[:nlC])
+        np.negative(v[upperC], ps[nlC:nlC + nuC])
+        np.negative(v[rangeC], ps[nlC + nuC:])
         return p
 
     def _jac(self, x, lp=False):
@@ -246,7 +257,7 @@ class SlackModel(NLPModel):
         """
         return self._jac(0, lp=True)
 
-    def hprod(self, x, y, v, **kwargs):
+    def hprod(self, x, y, v, out=None, **kwargs):
         """Hessian-vector product.
 
         Evaluate matrix-vector product between the Hessian of the Lagrangian at
@@ -259,15 +270,16 @@ class SlackModel(NLPModel):
         model = self.model
         on = self.original_n
 
-        Hv = np.zeros(self.n)
-        Hv[:on] = model.hprod(x[:on], y, v[:on], **kwargs)
+        Hv = np.empty(self.n) if out is None else out
+        model.hprod(x[:on], y, v[:on], out=Hv[:on], **kwargs)
+        Hv[on:] = 0
         return Hv
 
     def hess(self, x, z=None, *args, **kwargs):
         """Evaluate Lagrangian Hessian at (x, z)."""
         raise NotImplementedError("Please subclass")
 
-    def ghivprod(self, x, g, v, **kwargs):
+    def ghivprod(self, x, g, v, out=None, **kwargs):
         """Evaluate individual dot products (g, Hi(x)*v).
 
         Evaluate the vector of dot products (g, Hi(x)*v) where Hi(x) is the
@@ -278,6 +290,7 @@ class SlackModel(NLPModel):
         on = self.original_n
         om = self.original_m
 
-        gHiv = np.zeros(self.m)
+        gHiv = np.empty(self.m) if out is None else out
         gHiv[:om] = model.ghivprod(x[:on], g[:on], v[:on], **kwargs)
+        gHiv[om:] = 0
         return gHiv
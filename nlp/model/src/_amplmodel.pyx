@@ -18,7 +18,7 @@ cdef enum:
     ASL_read_pfg  = 4
     ASL_read_pfgh = 5
 
-cdef extern from "amplutils.h":
+cdef extern from "amplutils.h" nogil:
 
     # Option_Info stuff. Only "wantsol" is currently used.
     ctypedef struct keyword:
@@ -110,6 +110,8 @@ cdef extern from "amplutils.h":
     int ampl_congrd(ASL*, int, double*, double*)
     void ampl_sphes(ASL*, double*, int, double*, double*)
     void ampl_hvcomp(ASL*, double*, double*, int, double*, double*)
+    void ampl_hvcomp_block(ASL*, double*, double*, int, int, int, double*,
+                           double*)
     void ampl_lagscale(ASL*, double)
     void ampl_xknown(ASL*, double*)
 
@@ -129,7 +131,12 @@ from numpy cimport npy_intp, NPY_DOUBLE, ndarray
 
 cdef extern from "numpy/arrayobject.h":
     bint PyArray_ISCARRAY(ndarray)
+    int PyArray_TYPE(ndarray)
     ndarray PyArray_EMPTY(int, npy_intp*, int, int)
+    object PyArray_SimpleNewFromData(int, npy_intp*, int, void*)
+    int PyArray_SetBaseObject(ndarray, object) except -1
+    void PyArray_CLEARFLAGS(ndarray, int)
+    int NPY_ARRAY_WRITEABLE
     void import_array()
 
 import_array()
@@ -148,10 +155,54 @@ cdef ndarray copy_c_to_numpy(double *x, int lenx):
         v[i] = x[i]
     return v
 
+cdef ndarray view_c_as_numpy(double *x, int lenx, object owner):
+    """Utility to wrap a C array of doubles owned by `owner` as a read-only
+    numpy array. The array keeps `owner` alive."""
+    cdef:
+        npy_intp* dims = [lenx]
+        ndarray v = PyArray_SimpleNewFromData(1, dims, NPY_DOUBLE, x)
+
+    # PyArray_SetBaseObject steals a reference.
+    cpython.Py_INCREF(owner)
+    PyArray_SetBaseObject(v, owner)
+    PyArray_CLEARFLAGS(v, NPY_ARRAY_WRITEABLE)
+    return v
+
+cdef ndarray as_double_array(object x, int lenx):
+    """Utility to validate an input vector of lenx doubles.
+
+    x is returned unchanged if it is already a contiguous array of doubles
+    and is converted otherwise."""
+    cdef ndarray v = np.ascontiguousarray(x, dtype=np.double)
+    if v.ndim != 1 or v.shape[0] != lenx:
+        raise ValueError('Expected a vector of size %d' % lenx)
+    return v
+
+cdef ndarray output_array(ndarray out, int lenx):
+    """Utility to validate an output vector of lenx doubles.
+
+    A new array is returned if out is None."""
+    cdef npy_intp* dims = [lenx]
+    if out is None:
+        return PyArray_EMPTY(1, dims, NPY_DOUBLE, 0)
+    if not PyArray_ISCARRAY(out) or PyArray_TYPE(out) != NPY_DOUBLE or \
+            out.ndim != 1 or out.shape[0] != lenx:
+        raise ValueError('out must be a writeable contiguous vector of '
+                         '%d doubles' % lenx)
+    return out
+
 ########################################################################
 # AMPL interface class
 ########################################################################
 cdef class ampl:
+    """Interface to the AMPL Solver Library.
+
+    Input vectors are used in place if they are contiguous arrays of doubles
+    and are converted otherwise. Output vectors may be supplied with the
+    `out` keyword. The GIL is released during evaluations so other Python
+    threads can run. A single `ampl` object must not be used by several
+    threads at a time.
+    """
 
     cdef:
         ASL* asl
@@ -184,6 +235,18 @@ cdef class ampl:
         public int objtype
         public bint ampl_written_sol
 
+        # Number of nonzeros in the Hessian, or -1 if sphsetup was not called.
+        int nnzh
+
+        # Initial values and bounds. They are owned by this object rather
+        # than by ASL so they survive :meth:`close`.
+        double* X0
+        double* LUv
+        double* Uvx
+        double* pi0
+        double* LUrhs
+        double* Urhsx
+
     def __cinit__(self):
         """cinit is called before init; allocates the ASL structure."""
 
@@ -191,15 +254,32 @@ cdef class ampl:
         self.asl = ASL_alloc(ASL_read_pfgh)
         if self.asl is NULL:
             cpython.PyErr_NoMemory()
+        self.nnzh = -1
+
+    def __dealloc__(self):
+        """Free the allocated memory and ASL structure.
+
+        This happens once the object and all views on its data are
+        garbage collected."""
+        free(self.X0)
+        free(self.LUv)
+        free(self.Uvx)
+        free(self.pi0)
+        free(self.LUrhs)
+        free(self.Urhsx)
+        if self.asl is not NULL:
+            ASL_free(&self.asl)
 
     def _dealloc(self):
-        """Free the allocated memory and ASL structure."""
-        free(self.asl.i.X0_)
-        free(self.asl.i.LUv_)
-        free(self.asl.i.Uvx_)
-        free(self.asl.i.pi0_)
-        free(self.asl.i.LUrhs_)
-        free(self.asl.i.Urhsx_)
+        """Kept for backward compatibility. See :meth:`__dealloc__`."""
+        pass
+
+    def close(self):
+        """Free the ASL structure now rather than on garbage collection.
+
+        Initial values and bounds, and views on them, remain valid. No other
+        method may be called after this one.
+        """
         if self.asl is not NULL:
             ASL_free(&self.asl)
 
@@ -239,12 +319,18 @@ cdef class ampl:
 
         # Ask for initial x and pi, and allocate storage for problem data.
         self.asl.i.want_xpi0_ = 3
-        self.asl.i.X0_    = <double *>malloc(self.n_var * sizeof(double))
-        self.asl.i.LUv_   = <double *>malloc(self.n_var * sizeof(double))
-        self.asl.i.Uvx_   = <double *>malloc(self.n_var * sizeof(double))
-        self.asl.i.pi0_   = <double *>malloc(self.n_con * sizeof(double))
-        self.asl.i.LUrhs_ = <double *>malloc(self.n_con * sizeof(double))
-        self.asl.i.Urhsx_ = <double *>malloc(self.n_con * sizeof(double))
+        self.X0    = <double *>malloc(self.n_var * sizeof(double))
+        self.LUv   = <double *>malloc(self.n_var * sizeof(double))
+        self.Uvx   = <double *>malloc(self.n_var * sizeof(double))
+        self.pi0   = <double *>malloc(self.n_con * sizeof(double))
+        self.LUrhs = <double *>malloc(self.n_con * sizeof(double))
+        self.Urhsx = <double *>malloc(self.n_con * sizeof(double))
+        self.asl.i.X0_    = self.X0
+        self.asl.i.LUv_   = self.LUv
+        self.asl.i.Uvx_   = self.Uvx
+        self.asl.i.pi0_   = self.pi0
+        self.asl.i.LUrhs_ = self.LUrhs
+        self.asl.i.Urhsx_ = self.Urhsx
 
         # Read in the problem.
         pfgh_read_ASL(self.asl, self.ampl_file, 0)
@@ -256,17 +342,33 @@ cdef class ampl:
         ampl_lagscale(self.asl, -1.)
 
 
-    # Routines to get initial values.
-    def get_x0(self): return copy_c_to_numpy(self.asl.i.X0_, self.n_var)
-    def get_Lvar(self): return copy_c_to_numpy(self.asl.i.LUv_, self.n_var)
-    def get_Uvar(self): return copy_c_to_numpy(self.asl.i.Uvx_, self.n_var)
-    def get_pi0(self): return copy_c_to_numpy(self.asl.i.pi0_, self.n_con)
-    def get_Lcon(self): return copy_c_to_numpy(self.asl.i.LUrhs_, self.n_con)
-    def get_Ucon(self): return copy_c_to_numpy(self.asl.i.Urhsx_, self.n_con)
+    # Routines to get initial values and bounds. With copy=False, a
+    # read-only view on the data owned by ASL is returned.
+    cdef _get(self, double* x, int lenx, bint copy):
+        if copy:
+            return copy_c_to_numpy(x, lenx)
+        return view_c_as_numpy(x, lenx, self)
+
+    def get_x0(self, bint copy=True):
+        return self._get(self.X0, self.n_var, copy)
+    def get_Lvar(self, bint copy=True):
+        return self._get(self.LUv, self.n_var, copy)
+    def get_Uvar(self, bint copy=True):
+        return self._get(self.Uvx, self.n_var, copy)
+    def get_pi0(self, bint copy=True):
+        return self._get(self.pi0, self.n_con, copy)
+    def get_Lcon(self, bint copy=True):
+        return self._get(self.LUrhs, self.n_con, copy)
+    def get_Ucon(self, bint copy=True):
+        return self._get(self.Urhsx, self.n_con, copy)
 
     # Sparsity of Jacobian and Hessian.
     cpdef get_nnzj(self): return self.nzc
-    cpdef get_nnzh(self): return ampl_sphsetup(self.asl, -1, 1, 1, 1)
+    cpdef get_nnzh(self):
+        # The Hessian sparsity structure only needs to be set up once.
+        if self.nnzh < 0:
+            self.nnzh = ampl_sphsetup(self.asl, -1, 1, 1, 1)
+        return self.nnzh
 
     def get_CType(self):
         nln = range(self.nlc)
@@ -274,107 +376,151 @@ cdef class ampl:
         lin = range(self.nlc + self.nlnc, self.n_con)
         return (lin, nln, net)
 
-    def eval_obj(self, ndarray[np.double_t] x, int obj_num=0):
+    def eval_obj(self, x, int obj_num=0):
         cdef:
             int nerror = 0
             double val
+            ndarray xa = as_double_array(x, self.n_var)
+            double* xp = <double*>xa.data
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-
-        val = ampl_objval(self.asl, obj_num, <double*>x.data, &nerror)
+        with nogil:
+            val = ampl_objval(self.asl, obj_num, xp, &nerror)
         if nerror:
             raise ValueError
         return val
 
-    cpdef grad_obj(self, ndarray[np.double_t] x):
+    cpdef grad_obj(self, x, ndarray out=None):
         """Evaluate the gradient of the objective at x."""
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-        cdef ndarray[np.double_t] g = x.copy()
-        if ampl_objgrd(self.asl, 0, <double*>x.data, <double*>g.data):
+        cdef:
+            int nerror
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray g = output_array(out, self.n_var)
+            double* xp = <double*>xa.data
+            double* gp = <double*>g.data
+
+        with nogil:
+            nerror = ampl_objgrd(self.asl, 0, xp, gp)
+        if nerror:
             raise ValueError
         return g
 
-    def eval_cons(self, ndarray[np.double_t] x):
+    def eval_cons(self, x, ndarray out=None):
         """Evaluate the constraints at x."""
-        cdef ndarray[np.double_t] \
-             c = np.empty(self.n_con, dtype=np.double)
-
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-
-        if ampl_conval(self.asl, <double*>x.data, <double*>c.data):
+        cdef:
+            int nerror
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray c = output_array(out, self.n_con)
+            double* xp = <double*>xa.data
+            double* cp = <double*>c.data
+
+        with nogil:
+            nerror = ampl_conval(self.asl, xp, cp)
+        if nerror:
             raise ValueError
         return c
 
-    def eval_sgrad(self, ndarray[np.double_t] x):
-        """Evaluate linear-part of the objective gradient at x.  A
-        sparse gradient is returned as a dictionary."""
+    def eval_sgrad(self, x):
+        """Evaluate the objective gradient at x on its sparsity pattern.
+
+        Return the indices and values of the sparse gradient as arrays."""
+        cdef:
+            ograd* og
+            int j = 0
+
         grad_f = self.grad_obj(x)
-        sg = {} ; j = 0
-        cdef ograd* og = self.asl.i.Ograd_[0]
+        nzo = 0
+        og = self.asl.i.Ograd_[0]
+        while og is not NULL:
+            nzo += 1
+            og = og.next
+
+        ind = np.empty(nzo, dtype=np.int)
+        og = self.asl.i.Ograd_[0]
         while og is not NULL:
-            key = og.varno
-            val = grad_f[j]
-            sg[key] = val
+            ind[j] = og.varno
             og = og.next
             j += 1
-        return sg
+        return (ind, grad_f[ind])
 
     def eval_cost(self):
-        """Evaluate sparse linear-cost vector."""
-        sg = {}
-        cdef ograd* og = self.asl.i.Ograd_[0]
+        """Evaluate sparse linear-cost vector.
+
+        Return the indices and values of the cost vector as arrays."""
+        cdef:
+            ograd* og
+            int j = 0
+
+        nzo = 0
+        og = self.asl.i.Ograd_[0]
+        while og is not NULL:
+            nzo += 1
+            og = og.next
+
+        ind = np.empty(nzo, dtype=np.int)
+        val = np.empty(nzo, dtype=np.double)
+        og = self.asl.i.Ograd_[0]
         while og is not NULL:
-            key = og.varno
-            val = og.coef
-            sg[key] = val
+            ind[j] = og.varno
+            val[j] = og.coef
             og = og.next
-        return sg
+            j += 1
+        return (ind, val)
 
-    def eval_ci(self, int i, ndarray[np.double_t] x):
+    def eval_ci(self, int i, x):
         """Evaluate ith constraint."""
-        cdef double ci = 0.0
+        cdef:
+            double ci = 0.0
+            int nerror
+            ndarray xa
+            double* xp
+
         if i < 0 or i >= self.n_con:
             raise ValueError('Got i = %d; exected 0 <= i < %d' %
                              (i, self.n_con))
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-
-        if ampl_conival(self.asl, i, <double*>x.data, &ci):
+        xa = as_double_array(x, self.n_var)
+        xp = <double*>xa.data
+        with nogil:
+            nerror = ampl_conival(self.asl, i, xp, &ci)
+        if nerror:
             raise ValueError
         return ci
 
-    def eval_gi(self, int i, ndarray[np.double_t] x):
+    def eval_gi(self, int i, x, ndarray out=None):
         """Evaluate the ith constraint gradient at x."""
+        cdef:
+            int nerror
+            ndarray xa, gi
+            double *xp
+            double *gp
+
         if i < 0 or i >= self.n_con:
             raise ValueError('Got i = %d; exected 0 <= i < %d' %
                              (i, self.n_con))
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-
-        cdef ndarray[np.double_t] \
-             gi = np.empty(self.n_var, dtype=np.double)
-        if ampl_congrd(self.asl, i, <double*>x.data, <double*>gi.data):
+        xa = as_double_array(x, self.n_var)
+        gi = output_array(out, self.n_var)
+        xp = <double*>xa.data
+        gp = <double*>gi.data
+        with nogil:
+            nerror = ampl_congrd(self.asl, i, xp, gp)
+        if nerror:
             raise ValueError
         return gi
 
-    def eval_sgi(self, int i, ndarray[np.double_t] x):
+    def eval_sgi(self, int i, x):
         """Evalute the ith constraint sparse gradient at x."""
 
         cdef:
             int nzgi, j
             cgrad* cg
+            ndarray xa
 
         if i < 0 or i >= self.n_con:
             raise ValueError('Got i = %d; exected 0 <= i < %d' %
                              (i, self.n_con))
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
+        xa = as_double_array(x, self.n_var)
 
         # Set sparse format for gradient. (Restore saved val later.)
         congrd_mode_save = self.asl.i.congrd_mode
@@ -390,35 +536,86 @@ cdef class ampl:
         # Allocate storage and evaluate ith constraint at x.
         cdef ndarray[np.double_t] \
              grad_ci = np.empty(nzgi, dtype=np.double)
-        if ampl_congrd(self.asl, i, <double*>x.data, <double*>grad_ci.data):
+        if ampl_congrd(self.asl, i, <double*>xa.data, <double*>grad_ci.data):
             raise ValueError('congrd failed')
 
-        # Generate dictionary.
+        # Collect indices.
         j = 0
-        sgi = {}
+        ind = np.empty(nzgi, dtype=np.int)
         cg = self.asl.i.Cgrad_[i]
         while cg is not NULL:
-            sgi[cg.varno] = grad_ci[j]
+            ind[j] = cg.varno
             cg = cg.next
             j += 1
 
         # Restore gradient mode
         self.asl.i.congrd_mode = congrd_mode_save
 
-        return sgi
+        return (ind, grad_ci)
 
     def eval_row(self, int i):
         """Evaluate the ith constraint gradient as a sparse vector. To
-        be used when the problem is a linear program."""
+        be used when the problem is a linear program.
+
+        Return the indices and values of the row as arrays."""
+        cdef:
+            cgrad* cg
+            int j = 0
+
         if i < 0 or i >= self.n_con:
             raise ValueError('Got i = %d; exected 0 <= i < %d' %
                              (i, self.n_con))
-        row = {}
-        cdef cgrad* cg = self.asl.i.Cgrad_[i]
+        nzr = 0
+        cg = self.asl.i.Cgrad_[i]
         while cg is not NULL:
-            row[cg.varno] = cg.coef
+            nzr += 1
             cg = cg.next
-        return row
+
+        ind = np.empty(nzr, dtype=np.int)
+        val = np.empty(nzr, dtype=np.double)
+        cg = self.asl.i.Cgrad_[i]
+        while cg is not NULL:
+            ind[j] = cg.varno
+            val[j] = cg.coef
+            cg = cg.next
+            j += 1
+        return (ind, val)
+
+    def eval_rows(self, idx):
+        """Evaluate the linear part of the constraints with indices in idx.
+
+        Return the rows in compressed sparse row format as a tuple
+        (indptr, indices, data)."""
+        cdef:
+            cgrad* cg
+            int i, k, nnz = 0
+
+        idx = np.asarray(idx, dtype=np.int)
+        nrows = idx.shape[0]
+        for k in xrange(nrows):
+            i = idx[k]
+            if i < 0 or i >= self.n_con:
+                raise ValueError('Got i = %d; exected 0 <= i < %d' %
+                                 (i, self.n_con))
+            cg = self.asl.i.Cgrad_[i]
+            while cg is not NULL:
+                nnz += 1
+                cg = cg.next
+
+        indptr = np.empty(nrows + 1, dtype=np.int)
+        indices = np.empty(nnz, dtype=np.int)
+        data = np.empty(nnz, dtype=np.double)
+        nnz = 0
+        indptr[0] = 0
+        for k in xrange(nrows):
+            cg = self.asl.i.Cgrad_[idx[k]]
+            while cg is not NULL:
+                indices[nnz] = cg.varno
+                data[nnz] = cg.coef
+                nnz += 1
+                cg = cg.next
+            indptr[k + 1] = nnz
+        return (indptr, indices, data)
 
     def eval_A(self, int store_zeros=0):
         """
@@ -447,46 +644,77 @@ cdef class ampl:
 
         return (A, a_irow, a_icol)
 
-    def eval_J(self, ndarray[np.double_t] x, int store_zeros=0):
-        """Evaluate sparse Jacobian."""
+    def jac_structure(self):
+        """Return the sparsity structure (rows, cols) of the Jacobian."""
         cdef:
-            ndarray[np.double_t] J
-
-            # Variables needed for coordinate format.
-            # ndarray[np.int_t] a_irow, a_icol  # broken.
-
-            # Variables needed for LL format.
             cgrad* cg
-            int* dims = [self.n_con, self.n_var]
-
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
+            int i
 
         nnzj = self.nzc if self.n_con else 0
-
-        # Allocate storage and evaluate Jacobian at x.
-        J = np.empty(nnzj, dtype=np.double)
-        if ampl_jacval(self.asl, <double*>x.data, <double*>J.data):
-            raise ValueError
-
         a_icol = np.empty(nnzj, dtype=np.int)
         a_irow = np.empty(nnzj, dtype=np.int)
 
         for i in xrange(self.n_con):
             cg = self.asl.i.Cgrad_[i]
             while cg is not NULL:
-                # a_irow.data[cg.goff] = i         # broken.
-                # a_icol.data[cg.goff] = cg.varno
                 a_irow[cg.goff] = i
                 a_icol[cg.goff] = cg.varno
                 cg = cg.next
 
+        return (a_irow, a_icol)
+
+    def jac_values(self, x, ndarray out=None):
+        """Evaluate the nonzeros of the sparse Jacobian at x.
+
+        The values are ordered as in :meth:`jac_structure` and are written
+        into `out` if given.
+        """
+        cdef:
+            int nerror
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray J = output_array(out, self.nzc if self.n_con else 0)
+            double* xp = <double*>xa.data
+            double* Jp = <double*>J.data
+
+        with nogil:
+            nerror = ampl_jacval(self.asl, xp, Jp)
+        if nerror:
+            raise ValueError
+        return J
+
+    def eval_J(self, x, int store_zeros=0):
+        """Evaluate sparse Jacobian."""
+        J = self.jac_values(x)
+        a_irow, a_icol = self.jac_structure()
         return (J, a_irow, a_icol)
 
+    def hess_structure(self):
+        """Return the sparsity structure (rows, cols) of the Hessian.
 
-    def eval_H(self, ndarray[np.double_t] x, ndarray[np.double_t] y,
-               double obj_weight=1.0, int store_zeros=0):
-        """Evaluate sparse upper triangle of Lagrangian Hessian.
+        Only the upper triangle of the Lagrangian Hessian is represented.
+        """
+        cdef int i, j, j0, j1, k
+
+        nnzh = self.get_nnzh()
+        a_icol = np.empty(nnzh, dtype=np.int)
+        a_irow = np.empty(nnzh, dtype=np.int)
+
+        k = 0
+        for i in xrange(self.n_var):
+            j0 = self.asl.i.sputinfo_.hcolstarts[i  ]
+            j1 = self.asl.i.sputinfo_.hcolstarts[i+1]
+            for j in xrange(j0,j1):
+                a_icol[k] = self.asl.i.sputinfo_.hrownos[j]
+                a_irow[k] = i
+                k += 1
+
+        return (a_irow, a_icol)
+
+    def hess_values(self, x, y, double obj_weight=1.0, ndarray out=None):
+        """Evaluate the nonzeros of the Lagrangian Hessian at (x, y).
+
+        The values are ordered as in :meth:`hess_structure` and are written
+        into `out` if given.
 
         In the future, we will want to be careful here, in case x has
         changed but f(x), c(x) or J(x) have not yet been recomputed. In
@@ -494,134 +722,165 @@ cdef class ampl:
         Hessian, and it will still hold the Hessian at the last point at
         which, f, c or J were evaluated !"""
         cdef:
-            ndarray[np.double_t] H
-
-            # Variables needed for LL format.
-            cgrad* cg
-            int* dims = [self.n_var, self.n_var]
-
-            # Misc.
             double OW[1]  # Objective type: we currently only support single objective
-            int i, j, j0, j1, k
 
             # variables to compute extra objective function
             int nerror = 0
             int obj_num = 0
-            double val
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-        if not PyArray_ISCARRAY(y): y = y.copy()
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray ya = as_double_array(y, self.n_con)
+            ndarray H = output_array(out, self.get_nnzh())
+            double* xp = <double*>xa.data
+            double* yp = <double*>ya.data
+            double* Hp = <double*>H.data
 
-        # extra objective evaluation.
-        obj = ampl_objval(self.asl, obj_num, <double*>x.data, &nerror)
-        if nerror:
-            raise ValueError
-
-        # Determine room for Hessian and objective sign if maximizing.
-        nnzh = self.get_nnzh()
+        # Objective sign if maximizing.
         OW[0] = obj_weight if self.objtype == 0 else -obj_weight
 
-        # Allocate storage and evaluate Hessian.
-        H = np.empty(nnzh, dtype=np.double)
-        # Note that AMPL is evaluating a UPPER triangular Hessian.
-        ampl_sphes(self.asl, <double*>H.data, -1, OW, <double*>y.data)
-
-        a_icol = np.empty(nnzh, dtype=np.int)
-        a_irow = np.empty(nnzh, dtype=np.int)
+        with nogil:
+            # extra objective evaluation.
+            ampl_objval(self.asl, obj_num, xp, &nerror)
+            if not nerror:
+                # Note that AMPL is evaluating a UPPER triangular Hessian.
+                ampl_sphes(self.asl, Hp, -1, OW, yp)
+        if nerror:
+            raise ValueError
+        return H
 
-        k = 0
-        for i in xrange(self.n_var):
-            j0 = self.asl.i.sputinfo_.hcolstarts[i  ]
-            j1 = self.asl.i.sputinfo_.hcolstarts[i+1]
-            for j in xrange(j0,j1):
-                # a_irow.data[k] = self.asl.i.sputinfo_.hrownos[j]
-                # a_icol.data[k] = i  # broken.
-                a_icol[k] = self.asl.i.sputinfo_.hrownos[j]
-                a_irow[k] = i
-                k += 1
+    def eval_H(self, x, y, double obj_weight=1.0, int store_zeros=0):
+        """Evaluate sparse upper triangle of Lagrangian Hessian.
 
+        See :meth:`hess_values` for a word of caution."""
+        H = self.hess_values(x, y, obj_weight)
+        a_irow, a_icol = self.hess_structure()
         return (H, a_irow, a_icol)
 
-    def H_prod(self, ndarray[np.double_t] x, ndarray[np.double_t] y,
-               ndarray[np.double_t] v, double obj_weight=1.0):
+    def H_prod(self, x, y, v, double obj_weight=1.0, ndarray out=None):
         """Compute matrix-vector product Hv of Lagrangian Hessian
         times a vector.
         """
 
         cdef:
             double OW[1]
-            ndarray[np.double_t] Hv
 
             # variables to compute extra objective function
             int nerror = 0
             int obj_num = 0
-            double val
 
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-        if not PyArray_ISCARRAY(y): y = y.copy()
-        if not PyArray_ISCARRAY(v): v = v.copy()
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray ya = as_double_array(y, self.n_con)
+            ndarray va = as_double_array(v, self.n_var)
+            ndarray Hv = output_array(out, self.n_var)
+            double* xp = <double*>xa.data
+            double* yp = <double*>ya.data
+            double* vp = <double*>va.data
+            double* Hvp = <double*>Hv.data
 
-        # extra objective evaluation.
-        obj = ampl_objval(self.asl, obj_num, <double*>x.data, &nerror)
+        OW[0] = obj_weight if self.objtype == 0 else -obj_weight
+
+        with nogil:
+            # extra objective evaluation.
+            ampl_objval(self.asl, obj_num, xp, &nerror)
+            if not nerror:
+                # Evaluate matrix-vector product Hv
+                ampl_hvcomp(self.asl, Hvp, vp, -1, OW, yp)
         if nerror:
             raise ValueError
+        return Hv
 
-        OW[0] = obj_weight if self.objtype == 0 else -obj_weight
-        Hv = np.empty(self.n_var, dtype=np.double)
+    def H_prod_block(self, x, y, V, double obj_weight=1.0):
+        """Compute the products HV of the Lagrangian Hessian with the
+        columns of the n x k array V.
 
-        # Evaluate matrix-vector product Hv
-        ampl_hvcomp(self.asl, <double*>Hv.data, <double*>v.data,
-                    -1, OW, <double*>y.data)
+        The multipliers are set once for all columns. The result is an
+        n x k array in Fortran order."""
 
-        return Hv
+        cdef:
+            double OW[1]
+            int nerror = 0
+            int obj_num = 0
+            int k
+
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray ya = as_double_array(y, self.n_con)
+            ndarray Va = np.asfortranarray(V, dtype=np.double)
+            ndarray HV
+            double* xp = <double*>xa.data
+            double* yp = <double*>ya.data
+            double* Vp
+            double* HVp
+
+        if Va.ndim != 2 or Va.shape[0] != self.n_var:
+            raise ValueError('Expected an array with %d rows' % self.n_var)
+        k = Va.shape[1]
+        HV = np.empty((self.n_var, k), dtype=np.double, order='F')
+        Vp = <double*>Va.data
+        HVp = <double*>HV.data
+
+        OW[0] = obj_weight if self.objtype == 0 else -obj_weight
 
-    @cython.boundscheck(False)
-    @cython.wraparound(False)
-    def gHi_prod(self, ndarray[np.double_t] x, ndarray[np.double_t] g,
-                 ndarray[np.double_t] v):
+        with nogil:
+            # extra objective evaluation.
+            ampl_objval(self.asl, obj_num, xp, &nerror)
+            if not nerror:
+                ampl_hvcomp_block(self.asl, HVp, Vp, self.n_var, k, -1, OW,
+                                  yp)
+        if nerror:
+            raise ValueError
+        return HV
+
+    def gHi_prod(self, x, g, v):
         """Compute the vector of dot products (g, Hi(x)*v) with the
         constraint Hessians."""
 
         cdef:
-            ndarray[np.double_t] gHiv = np.zeros(self.n_con, dtype=np.double)
-            ndarray[np.double_t] hv = np.empty(self.n_var, dtype=np.double)
-            ndarray[np.double_t] y = np.zeros(self.n_con, dtype=np.double)
+            ndarray gHiv = np.zeros(self.n_con, dtype=np.double)
+            ndarray hv = np.empty(self.n_var, dtype=np.double)
+            ndarray y = np.zeros(self.n_con, dtype=np.double)
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray ga = as_double_array(g, self.n_var)
+            ndarray va = as_double_array(v, self.n_var)
+            double* gHivp = <double*>gHiv.data
+            double* hvp = <double*>hv.data
+            double* yp = <double*>y.data
+            double* xp = <double*>xa.data
+            double* gp = <double*>ga.data
+            double* vp = <double*>va.data
+            double dot
+            int i, j
 
             # variables to compute extra objective function
             int nerror = 0
             int obj_num = 0
-            double val
-
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-        if not PyArray_ISCARRAY(g): g = g.copy()
-        if not PyArray_ISCARRAY(v): v = v.copy()
 
         # extra objective evaluation.
-        obj = ampl_objval(self.asl, obj_num, <double*>x.data, &nerror)
+        with nogil:
+            ampl_objval(self.asl, obj_num, xp, &nerror)
         if nerror:
             raise ValueError
 
         # Process nonlinear constraints. The rest are already zero.
-        for i in range(self.nlc):
-            # Set vector of multipliers to (0, 0, ..., -1, ..., 0).
-            y[i] = -1.0   # Must be -1 because of lagscale().
+        with nogil:
+            for i in range(self.nlc):
+                # Set vector of multipliers to (0, 0, ..., -1, ..., 0).
+                yp[i] = -1.0   # Must be -1 because of lagscale().
 
-            # Compute Hi * v by setting OW to NULL.
-            ampl_hvcomp(self.asl, <double*>hv.data, <double*>v.data,
-                        -1, NULL, <double*>y.data);
+                # Compute Hi * v by setting OW to NULL.
+                ampl_hvcomp(self.asl, hvp, vp, -1, NULL, yp)
 
-            # Compute dot product (g, Hi*v). Should use BLAS.
-            gHiv[i] = np.dot(hv, g)
+                # Compute dot product (g, Hi*v).
+                dot = 0.0
+                for j in range(self.n_var):
+                    dot += hvp[j] * gp[j]
+                gHivp[i] = dot
 
-            # Reset i-th multiplier.
-            y[i] = 0
+                # Reset i-th multiplier.
+                yp[i] = 0
 
         return gHiv
 
-    def set_x(self, ndarray[np.double_t] x):
+    def set_x(self, x):
         """Declare x as current primal value."""
 
         # Call xknown() with given x as argument, to prevent subsequent
@@ -629,28 +888,24 @@ cdef class ampl:
         # has changed since the last call. Users must not forget to call
         # Unset_x when they are finished, and before changing the value
         # of x, or to call Set_x again with an updated value of x.
-
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-
-        ampl_xknown(self.asl, <double*>x.data)
+        cdef ndarray xa = as_double_array(x, self.n_var)
+        ampl_xknown(self.asl, <double*>xa.data)
 
     def unset_x(self):
         """Release current primal value."""
         self.asl.i.x_known = 0
 
-    def ampl_sol(self, ndarray[np.double_t] x, ndarray[np.double_t] y, msg):
+    def ampl_sol(self, x, y, msg):
         """Write primal and dual solution."""
-
-        # Ensure contiguous input.
-        if not PyArray_ISCARRAY(x): x = x.copy()
-        if not PyArray_ISCARRAY(y): y = y.copy()
+        cdef:
+            ndarray xa = as_double_array(x, self.n_var)
+            ndarray ya = as_double_array(y, self.n_con)
 
         # Suppress message echo, force .sol writing.
         self.Oinfo.wantsol = 9
 
         # Output solution.
-        write_sol_ASL(self.asl, msg, <double*>x.data, <double*>y.data, &self.Oinfo)
+        write_sol_ASL(self.asl, msg, <double*>xa.data, <double*>ya.data, &self.Oinfo)
 
         # Flag that a solution has been written.
         self.ampl_written_sol = True
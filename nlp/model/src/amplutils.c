@@ -38,6 +38,14 @@ void ampl_hvcomp(ASL* asl, double* hv, double* v, int nobj, double* ow, double*
   hvpinit_ASL(asl, ihd_limit, nobj, ow, y);
   hvcomp(hv, v, nobj, ow, y);
 }
+void ampl_hvcomp_block(ASL* asl, double* hv, double* v, int n, int k,
+                       int nobj, double* ow, double* y) {
+  int j;
+  /* Multipliers and weights are set once for all k products. */
+  hvpinit_ASL(asl, ihd_limit, nobj, ow, y);
+  for (j = 0; j < k; j++)
+    hvcomp(hv + j*n, v + j*n, nobj, ow, y);
+}
 int ampl_lagscale(ASL *asl, double sigma) {
   int nerror;
   lagscale_ASL(asl, sigma, &nerror);
@@ -76,8 +76,9 @@ class LBFGS(object):
 
         tstart = cputime()
 
-        self.f0 = self.f = f = model.obj(x)
-        self.g = g = model.grad(x)
+        with model.at(x):
+            self.f0 = self.f = f = model.obj(x)
+            self.g = g = model.grad(x)
         self.g_norm0 = g_norm = norms.norm2(g)
         stoptol = max(self.abstol, self.reltol * self.g_norm0)
 
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Levenberg-Marquardt method for nonlinear least squares."""
+
+from nlp.optimize.trunk import Trunk
+from nlp.optimize.pcg import TruncatedCG
+from nlp.tr.trustregion import TrustRegion
+
+__docformat__ = "restructuredtext"
+
+
+class LevenbergMarquardt(Trunk):
+    u"""Trust-region Gauss-Newton method for nonlinear least squares.
+
+    A stationary point of
+
+        minimize ½‖r(x)‖²
+
+    is identified by approximately solving a sequence of linear
+    least-squares subproblems
+
+        min  ½‖r + J s‖²  subject to  ‖s‖ ≤ Δ,
+
+    where r and J are the residuals and their Jacobian at the current
+    iterate. This is the trust-region form of the Levenberg-Marquardt
+    method (J. J. Moré, *The Levenberg-Marquardt algorithm: implementation
+    and theory*, Lecture Notes in Mathematics **630**, pp. 105-116, 1978).
+    The subproblems are the quadratic models of :class:`Trunk` with the
+    Gauss-Newton Hessian JᵀJ supplied by :class:`LSQModel`, so that each
+    iteration evaluates the residuals once and, if the step is accepted,
+    their Jacobian once.
+    """
+
+    def __init__(self, nlp, tr=None, tr_solver=TruncatedCG, **kwargs):
+        """Instantiate a Levenberg-Marquardt solver for ``nlp``.
+
+        :parameters:
+            :nlp:       a :class:`LSQModel` instance.
+            :tr:        a :class:`TrustRegion` instance
+                        (default: ``TrustRegion()``).
+            :tr_solver: a trust-region solver to be passed as argument to
+                        the :class:`TrustRegionSolver` constructor
+                        (default: :class:`TruncatedCG`).
+
+        :keywords:
+            :inexact:      use inexact Newton stopping tol    (``True``)
+            :monotone:     use monotone descent strategy      (``True``)
+            :logger_name:  name of a logger                   ('nlp.lm')
+
+        Other keywords are those of :class:`Trunk`.
+        """
+        if tr is None:
+            tr = TrustRegion()
+        kwargs.setdefault("inexact", True)
+        kwargs.setdefault("monotone", True)
+        kwargs.setdefault("logger_name", "nlp.lm")
+        super(LevenbergMarquardt, self).__init__(nlp, tr, tr_solver, **kwargs)
@@ -377,9 +377,11 @@ class TRON(object):
         self.x = project(self.x, model.Lvar, model.Uvar)
 
         # Gather initial information.
-        self.f = model.obj(self.x)
+        with model.at(self.x):
+            self.f = model.obj(self.x)
+            # Current gradient.
+            self.g = model.grad(self.x, out=np.empty(model.n))
         self.f0 = self.f
-        self.g = model.grad(self.x)  # Current  gradient
         self.g_old = self.g.copy()
         pgnorm = projected_gradient_norm2(self.x, self.g,
                                           model.Lvar, model.Uvar)
@@ -400,8 +402,6 @@ class TRON(object):
         exitFunCall = model.obj.ncalls >= self.maxfuncall
         status = ""
 
-        # Wrap Hessian into an operator.
-        H = model.hop(self.x, self.model.pi0)
         tick = cputime()
 
         # Print out header and initial log.
@@ -417,24 +417,26 @@ class TRON(object):
             if self.save_g:
                 self.g_old = self.g.copy()
 
-            # Compute the Cauchy step and store in s.
-            (s, self.alphac) = self.cauchy(self.x, self.g, H,
-                                           model.Lvar, model.Uvar,
-                                           self.tr.radius,
-                                           self.alphac)
+            with model.at(self.x):
+                # Wrap Hessian into an operator.
+                H = model.hop(self.x, self.model.pi0)
 
-            # Compute the projected Newton step.
-            (x, s, cg_iter, _) = self.projected_newton_step(self.x, self.g, H,
-                                                            self.tr.radius,
-                                                            model.Lvar,
-                                                            model.Uvar, s,
-                                                            cgtol, cgitermax)
+                # Compute the Cauchy step and store in s.
+                (s, self.alphac) = self.cauchy(self.x, self.g, H,
+                                               model.Lvar, model.Uvar,
+                                               self.tr.radius,
+                                               self.alphac)
 
-            snorm = norms.norm2(s)
-            self.total_cgiter += cg_iter
+                # Compute the projected Newton step.
+                (x, s, cg_iter, _) = self.projected_newton_step(
+                    self.x, self.g, H, self.tr.radius, model.Lvar,
+                    model.Uvar, s, cgtol, cgitermax)
+
+                snorm = norms.norm2(s)
+                self.total_cgiter += cg_iter
 
-            # Compute the predicted reduction.
-            m = np.dot(s, self.g) + .5 * np.dot(s, H * s)
+                # Compute the predicted reduction.
+                m = np.dot(s, self.g) + .5 * np.dot(s, H * s)
 
             # Evaluate actual objective.
             x_trial = self.x + s
@@ -469,7 +471,7 @@ class TRON(object):
                 # Trust-region step is accepted.
                 self.x = x_trial
                 self.f = f_trial
-                self.g = model.grad(self.x)
+                self.g = model.grad(self.x, out=self.g)
                 step_status = "Acc"
                 self.step_accepted = True
                 self.dvars = s
@@ -488,7 +490,7 @@ class TRON(object):
                     ared = self.f - f_trial
                     self.x = ls.iterate
                     self.f = ls.trial_value
-                    self.g = model.grad(self.x)
+                    self.g = model.grad(self.x, out=self.g)
                     snorm *= ls.step
                     self.tr.radius = snorm
                     step_status = "N-Y"
@@ -132,9 +132,10 @@ class Trunk(object):
         nlp = self.nlp
 
         # Gather initial information.
-        self.f = self.nlp.obj(self.x)
+        with nlp.at(self.x):
+            self.f = nlp.obj(self.x)
+            self.g = nlp.grad(self.x, out=np.empty(nlp.n))
         self.f0 = self.f
-        self.g = self.nlp.grad(self.x)
         self.g_old = self.g
         self.gNorm = norms.norm2(self.g)
         self.g0 = self.gNorm
@@ -178,11 +179,12 @@ class Trunk(object):
             if self.inexact:
                 cgtol = max(stoptol, min(0.7 * cgtol, 0.01 * self.gNorm))
 
-            qp = QPModel(self.g, self.nlp.hop(self.x, self.nlp.pi0))
-            self.solver = TrustRegionSolver(qp, self.tr_solver)
-            self.solver.solve(prec=self.precon,
-                              radius=self.tr.radius,
-                              reltol=cgtol)
+            with nlp.at(self.x):
+                qp = QPModel(self.g, nlp.hop(self.x, nlp.pi0))
+                self.solver = TrustRegionSolver(qp, self.tr_solver)
+                self.solver.solve(prec=self.precon,
+                                  radius=self.tr.radius,
+                                  reltol=cgtol)
 
             step = self.solver.step
             snorm = self.solver.step_norm
@@ -213,7 +215,7 @@ class Trunk(object):
                 self.tr.update_radius(rho, snorm)
                 self.x = x_trial
                 self.f = f_trial
-                self.g = nlp.grad(self.x)
+                self.g = nlp.grad(self.x, out=self.g)
                 self.gNorm = norms.norm2(self.g)
                 self.dvars = step
                 if self.save_g:
@@ -256,7 +258,7 @@ class Trunk(object):
                         f_trial = nlp.obj(x_trial)
                     self.x = x_trial
                     self.f = f_trial
-                    self.g = nlp.grad(self.x)
+                    self.g = nlp.grad(self.x, out=self.g)
                     self.gNorm = norms.norm2(self.g)
                     self.tr.radius = self.alpha * snorm
                     snorm /= self.alpha
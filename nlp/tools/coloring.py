@@ -0,0 +1,267 @@
+"""Graph coloring for the compressed evaluation of sparse derivatives.
+
+A sparse m x n Jacobian J can be recovered from the p products J s_k, where
+the seed vectors s_k group columns of J that have no nonzero row in common.
+Such groups are the color classes of a coloring of the columns. Similarly,
+a sparse symmetric Hessian H can be recovered directly from the products
+H s_k when the seed vectors are derived from a star coloring of the
+adjacency graph of H, i.e., a coloring in which every path on four
+vertices uses at least three colors. See
+
+  A. H. Gebremedhin, F. Manne and A. Pothen, *What color is your Jacobian?
+  Graph coloring for computing derivatives*, SIAM Review **47** (4),
+  pp. 629-705, 2005.
+
+Sparsity patterns are given as arrays of row and column indices of the
+nonzero elements. They may be supplied by the user or detected by probing
+with :func:`probe_pattern`.
+"""
+
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+def _compress(rows, cols, nrow):
+    """Return the compressed row representation (indptr, indices) of a pattern.
+
+    Duplicate elements are removed.
+    """
+    rows = np.asarray(rows, dtype=np.int)
+    cols = np.asarray(cols, dtype=np.int)
+    perm = np.lexsort((cols, rows))
+    rows = rows[perm]
+    cols = cols[perm]
+    if rows.size > 0:
+        keep = np.ones(rows.size, dtype=np.bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows = rows[keep]
+        cols = cols[keep]
+    indptr = np.zeros(nrow + 1, dtype=np.int)
+    np.cumsum(np.bincount(rows, minlength=nrow), out=indptr[1:])
+    return (indptr, cols)
+
+
+def _adjacency(rows, cols, n):
+    """Return the adjacency graph of a symmetric pattern in compressed form.
+
+    The pattern may be given by either or both of its triangles. Diagonal
+    elements are ignored.
+    """
+    rows = np.asarray(rows, dtype=np.int)
+    cols = np.asarray(cols, dtype=np.int)
+    off = rows != cols
+    return _compress(np.concatenate((rows[off], cols[off])),
+                     np.concatenate((cols[off], rows[off])), n)
+
+
+def _largest_first(indptr):
+    """Return vertices ordered by nonincreasing degree."""
+    return np.argsort(-np.diff(indptr), kind='mergesort')
+
+
+def column_coloring(rows, cols, shape):
+    """Color the columns of a sparse pattern for compressed Jacobians.
+
+    Two columns receive different colors whenever they have a nonzero in a
+    common row, i.e., the column intersection graph is colored. Columns are
+    colored greedily in order of nonincreasing degree.
+
+    :parameters:
+        :rows:   row indices of the nonzero elements
+        :cols:   column indices of the nonzero elements
+        :shape:  (m, n), dimensions of the matrix
+
+    :returns:
+        integer array of size n holding the color of each column. Colors are
+        numbered consecutively from zero.
+    """
+    m, n = shape
+    r_ptr, r_ind = _compress(rows, cols, m)
+    c_ptr, c_ind = _compress(cols, rows, n)
+
+    # Degree in the column intersection graph, up to multiplicities.
+    r_len = np.diff(r_ptr)
+    degree = np.zeros(n, dtype=np.int)
+    for j in xrange(n):
+        degree[j] = r_len[c_ind[c_ptr[j]:c_ptr[j + 1]]].sum()
+    order = np.argsort(-degree, kind='mergesort')
+
+    colors = -np.ones(n, dtype=np.int)
+    mark = -np.ones(n + 1, dtype=np.int)
+    for j in order:
+        for i in c_ind[c_ptr[j]:c_ptr[j + 1]]:
+            nbr_colors = colors[r_ind[r_ptr[i]:r_ptr[i + 1]]]
+            mark[nbr_colors[nbr_colors >= 0]] = j
+        c = 0
+        while mark[c] == j:
+            c += 1
+        colors[j] = c
+    return colors
+
+
+def star_coloring(rows, cols, n):
+    """Star-color the adjacency graph of a symmetric sparse pattern.
+
+    The coloring is a proper coloring in which every path on four vertices
+    uses at least three colors, so that a symmetric matrix with the given
+    pattern may be recovered directly from its products with the seed
+    matrix. Vertices are colored greedily in order of nonincreasing degree.
+
+    :parameters:
+        :rows:  row indices of the nonzero elements
+        :cols:  column indices of the nonzero elements
+        :n:     order of the matrix
+
+    The pattern may be given by either or both of its triangles.
+
+    :returns:
+        integer array of size n holding the color of each vertex. Colors are
+        numbered consecutively from zero.
+    """
+    indptr, indices = _adjacency(rows, cols, n)
+    colors = -np.ones(n, dtype=np.int)
+
+    # count[u][c] is the number of neighbors of u with color c. bad[w] holds
+    # the colors of the neighbors x of w that have another neighbor y with
+    # the color of w, so that the path w - x - y is two-colored.
+    count = [{} for _ in xrange(n)]
+    bad = [set() for _ in xrange(n)]
+
+    for v in _largest_first(indptr):
+        nbrs = indices[indptr[v]:indptr[v + 1]]
+        count_v = count[v]
+
+        # Forbid the colors of the neighbors of v, and the colors that would
+        # close a two-colored path on four vertices through v, either as
+        # an end (v - w - x - y) or as an interior vertex (u - v - w - x).
+        forbidden = set(count_v)
+        for w in nbrs:
+            cw = colors[w]
+            if cw < 0:
+                continue
+            if count_v[cw] > 1:
+                forbidden.update(count[w])
+            else:
+                forbidden.update(bad[w])
+
+        c = 0
+        while c in forbidden:
+            c += 1
+        colors[v] = c
+
+        for w in nbrs:
+            cw = colors[w]
+            if cw >= 0 and count_v.get(cw, 0) > 1:
+                bad[w].add(c)
+
+        for u in nbrs:
+            count_u = count[u]
+            k = count_u.get(c, 0) + 1
+            count_u[c] = k
+            cu = colors[u]
+            if cu < 0 or k < 2:
+                continue
+            if k == 2:
+                for w in indices[indptr[u]:indptr[u + 1]]:
+                    if colors[w] == c:
+                        bad[w].add(cu)
+            else:
+                bad[v].add(cu)
+
+    return colors
+
+
+def seed_matrix(colors):
+    """Return the seed matrix associated to a coloring.
+
+    Column k of the n x p seed matrix is the indicator vector of the k-th
+    color class, where p is the number of colors.
+    """
+    colors = np.asarray(colors, dtype=np.int)
+    n = colors.size
+    p = colors.max() + 1 if n > 0 else 0
+    S = np.zeros((n, p))
+    S[np.arange(n), colors] = 1
+    return S
+
+
+def recover_jacobian(B, rows, cols, colors):
+    """Recover the nonzero elements of a Jacobian from its compressed form.
+
+    :parameters:
+        :B:       m x p array of products of the Jacobian with the seed
+                  matrix associated to `colors`
+        :rows:    row indices of the nonzero elements
+        :cols:    column indices of the nonzero elements
+        :colors:  column coloring obtained from :func:`column_coloring`
+
+    :returns:
+        the values of the nonzero elements, in the order of (rows, cols).
+    """
+    return B[rows, colors[cols]]
+
+
+def recover_hessian(B, rows, cols, colors):
+    """Recover the nonzero elements of a Hessian from its compressed form.
+
+    :parameters:
+        :B:       n x p array of products of the Hessian with the seed
+                  matrix associated to `colors`
+        :rows:    row indices of the nonzero elements
+        :cols:    column indices of the nonzero elements
+        :colors:  star coloring obtained from :func:`star_coloring`
+
+    The pattern (rows, cols) must contain each off-diagonal element once,
+    in either triangle.
+
+    :returns:
+        the values of the nonzero elements, in the order of (rows, cols).
+
+    Element (i, j) is read from B[i, color[j]] if j is the only neighbor of
+    i with its color and from B[j, color[i]] otherwise. The definition of a
+    star coloring guarantees that one of the two applies.
+    """
+    rows = np.asarray(rows, dtype=np.int)
+    cols = np.asarray(cols, dtype=np.int)
+    p = B.shape[1]
+    off = rows != cols
+    both_r = np.concatenate((rows[off], cols[off]))
+    both_c = np.concatenate((cols[off], rows[off]))
+    count = np.bincount(both_r * p + colors[both_c], minlength=B.shape[0] * p)
+    direct = count[rows * p + colors[cols]] == 1
+    direct[~off] = True
+    return np.where(direct,
+                    B[rows, colors[cols]],
+                    B[cols, colors[rows]])
+
+
+def probe_pattern(prod, n, tol=0.0):
+    """Detect the sparsity pattern of a matrix from its columns.
+
+    :parameters:
+        :prod:  function returning the product of the matrix with a vector
+        :n:     number of columns of the matrix
+
+    :keywords:
+        :tol:   elements whose absolute value does not exceed `tol` are
+                considered to be zero (default: 0)
+
+    :returns:
+        (rows, cols), the indices of the nonzero elements.
+
+    The n products are performed with the columns of the identity. Elements
+    that vanish at the point where the products are evaluated are missed.
+    """
+    e = np.zeros(n)
+    rows = []
+    cols = []
+    for j in xrange(n):
+        e[j] = 1
+        nz = np.where(np.abs(prod(e)) > tol)[0]
+        e[j] = 0
+        rows.append(nz)
+        cols.append(j * np.ones(nz.size, dtype=np.int))
+    if n == 0:
+        return (np.zeros(0, dtype=np.int), np.zeros(0, dtype=np.int))
+    return (np.concatenate(rows).astype(np.int), np.concatenate(cols))
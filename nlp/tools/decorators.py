@@ -3,6 +3,7 @@
 import warnings
 import functools
 import hashlib
+import inspect
 import numpy as np
 
 
@@ -38,6 +39,32 @@ def counter(func):
     return _counted
 
 
+def optional_out(func):
+    """Make the `out` keyword argument optional for the wrapped function.
+
+    If the wrapped function or method does not accept an `out` keyword, it is
+    removed from the call. In all cases, if `out` is specified, the result is
+    stored in `out` and `out` is returned.
+    """
+    try:
+        spec = inspect.getargspec(func)
+        native = 'out' in spec.args or spec.keywords is not None
+    except TypeError:
+        native = True
+
+    @functools.wraps(func)
+    def _with_out(*args, **kwargs):
+        out = kwargs.get('out', None)
+        if not native:
+            kwargs.pop('out', None)
+        result = func(*args, **kwargs)
+        if out is None or result is out:
+            return result
+        out[...] = result
+        return out
+    return _with_out
+
+
 def get_signature(x):
     """Return signature of argument.
 
@@ -2,9 +2,11 @@
 
 """A simple derivative checker."""
 
+from nlp.tools import coloring
 import numpy as np
 from numpy.linalg import norm
-from math import sqrt
+from math import log, sqrt
+import functools
 import logging
 
 np.random.seed(0)
@@ -33,10 +35,23 @@ class DerivativeChecker(object):
             :step:        centered finite difference step, will be scaled
                             by (1 + ‖x‖₁) (default: ³√(ϵ/3))
             :logger_name: name of a logger object (default: None)
+            :batch:       number of directions whose perturbed points are
+                            evaluated together (default: 64)
+            :pool:        pool of workers with a `map` method, e.g., an
+                            instance of `multiprocessing.dummy.Pool`, on
+                            which perturbed points are evaluated
+                            (default: None)
+
+        If the model has a method `obj_block(X)` returning the objective
+        values at the columns of the n x k array X, the perturbed points of
+        a batch are passed to a single call of `obj_block` when checking
+        the gradient.
         """
         self.tol = kwargs.get('tol', 100 * sqrt(macheps))
         self.step = kwargs.get('step', (macheps / 3)**(1. / 3))
         self.h = self.step * (1 + norm(x, 1))
+        self.batch = max(1, kwargs.get('batch', 64))
+        self.pool = kwargs.get('pool', None)
 
         # Setup the logger. Install a NullHandler if no output needed.
         logger_name = kwargs.get('logger_name', 'nlp.der')
@@ -51,6 +66,11 @@ class DerivativeChecker(object):
         self.jac_errs = {}
         self.hess_errs = {}
         self.chess_errs = {}
+        self.jac_zero_errs = {}
+        self.hess_zero_errs = {}
+        self.chess_zero_errs = {}
+        self.random_errs = {}
+        self.random_bounds = {}
 
         headfmt = '%4s  %4s        %22s  %22s  %7s'
         self.head = headfmt % ('Fun', 'Var', 'Expected',
@@ -75,13 +95,30 @@ class DerivativeChecker(object):
             :hess:      Check objective Hessian   (default `True`)
             :jac:       Check constraints Jacobian (default `True` if m > 0)
             :chess:     Check constraints Hessian (default `True` if m > 0)
+            :random:    number of random directions along which to check the
+                        derivatives instead of checking them entry by entry
+                        (default 0). See :meth:`random_check`.
+            :sparse:    Check the Jacobian and Hessians using the sparsity
+                        structure of their coordinate format (default
+                        `False`). See :meth:`check_sparse_con_jacobian`.
+                        Cannot be combined with `random`.
         """
         grad = kwargs.get('grad', True)
         hess = kwargs.get('hess', True)
         jac = kwargs.get('jac', True) if self.model.ncon > 0 else False
         chess = kwargs.get('chess', True) if self.model.ncon > 0 else False
         cheap = kwargs.get('cheap_check', False)
+        ndir = kwargs.get('random', 0)
+        sparse = kwargs.get('sparse', False)
+        if ndir > 0 and sparse:
+            raise ValueError('Random and sparse checks are exclusive')
         self.log.debug('Tolerance: %8.2e', self.tol)
+
+        if ndir > 0:
+            self.random_errs = self.random_check(ndir, grad=grad, hess=hess,
+                                                 jac=jac, chess=chess)
+            return
+
         self.log.debug('Gradient checking')
 
         if grad:
@@ -89,6 +126,18 @@ class DerivativeChecker(object):
                 self.cheap_grad_errs = self.cheap_check_obj_gradient()
             else:
                 self.grad_errs = self.check_obj_gradient()
+        if sparse:
+            if jac:
+                (self.jac_errs,
+                 self.jac_zero_errs) = self.check_sparse_con_jacobian()
+            if hess:
+                (self.hess_errs,
+                 self.hess_zero_errs) = self.check_sparse_obj_hessian()
+            if chess:
+                (self.chess_errs,
+                 self.chess_zero_errs) = self.check_sparse_con_hessians()
+            return
+
         if jac:
             self.jac_errs = self.check_con_jacobian()
         if hess:
@@ -131,6 +180,87 @@ class DerivativeChecker(object):
 
         return errs
 
+    def _map(self, func, points):
+        """Evaluate func at each of the given points, possibly concurrently."""
+        if self.pool is None:
+            return map(func, points)
+        return self.pool.map(func, points)
+
+    def _central_differences(self, func, k, direction, block=None):
+        u"""Generate centered finite differences of func along k directions.
+
+        Yield (j, (func(x + h dⱼ) - func(x - h dⱼ)) / 2h) for j = 0, ..., k-1,
+        where dⱼ = direction(j). The perturbed points of ``self.batch``
+        directions are evaluated together, by `block` if given and
+        otherwise by mapping `func` over them.
+        """
+        for start in xrange(0, k, self.batch):
+            chunk = range(start, min(k, start + self.batch))
+            nc = len(chunk)
+            X = np.empty((self.model.n, 2 * nc))
+            for (t, j) in enumerate(chunk):
+                d = self.step * direction(j)
+                X[:, t] = self.x + d
+                X[:, nc + t] = self.x - d
+            if block is not None:
+                vals = block(X)
+            else:
+                vals = self._map(func, [X[:, t].copy()
+                                        for t in xrange(2 * nc)])
+            for (t, j) in enumerate(chunk):
+                yield (j, (vals[t] - vals[nc + t]) / (2 * self.step))
+
+    def _unit(self, i):
+        """Return the i-th column of the identity of order n."""
+        e = np.zeros(self.model.n)
+        e[i] = 1
+        return e
+
+    def _compare(self, errs, expected, approx, fmt, labels, key):
+        """Compare expected derivatives to their finite-difference estimate.
+
+        Entries whose scaled error exceeds ``self.tol`` are logged as
+        warnings and stored in `errs` under key(t), where t is the index of
+        the entry. The other entries are logged for debugging. Log lines
+        start with labels(t).
+        """
+        expected = np.asarray(expected, dtype=np.float).ravel()
+        approx = np.asarray(approx, dtype=np.float).ravel()
+        err = np.abs(expected - approx) / np.maximum(1, np.abs(approx))
+        if self.log.isEnabledFor(logging.DEBUG):
+            entries = xrange(err.size)
+        else:
+            entries = np.where(err > self.tol)[0]
+        for t in entries:
+            line = fmt % (labels(t) + (expected[t], approx[t], err[t]))
+            if err[t] > self.tol:
+                self.log.warn(line)
+                errs[key(t)] = err[t]
+            else:
+                self.log.debug(line)
+
+    def _hess_row(self, H, i):
+        """Return the elements H[i, :i+1] of a symmetric matrix or operator.
+
+        Operators are applied once to the i-th column of the identity.
+        """
+        if isinstance(H, np.ndarray):
+            return np.asarray(H[i, :i + 1]).ravel()
+        if hasattr(H, "__getitem__"):
+            return np.array([H[i, j] for j in xrange(i + 1)])
+        return (H * self._unit(i))[:i + 1]
+
+    def _jac_column(self, J, i):
+        """Return the i-th column of a Jacobian matrix or operator.
+
+        Operators are applied once to the i-th column of the identity.
+        """
+        if isinstance(J, np.ndarray):
+            return np.asarray(J[:, i]).ravel()
+        if hasattr(J, "__getitem__"):
+            return np.array([J[j, i] for j in xrange(self.model.m)])
+        return J * self._unit(i)
+
     def check_obj_gradient(self):
         """Check objective gradient using centered finite differences.
 
@@ -146,24 +276,14 @@ class DerivativeChecker(object):
         self.log.debug('Objective gradient')
         self.log.debug(self.head)
 
-        # Check partial derivatives in turn.
-        xph = self.x.copy()
-        xmh = self.x.copy()
-        for i in xrange(n):
-            xph[i] += self.step
-            xmh[i] -= self.step
-            dfdxi = (model.obj(xph) - model.obj(xmh)) / (2 * self.step)
-            err = abs(gx[i] - dfdxi) / max(1, abs(dfdxi))
-            xph[i] = xmh[i] = self.x[i]
-
-            line = self.d1fmt % (0, i, gx[i], dfdxi, err)
-
-            if err > self.tol:
-                self.log.warn(line)
-                errs[i] = err
-            else:
-                self.log.debug(line)
+        # Estimate all partial derivatives, then compare them at once.
+        dfdx = np.empty(n)
+        for (i, dfdxi) in self._central_differences(
+                model.obj, n, self._unit, getattr(model, 'obj_block', None)):
+            dfdx[i] = dfdxi
 
+        self._compare(errs, gx, dfdx, self.d1fmt,
+                      lambda i: (0, i), lambda i: int(i))
         return errs
 
     def check_obj_hessian(self):
@@ -181,47 +301,14 @@ class DerivativeChecker(object):
             self.log.warn("Hessian format not supported, using operator")
             Hx = model.hop(self.x)
 
-        if not hasattr(Hx, "__getitem__"):
-            # Extract Hessian values via dot products.
-            ei = np.zeros(n)
-            ej = np.zeros(n)
-
         self.log.debug('Objective Hessian')
 
-        # Check second partial derivatives in turn.
-        xph = self.x.copy()
-        xmh = self.x.copy()
-        for i in xrange(n):
-            xph[i] += self.step
-            xmh[i] -= self.step
-            dgdx = (model.grad(xph) - model.grad(xmh)) / (2 * self.step)
-            xph[i] = xmh[i] = self.x[i]
-
-            if not hasattr(Hx, "__getitem__"):
-                ei[i] = 1
-
-            for j in xrange(i + 1):
-                dgjdxi = dgdx[j]
-
-                if hasattr(Hx, "__getitem__"):
-                    Hxij = Hx[i, j]
-                else:
-                    ej[j] = 1
-                    Hxij = np.dot(ei, Hx * ej)
-                    ej[j] = 0
-
-                err = abs(Hxij - dgjdxi) / max(1, abs(dgjdxi))
-
-                line = self.d2fmt % (0, i, j, Hxij, dgjdxi, err)
-                if err > self.tol:
-                    self.log.warn(line)
-                    errs[(i, j)] = err
-                else:
-                    self.log.debug(line)
-
-            if not hasattr(Hx, "__getitem__"):
-                # Restore ei before the next iteration.
-                ei[i] = 0
+        # Check second partial derivatives one row at a time.
+        for (i, dgdx) in self._central_differences(model.grad, n,
+                                                   self._unit):
+            self._compare(errs, self._hess_row(Hx, i), dgdx[:i + 1],
+                          self.d2fmt, lambda j: (0, i, j),
+                          lambda j: (i, int(j)))
 
         return errs
 
@@ -240,47 +327,14 @@ class DerivativeChecker(object):
             self.log.error("Jacobian format not supported, using operator")
             Jx = model.jop(self.x)
 
-        if not hasattr(Jx, "__getitem__"):
-            # Extract Jacobian values via dot products.
-            ei = np.zeros(n)
-            ej = np.zeros(m)
-
         self.log.debug('Constraints Jacobian')
 
-        # Check partial derivatives of each constraint in turn.
-        xph = self.x.copy()
-        xmh = self.x.copy()
-        for i in xrange(n):  # i = variable.
-            xph[i] += self.step
-            xmh[i] -= self.step
-            dcdxi = (model.cons(xph) - model.cons(xmh)) / (2 * self.step)
-            xph[i] = xmh[i] = self.x[i]
-
-            if not hasattr(Jx, "__getitem__"):
-                ei[i] = 1
-
-            for j in xrange(m):  # j = constraint.
-                dcjdxi = dcdxi[j]
-
-                if hasattr(Jx, "__getitem__"):
-                    Jxji = Jx[j, i]
-                else:
-                    ej[j] = 1
-                    Jxji = np.dot(ej, Jx * ei)
-                    ej[j] = 0
-
-                err = abs(Jxji - dcjdxi) / max(1, abs(dcjdxi))
-
-                line = self.d1fmt % (j + 1, i, Jxji, dcjdxi, err)
-                if err > self.tol:
-                    self.log.warn(line)
-                    errs[(j, i)] = err
-                else:
-                    self.log.debug(line)
-
-            if not hasattr(Jx, "__getitem__"):
-                # Restore ei before the next iteration.
-                ei[i] = 0
+        # Check partial derivatives of all constraints one column at a time.
+        for (i, dcdxi) in self._central_differences(model.cons, n,
+                                                    self._unit):
+            self._compare(errs, self._jac_column(Jx, i), dcdxi,
+                          self.d1fmt, lambda j: (j + 1, i),
+                          lambda j: (int(j), i))
 
         return errs
 
@@ -299,8 +353,6 @@ class DerivativeChecker(object):
 
         # Check each Hessian in turn.
         y = np.zeros(m)
-        xph = self.x.copy()
-        xmh = self.x.copy()
         for k in xrange(m):
             y[k] = -1
             Hk = self.model.hess(self.x, y, obj_weight=0)
@@ -308,47 +360,302 @@ class DerivativeChecker(object):
 
             if isinstance(Hk, tuple):
                 self.log.error("Hessian format not supported, using operator")
-                Hk = self.model.hop(self.x, y, obj_weight=0)
-
-            if not hasattr(Hk, "__getitem__"):
-                # Extract Hessian values via dot products.
-                ei = np.zeros(n)
-                ej = np.zeros(n)
-
-            # Check second partial derivatives in turn.
-            for i in xrange(n):
-                xph[i] += self.step
-                xmh[i] -= self.step
-                dgdx = (self.model.igrad(k, xph) -
-                        self.model.igrad(k, xmh)) / (2 * self.step)
-                xph[i] = xmh[i] = self.x[i]
-
-                if not hasattr(Hk, "__getitem__"):
-                    ei[i] = 1
-
-                for j in xrange(i + 1):
-                    dgjdxi = dgdx[j]
-
-                    if hasattr(Hk, "__getitem__"):
-                        Hkij = Hk[i, j]
-                    else:
-                        ej[j] = 1
-                        Hkij = np.dot(ei, Hk * ej)
-                        ej[j] = 0
-
-                    err = abs(Hkij - dgjdxi) / max(1, abs(dgjdxi))
-
-                    line = self.d2fmt % (k + 1, i, j, Hkij, dgjdxi, err)
-                    if err > self.tol:
-                        self.log.warn(line)
-                        errs[k][(i, j)] = err
-                    else:
-                        self.log.debug(line)
-
-                if not hasattr(Hk, "__getitem__"):
-                    # Restore ei before the next iteration.
-                    ei[i] = 0
+                Hk = self.model.hop(self.x, y.copy(), obj_weight=0)
+
+            # Check second partial derivatives one row at a time.
+            igrad = functools.partial(self.model.igrad, k)
+            for (i, dgdx) in self._central_differences(igrad, n, self._unit):
+                self._compare(errs[k], self._hess_row(Hk, i), dgdx[:i + 1],
+                              self.d2fmt, lambda j: (k + 1, i, j),
+                              lambda j: (i, int(j)))
+
             # Restore y before the next iteration.
             y[k] = 0
 
         return errs
+
+    def _check_sparse(self, M, func, symmetric, fmt, labels):
+        """Check a sparse derivative given in coordinate format.
+
+        :parameters:
+            :M:          triplet (vals, rows, cols) of the derivative at x
+            :func:       function whose derivative is M
+            :symmetric:  M is a Hessian given by either or both of its
+                         triangles. Otherwise, M is a Jacobian.
+            :fmt:        format of log lines
+            :labels:     function returning the labels of element (i, j) in
+                         log lines
+
+        The columns are colored and one centered difference of `func` is
+        computed along each seed vector. The structural nonzeros are
+        recovered from these compressed differences and compared to M.
+        Every compressed difference must also match the corresponding
+        combination of the elements of M. If it does not, the columns of
+        that color are differenced one by one and their elements outside
+        the structure are compared to zero.
+
+        Return a pair of dictionaries of the elements whose scaled error
+        exceeds ``self.tol``: structural nonzeros, and structural zeros.
+        Hessian elements are indexed by their position in the lower
+        triangle.
+        """
+        n = self.model.n
+        (vals, rows, cols) = M
+        vals = np.asarray(vals, dtype=np.float)
+        rows = np.asarray(rows, dtype=np.int)
+        cols = np.asarray(cols, dtype=np.int)
+        errs = {}
+        zero_errs = {}
+        if n == 0:
+            return (errs, zero_errs)
+
+        if symmetric:
+            # Keep one copy of elements given in both triangles.
+            keys = np.maximum(rows, cols) * n + np.minimum(rows, cols)
+            (keys, first) = np.unique(keys, return_index=True)
+            vals = vals[first]
+        else:
+            (keys, inverse) = np.unique(rows * n + cols, return_inverse=True)
+            vals = np.bincount(inverse, weights=vals, minlength=keys.size)
+        (rows, cols) = np.divmod(keys, n)
+
+        if symmetric:
+            colors = coloring.star_coloring(rows, cols, n)
+        else:
+            colors = coloring.column_coloring(rows, cols, (self.model.m, n))
+        S = coloring.seed_matrix(colors)
+        nseeds = S.shape[1]
+        self.log.debug('%d finite differences for %d columns', nseeds, n)
+
+        B = None
+        for (c, dfdx) in self._central_differences(func, nseeds,
+                                                   lambda c: S[:, c]):
+            if B is None:
+                B = np.empty((np.size(dfdx), nseeds))
+            B[:, c] = dfdx
+
+        # Expected compressed differences.
+        Bexp = np.zeros_like(B)
+        np.add.at(Bexp, (rows, colors[cols]), vals)
+        if symmetric:
+            off = rows != cols
+            np.add.at(Bexp, (cols[off], colors[rows[off]]), vals[off])
+            approx = coloring.recover_hessian(B, rows, cols, colors)
+            pattern = np.concatenate((keys, cols * n + rows))
+        else:
+            approx = coloring.recover_jacobian(B, rows, cols, colors)
+            pattern = keys
+
+        self._compare(errs, vals, approx, fmt,
+                      lambda t: labels(rows[t], cols[t]),
+                      lambda t: (int(rows[t]), int(cols[t])))
+
+        # Locate nonzero elements outside the structure.
+        dev = np.abs(B - Bexp) / np.maximum(1, np.abs(B))
+        suspects = np.where(np.in1d(colors, np.where(dev > self.tol)[1]))[0]
+        for (t, dfdx) in self._central_differences(
+                func, suspects.size, lambda t: self._unit(suspects[t])):
+            j = suspects[t]
+            nz = np.where(np.abs(dfdx) > self.tol)[0]
+            nz = nz[~np.in1d(nz * n + j, pattern)]
+            if symmetric:
+                (zrows, zcols) = (np.maximum(nz, j), np.minimum(nz, j))
+            else:
+                (zrows, zcols) = (nz, j * np.ones(nz.size, dtype=np.int))
+            self._compare(zero_errs, np.zeros(nz.size), dfdx[nz], fmt,
+                          lambda t: labels(zrows[t], zcols[t]),
+                          lambda t: (int(zrows[t]), int(zcols[t])))
+
+        return (errs, zero_errs)
+
+    def check_sparse_con_jacobian(self):
+        """Check constraints Jacobian using its sparsity structure.
+
+        The Jacobian returned by the model in coordinate format is checked
+        with one centered difference of the constraints per color of a
+        column coloring of its structure, and the structural nonzeros are
+        recovered from these compressed differences. Every compressed
+        difference must also match the corresponding combination of the
+        structural nonzeros. Where one does not, the columns of that color
+        are differenced one at a time and their elements outside the
+        structure are compared to zero. Other formats are checked entry by
+        entry.
+
+        Return a pair of dictionaries of the structural nonzeros and the
+        structural zeros for which the scaled error with the
+        finite-difference approximation exceeds ``self.tol``.
+        """
+        model = self.model
+        if model.m == 0:
+            return ({}, {})   # Problem is unconstrained.
+
+        Jx = model.jac(self.x)
+        if not isinstance(Jx, tuple):
+            self.log.warn("Jacobian is not in coordinate format")
+            return (self.check_con_jacobian(), {})
+
+        self.log.debug('Constraints Jacobian')
+        return self._check_sparse(Jx, model.cons, False, self.d1fmt,
+                                  lambda i, j: (i + 1, j))
+
+    def check_sparse_obj_hessian(self):
+        """Check objective Hessian using its sparsity structure.
+
+        The Hessian returned by the model in coordinate format is checked
+        with one centered difference of the gradient per color of a star
+        coloring of its structure. See :meth:`check_sparse_con_jacobian`.
+        Other formats are checked entry by entry.
+
+        Return a pair of dictionaries of the structural nonzeros and the
+        structural zeros of the lower triangle for which the scaled error
+        with the finite-difference approximation exceeds ``self.tol``.
+        """
+        model = self.model
+        Hx = model.hess(self.x)
+        if not isinstance(Hx, tuple):
+            self.log.warn("Hessian is not in coordinate format")
+            return (self.check_obj_hessian(), {})
+
+        self.log.debug('Objective Hessian')
+        return self._check_sparse(Hx, model.grad, True, self.d2fmt,
+                                  lambda i, j: (0, i, j))
+
+    def check_sparse_con_hessians(self):
+        """Check constraints Hessians using their sparsity structure.
+
+        Return a pair of dictionaries of dictionaries, the k-th of which
+        contains the k-th Hessian structural nonzeros, resp. zeros, for
+        which the scaled error with the finite-difference approximation
+        exceeds ``self.tol``. See :meth:`check_sparse_obj_hessian`.
+        """
+        m = self.model.m
+        errs = {}
+        zero_errs = {}
+
+        self.log.debug('Constraints Hessians')
+
+        y = np.zeros(m)
+        for k in xrange(m):
+            y[k] = -1
+            Hk = self.model.hess(self.x, y, obj_weight=0)
+            y[k] = 0
+            if not isinstance(Hk, tuple):
+                self.log.warn("Hessian is not in coordinate format")
+                return (self.check_con_hessians(), {})
+
+            igrad = functools.partial(self.model.igrad, k)
+            (errs[k], zero_errs[k]) = self._check_sparse(
+                Hk, igrad, True, self.d2fmt, lambda i, j: (k + 1, i, j))
+
+        return (errs, zero_errs)
+
+    def _matvec(self, A, v):
+        """Return the product of a matrix or operator with v."""
+        if isinstance(A, np.ndarray):
+            return np.dot(A, v)
+        return A * v
+
+    def random_check(self, ndir=20, **kwargs):
+        u"""Check derivatives along random directions.
+
+        For each of `ndir` directions d drawn from the standard normal
+        distribution, the products of the derivatives with d are compared to
+        centered finite differences along d. If E is the error in a
+        derivative, E d is a Gaussian vector and the sum S of ‖E d‖² over
+        the k = `ndir` directions satisfies
+
+            ‖E‖²_F ≤ S / (k - 2 √(k log(1/δ)))
+
+        with probability at least 1 - δ (B. Laurent and P. Massart,
+        *Adaptive estimation of a quadratic functional by model selection*,
+        Ann. Statist. **28** (5), pp. 1302-1338, 2000). The bound on ‖E‖_F is
+        scaled by max(1, ‖A‖_F), where ‖A‖²_F is estimated by the mean of
+        the squared norms of the finite differences, and compared to
+        ``self.tol``. The constraints Hessians are checked through the
+        Hessian of a random combination of the constraints.
+
+        The cost is 2k evaluations of the objective, the gradient, the
+        constraints and the constraints Jacobian, instead of 2n for the
+        entry-by-entry checks.
+
+        :parameters:
+            :ndir:        number of random directions (default: 20)
+
+        :keywords:
+            :grad:        Check objective gradient  (default `True`)
+            :hess:        Check objective Hessian   (default `True`)
+            :jac:         Check constraints Jacobian (default `True` if m > 0)
+            :chess:       Check constraints Hessian (default `True` if m > 0)
+            :confidence:  probability 1 - δ with which the bounds hold
+                          (default: 0.95)
+
+        The scaled bounds are stored in ``self.random_bounds``. Return a
+        dictionary of the scaled bounds that exceed ``self.tol``, with keys
+        among 'grad', 'hess', 'jac' and 'chess'.
+        """
+        model = self.model
+        n = model.n
+        m = model.m
+        delta = 1 - kwargs.get('confidence', 0.95)
+        denom = ndir - 2 * sqrt(ndir * log(1 / delta))
+        if denom <= 0:
+            raise ValueError('More than %d directions are needed'
+                             % int(4 * log(1 / delta)))
+
+        D = np.random.standard_normal((n, ndir))
+        checks = []
+        if kwargs.get('grad', True):
+            g = model.grad(self.x)
+            checks.append(('grad', lambda d: np.dot(g, d), model.obj,
+                           getattr(model, 'obj_block', None)))
+        if kwargs.get('hess', True):
+            H = model.hess(self.x)
+            if not isinstance(H, np.ndarray):
+                H = model.hop(self.x)
+            checks.append(('hess', lambda d: self._matvec(H, d),
+                           model.grad, None))
+        dense_jac = None
+        if kwargs.get('jac', True) and m > 0:
+            J = model.jac(self.x)
+            dense_jac = isinstance(J, np.ndarray)
+            if not dense_jac:
+                J = model.jop(self.x)
+            checks.append(('jac', lambda d: self._matvec(J, d),
+                           model.cons, None))
+        if kwargs.get('chess', True) and m > 0:
+            y = np.random.standard_normal(m)
+            Hy = model.hess(self.x, y, obj_weight=0)
+            if not isinstance(Hy, np.ndarray):
+                Hy = model.hop(self.x, y, obj_weight=0)
+            # Differentiate -J(x)'y with products unless J is an array, so
+            # that the Jacobian is not evaluated at each perturbed point.
+            if dense_jac is None:
+                dense_jac = isinstance(model.jac(self.x), np.ndarray)
+            if dense_jac:
+                jtprod = lambda x: -np.dot(y, model.jac(x))
+            else:
+                jtprod = lambda x: -model.jtprod(x, y)
+            checks.append(('chess', lambda d: self._matvec(Hy, d),
+                           jtprod, None))
+
+        errs = {}
+        self.random_bounds = {}
+        self.log.debug('Derivatives along %d random directions', ndir)
+        for (name, prod, func, block) in checks:
+            sq_err = sq_fd = 0.0
+            for (j, fd) in self._central_differences(func, ndir,
+                                                     lambda j: D[:, j],
+                                                     block):
+                sq_err += norm(np.atleast_1d(prod(D[:, j]) - fd))**2
+                sq_fd += norm(np.atleast_1d(fd))**2
+            bound = sqrt(sq_err / denom) / max(1, sqrt(sq_fd / ndir))
+            self.random_bounds[name] = bound
+
+            line = '%-5s  error bound: %7.1e' % (name, bound)
+            if bound > self.tol:
+                self.log.warn(line)
+                errs[name] = bound
+            else:
+                self.log.debug(line)
+
+        return errs
@@ -0,0 +1,658 @@
+# -*- coding: utf-8 -*-
+"""Algorithmic differentiation of functions written with NumPy arrays.
+
+A function written with NumPy array operations is recorded on a
+:class:`Tape` by evaluating it on a :class:`Variable`. Each array operation,
+e.g., an element-wise operation, an indexing operation, a sum or a dot
+product, is a single tape entry, so that the number of entries does not
+grow with the size of the arrays.
+
+The tape may then be replayed at other points to evaluate the function, its
+products with the Jacobian and with the transposed Jacobian, and products
+of the Hessian of a weighted combination of its outputs with a vector by a
+forward sweep followed by a second-order reverse sweep (forward-over-reverse
+mode). As with ADOL-C tapes, the sequence of operations performed by the
+function must not depend on the point at which it is recorded.
+
+The supported operations are
+
+* the arithmetic operators +, -, *, / and ** with broadcasting,
+* the NumPy ufuncs corresponding to those operators and the ufuncs listed
+  in :data:`UFUNCS`, e.g., `np.exp(x)`,
+* indexing and slicing, including with repeated indices,
+* the methods :meth:`Variable.sum`, :meth:`Variable.dot`,
+  :meth:`Variable.reshape` and :meth:`Variable.transpose`, and
+  `np.sum(x)`,
+* the functions :func:`dot`, :func:`concatenate` and :func:`hstack` of this
+  module, which also accept plain arrays.
+
+Arrays cannot be assembled by assigning variables to their elements. Use
+:func:`concatenate` or :func:`hstack` instead.
+"""
+
+import numpy as np
+
+__docformat__ = 'restructuredtext'
+
+
+def _unbroadcast(g, shape):
+    """Sum g over the axes along which an array of `shape` was broadcast."""
+    g = np.asarray(g)
+    if g.shape == shape:
+        return g
+    while g.ndim > len(shape):
+        g = g.sum(axis=0)
+    for (axis, size) in enumerate(shape):
+        if size == 1 and g.shape[axis] != 1:
+            g = g.sum(axis=axis, keepdims=True)
+    return g
+
+
+class _Op(object):
+    """Operation recorded on a tape.
+
+    :meth:`forward` evaluates the operation, :meth:`tangent` its derivative
+    in the direction of the tangents of its arguments and :meth:`adjoint`
+    the products of the transposed derivatives with respect to each
+    argument with the adjoint of the result. If the operation is nonlinear,
+    :meth:`extra` returns the derivatives of those products in the
+    direction of the tangents of the arguments.
+    """
+
+    linear = True
+
+    def forward(self, *a):
+        raise NotImplementedError('This method must be subclassed.')
+
+    def tangent(self, a, da, y):
+        return self.forward(*da)
+
+    def adjoint(self, a, y, g):
+        raise NotImplementedError('This method must be subclassed.')
+
+    def extra(self, a, da, y, g):
+        return None
+
+
+class _Add(_Op):
+
+    def forward(self, a, b):
+        return a + b
+
+    def adjoint(self, a, y, g):
+        return (_unbroadcast(g, np.shape(a[0])),
+                _unbroadcast(g, np.shape(a[1])))
+
+
+class _Sub(_Op):
+
+    def forward(self, a, b):
+        return a - b
+
+    def adjoint(self, a, y, g):
+        return (_unbroadcast(g, np.shape(a[0])),
+                _unbroadcast(-g, np.shape(a[1])))
+
+
+class _Neg(_Op):
+
+    def forward(self, a):
+        return -a
+
+    def adjoint(self, a, y, g):
+        return (-g,)
+
+
+class _Mul(_Op):
+
+    linear = False
+
+    def forward(self, a, b):
+        return a * b
+
+    def tangent(self, a, da, y):
+        return da[0] * a[1] + a[0] * da[1]
+
+    def adjoint(self, a, y, g):
+        return (_unbroadcast(g * a[1], np.shape(a[0])),
+                _unbroadcast(g * a[0], np.shape(a[1])))
+
+    def extra(self, a, da, y, g):
+        return (_unbroadcast(g * da[1], np.shape(a[0])),
+                _unbroadcast(g * da[0], np.shape(a[1])))
+
+
+class _Div(_Op):
+
+    linear = False
+
+    def forward(self, a, b):
+        return a / b
+
+    def tangent(self, a, da, y):
+        return (da[0] - y * da[1]) / a[1]
+
+    def adjoint(self, a, y, g):
+        return (_unbroadcast(g / a[1], np.shape(a[0])),
+                _unbroadcast(-g * y / a[1], np.shape(a[1])))
+
+    def extra(self, a, da, y, g):
+        b2 = a[1]**2
+        return (_unbroadcast(-g * da[1] / b2, np.shape(a[0])),
+                _unbroadcast(-g * (da[0] - 2 * y * da[1]) / b2,
+                             np.shape(a[1])))
+
+
+# First and second derivatives of element-wise functions in terms of their
+# argument a and value y.
+UFUNCS = {
+    'exp': (lambda a, y: y, lambda a, y: y),
+    'expm1': (lambda a, y: y + 1, lambda a, y: y + 1),
+    'log': (lambda a, y: 1 / a, lambda a, y: -1 / a**2),
+    'log1p': (lambda a, y: 1 / (1 + a), lambda a, y: -1 / (1 + a)**2),
+    'sqrt': (lambda a, y: 0.5 / y, lambda a, y: -0.25 / (y * a)),
+    'square': (lambda a, y: 2 * a, lambda a, y: 2 * np.ones_like(a)),
+    'sin': (lambda a, y: np.cos(a), lambda a, y: -y),
+    'cos': (lambda a, y: -np.sin(a), lambda a, y: -y),
+    'tan': (lambda a, y: 1 + y**2, lambda a, y: 2 * y * (1 + y**2)),
+    'arctan': (lambda a, y: 1 / (1 + a**2),
+               lambda a, y: -2 * a / (1 + a**2)**2),
+    'sinh': (lambda a, y: np.cosh(a), lambda a, y: y),
+    'cosh': (lambda a, y: np.sinh(a), lambda a, y: y),
+    'tanh': (lambda a, y: 1 - y**2, lambda a, y: -2 * y * (1 - y**2)),
+    'absolute': (lambda a, y: np.sign(a), lambda a, y: np.zeros_like(a)),
+}
+
+
+class _Unary(_Op):
+
+    linear = False
+
+    def __init__(self, name):
+        self.func = getattr(np, name)
+        (self.d1, self.d2) = UFUNCS[name]
+
+    def forward(self, a):
+        return self.func(a)
+
+    def tangent(self, a, da, y):
+        return self.d1(a[0], y) * da[0]
+
+    def adjoint(self, a, y, g):
+        return (g * self.d1(a[0], y),)
+
+    def extra(self, a, da, y, g):
+        return (g * self.d2(a[0], y) * da[0],)
+
+
+class _Power(_Unary):
+    """Power with a constant exponent."""
+
+    def __init__(self, p):
+        self.p = p
+        self.d1 = lambda a, y: p * a**(p - 1)
+        if p == 1:
+            self.d2 = lambda a, y: np.zeros_like(a)
+        else:
+            self.d2 = lambda a, y: p * (p - 1) * a**(p - 2)
+
+    def forward(self, a):
+        return a**self.p
+
+
+class _RPower(_Unary):
+    """Power of a constant base."""
+
+    def __init__(self, c):
+        self.c = c
+        logc = np.log(c)
+        self.d1 = lambda a, y: y * logc
+        self.d2 = lambda a, y: y * logc**2
+
+    def forward(self, a):
+        return self.c**a
+
+
+def _is_basic(key):
+    """Return whether key only selects each element once."""
+    keys = key if isinstance(key, tuple) else (key,)
+    return all(k is None or k is Ellipsis or
+               isinstance(k, (int, long, np.integer, slice)) for k in keys)
+
+
+class _GetItem(_Op):
+
+    def __init__(self, key):
+        self.key = key
+        self.basic = _is_basic(key)
+
+    def forward(self, a):
+        return a[self.key]
+
+    def adjoint(self, a, y, g):
+        ga = np.zeros(np.shape(a[0]))
+        if self.basic:
+            ga[self.key] = g
+        else:
+            # Accumulate over repeated indices.
+            np.add.at(ga, self.key, g)
+        return (ga,)
+
+
+class _Sum(_Op):
+
+    def __init__(self, axis):
+        self.axis = axis
+
+    def forward(self, a):
+        return np.sum(a, axis=self.axis)
+
+    def adjoint(self, a, y, g):
+        if self.axis is not None:
+            g = np.expand_dims(g, self.axis)
+        return (g * np.ones(np.shape(a[0])),)
+
+
+def _dot_adjoint(a, b, g):
+    """Return the adjoints of a and b in y = dot(a, b) for the adjoint g."""
+    if a.ndim == 1 and b.ndim == 1:
+        return (g * b, g * a)
+    if a.ndim == 1:
+        return (np.dot(b, g), np.outer(a, g))
+    if b.ndim == 1:
+        return (np.outer(g, b), np.dot(g, a))
+    return (np.dot(g, b.T), np.dot(a.T, g))
+
+
+class _Dot(_Op):
+    """Dot product of one- or two-dimensional arrays."""
+
+    linear = False
+
+    def forward(self, a, b):
+        return np.dot(a, b)
+
+    def tangent(self, a, da, y):
+        return np.dot(da[0], a[1]) + np.dot(a[0], da[1])
+
+    def adjoint(self, a, y, g):
+        return _dot_adjoint(a[0], a[1], g)
+
+    def extra(self, a, da, y, g):
+        return (_dot_adjoint(a[0], da[1], g)[0],
+                _dot_adjoint(da[0], a[1], g)[1])
+
+
+class _Concatenate(_Op):
+
+    def __init__(self, axis, splits):
+        self.axis = axis
+        self.splits = splits
+
+    def forward(self, *a):
+        return np.concatenate(a, axis=self.axis)
+
+    def adjoint(self, a, y, g):
+        return np.split(g, self.splits, axis=self.axis)
+
+
+class _Reshape(_Op):
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def forward(self, a):
+        return np.reshape(a, self.shape)
+
+    def adjoint(self, a, y, g):
+        return (np.reshape(g, np.shape(a[0])),)
+
+
+class _Transpose(_Op):
+
+    def forward(self, a):
+        return np.transpose(a)
+
+    def adjoint(self, a, y, g):
+        return (np.transpose(g),)
+
+
+_BINARY = {'add': _Add, 'subtract': _Sub, 'multiply': _Mul,
+           'divide': _Div, 'true_divide': _Div}
+
+
+class Variable(object):
+    """Array recorded on a :class:`Tape`.
+
+    Operations on variables are recorded on their tape. The value of a
+    variable is that at the point where the tape was recorded or last
+    replayed. Comparisons use values and are not recorded.
+    """
+
+    def __init__(self, tape, index):
+        self.tape = tape
+        self.index = index
+
+    @property
+    def value(self):
+        """Value of the variable."""
+        return self.tape.values[self.index]
+
+    @property
+    def shape(self):
+        return np.shape(self.value)
+
+    @property
+    def ndim(self):
+        return np.ndim(self.value)
+
+    @property
+    def size(self):
+        return np.size(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __repr__(self):
+        return 'Variable(%r)' % (self.value,)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        name = ufunc.__name__
+        if name in _BINARY:
+            return _apply(_BINARY[name](), *inputs)
+        if name == 'power':
+            return _power(*inputs)
+        if name == 'negative':
+            return _apply(_Neg(), *inputs)
+        if name in UFUNCS:
+            return _apply(_Unary(name), *inputs)
+        return NotImplemented
+
+    def __add__(self, b):
+        return _apply(_Add(), self, b)
+
+    def __radd__(self, b):
+        return _apply(_Add(), b, self)
+
+    def __sub__(self, b):
+        return _apply(_Sub(), self, b)
+
+    def __rsub__(self, b):
+        return _apply(_Sub(), b, self)
+
+    def __mul__(self, b):
+        return _apply(_Mul(), self, b)
+
+    def __rmul__(self, b):
+        return _apply(_Mul(), b, self)
+
+    def __div__(self, b):
+        return _apply(_Div(), self, b)
+
+    def __rdiv__(self, b):
+        return _apply(_Div(), b, self)
+
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+
+    def __neg__(self):
+        return _apply(_Neg(), self)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return _apply(_Unary('absolute'), self)
+
+    def __pow__(self, p):
+        return _power(self, p)
+
+    def __rpow__(self, c):
+        return _power(c, self)
+
+    def __getitem__(self, key):
+        return _apply(_GetItem(key), self)
+
+    def __lt__(self, b):
+        return self.value < _value(b)
+
+    def __le__(self, b):
+        return self.value <= _value(b)
+
+    def __gt__(self, b):
+        return self.value > _value(b)
+
+    def __ge__(self, b):
+        return self.value >= _value(b)
+
+    def sum(self, axis=None, **kwargs):
+        """Sum of the elements over the given axis."""
+        return _apply(_Sum(axis), self)
+
+    def dot(self, b):
+        """Dot product with b."""
+        return dot(self, b)
+
+    def reshape(self, *shape):
+        """Variable with the same elements and a new shape."""
+        if len(shape) == 1:
+            shape = shape[0]
+        return _apply(_Reshape(shape), self)
+
+    def transpose(self):
+        """Variable with reversed axes."""
+        return _apply(_Transpose(), self)
+
+    @property
+    def T(self):
+        return self.transpose()
+
+
+def _value(a):
+    return a.value if isinstance(a, Variable) else a
+
+
+def _apply(op, *operands):
+    """Record an operation on the tape of its variable operands."""
+    tape = None
+    for a in operands:
+        if isinstance(a, Variable):
+            if tape is not None and a.tape is not tape:
+                raise ValueError('Variables are recorded on different tapes')
+            tape = a.tape
+    if tape is None:
+        return op.forward(*operands)
+    return tape._record(op, [tape._node(a) for a in operands])
+
+
+def _power(a, p):
+    if isinstance(p, Variable):
+        if isinstance(a, Variable):
+            return np.exp(p * np.log(a))
+        return _apply(_RPower(a), p)
+    return _apply(_Power(p), a)
+
+
+def dot(a, b):
+    """Dot product of one- or two-dimensional arrays or variables."""
+    if np.ndim(_value(a)) == 0 or np.ndim(_value(b)) == 0:
+        return a * b
+    return _apply(_Dot(), a, b)
+
+
+def concatenate(arrays, axis=0):
+    """Join a sequence of arrays or variables along an existing axis."""
+    sizes = [np.shape(_value(a))[axis] for a in arrays]
+    return _apply(_Concatenate(axis, np.cumsum(sizes)[:-1]), *arrays)
+
+
+def hstack(arrays):
+    """Join a sequence of scalars and one-dimensional arrays or variables."""
+    return concatenate([_apply(_Reshape((1,)), a)
+                        if np.ndim(_value(a)) == 0 else a for a in arrays])
+
+
+class Tape(object):
+    """Record of the array operations performed by a function.
+
+    Use :func:`trace` to record a tape. A tape has a single input array x
+    and a sequence of outputs y[0], y[1], ... of any shape.
+    """
+
+    def __init__(self):
+        self.ops = []      # (operation, argument nodes), None for leaves.
+        self.values = []   # Value of each node.
+        self.active = []   # Whether each node depends on the input.
+        self.input = None
+        self.outputs = []
+        self._x = None     # Point at which values were computed.
+
+    def __len__(self):
+        return len(self.ops)
+
+    def _record(self, op, args):
+        value = op.forward(*[self.values[j] for j in args])
+        self.ops.append((op, args))
+        self.values.append(value)
+        self.active.append(any(self.active[j] for j in args))
+        return Variable(self, len(self.ops) - 1)
+
+    def _leaf(self, value, active):
+        self.ops.append((None, ()))
+        self.values.append(value)
+        self.active.append(active)
+        return Variable(self, len(self.ops) - 1)
+
+    def _node(self, a):
+        """Return the node of a variable or of a new constant."""
+        if isinstance(a, Variable):
+            return a.index
+        return self._leaf(np.asarray(a, dtype=np.float), False).index
+
+    def evaluate(self, x):
+        """Replay the tape at x if needed and return its outputs."""
+        if self._x is None or not np.array_equal(self._x, x):
+            values = self.values
+            values[self.input] = np.array(x, dtype=np.float)
+            for (i, (op, args)) in enumerate(self.ops):
+                if op is not None:
+                    values[i] = op.forward(*[values[j] for j in args])
+            self._x = np.array(x, dtype=np.float)
+        return [np.array(self.values[k], dtype=np.float)
+                for k in self.outputs]
+
+    def _tangents(self, v):
+        """Forward sweep propagating the input tangent v."""
+        values = self.values
+        active = self.active
+        dots = [None] * len(self.ops)
+        dots[self.input] = np.asarray(v, dtype=np.float)
+        for (i, (op, args)) in enumerate(self.ops):
+            if op is None or not active[i]:
+                continue
+            a = [values[j] for j in args]
+            da = [dots[j] if active[j] else np.zeros_like(values[j])
+                  for j in args]
+            dots[i] = op.tangent(a, da, values[i])
+        return dots
+
+    def _seed(self, weights):
+        """Return node adjoints seeded with the weights of the outputs."""
+        bars = [None] * len(self.ops)
+        for (k, w) in zip(self.outputs, weights):
+            if w is None or not self.active[k]:
+                continue
+            seed = np.zeros(np.shape(self.values[k])) + w
+            bars[k] = seed if bars[k] is None else bars[k] + seed
+        return bars
+
+    def _input_adjoint(self, bars):
+        g = bars[self.input]
+        if g is None:
+            return np.zeros(np.shape(self.values[self.input]))
+        return np.array(g, dtype=np.float)
+
+    def jvp(self, x, v):
+        """Return the products of the output Jacobians at x with v."""
+        self.evaluate(x)
+        dots = self._tangents(v)
+        return [np.array(dots[k], dtype=np.float) if self.active[k]
+                else np.zeros(np.shape(self.values[k]))
+                for k in self.outputs]
+
+    def vjp(self, x, weights):
+        """Return the gradient at x of the weighted sum of the outputs.
+
+        :parameters:
+            :x:        point at which the tape is replayed
+            :weights:  sequence of weights of the same shape as each output,
+                       or None for outputs that do not contribute
+        """
+        self.evaluate(x)
+        values = self.values
+        active = self.active
+        bars = self._seed(weights)
+        for i in xrange(len(self.ops) - 1, -1, -1):
+            (op, args) = self.ops[i]
+            g = bars[i]
+            if op is None or g is None:
+                continue
+            ga = op.adjoint([values[j] for j in args], values[i], g)
+            for (j, gj) in zip(args, ga):
+                if active[j]:
+                    bars[j] = gj if bars[j] is None else bars[j] + gj
+        return self._input_adjoint(bars)
+
+    def hvp(self, x, weights, v):
+        """Return the Hessian at x of the weighted sum of the outputs times v.
+
+        A forward sweep propagates v and a second-order reverse sweep
+        propagates the weights and their derivatives in the direction v.
+        See :meth:`vjp` for the meaning of `weights`.
+        """
+        self.evaluate(x)
+        values = self.values
+        active = self.active
+        dots = self._tangents(v)
+        bars = self._seed(weights)
+        bars2 = [None] * len(self.ops)
+        for i in xrange(len(self.ops) - 1, -1, -1):
+            (op, args) = self.ops[i]
+            g = bars[i]
+            if op is None or g is None:
+                continue
+            a = [values[j] for j in args]
+            contribs = [op.adjoint(a, values[i], g)]
+            if bars2[i] is not None:
+                contribs.append(op.adjoint(a, values[i], bars2[i]))
+            if not op.linear:
+                da = [dots[j] if active[j] else np.zeros_like(values[j])
+                      for j in args]
+                contribs.append(op.extra(a, da, values[i], g))
+            for (j, gj) in zip(args, contribs[0]):
+                if active[j]:
+                    bars[j] = gj if bars[j] is None else bars[j] + gj
+            for ga in contribs[1:]:
+                for (j, gj) in zip(args, ga):
+                    if active[j]:
+                        bars2[j] = gj if bars2[j] is None else bars2[j] + gj
+        return self._input_adjoint(bars2)
+
+
+def trace(func, x):
+    """Record the operations performed by func at x on a new :class:`Tape`.
+
+    `func` takes a one-dimensional array and returns an array or a tuple of
+    arrays, the outputs of the tape.
+    """
+    tape = Tape()
+    xvar = tape._leaf(np.array(x, dtype=np.float), True)
+    tape.input = xvar.index
+    y = func(xvar)
+    if not isinstance(y, tuple):
+        y = (y,)
+    tape.outputs = [tape._node(yk) for yk in y]
+    tape._x = np.array(x, dtype=np.float)
+    return tape
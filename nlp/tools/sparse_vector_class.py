@@ -4,106 +4,146 @@
 # D. Orban, 2004
 #
 import numpy
-import types
 import operator
-import math
+
+try:
+    from scipy import sparse as sp
+except ImportError:
+    sp = None
 
 """
-A dictionary-based sparse vector class which supports elementwise mathematical
+An array-based sparse vector class which supports elementwise mathematical
 operations and operations with other sparse vectors and numpy arrays.
 """
 
 
-class SparseVector:
-    """A dictionary-based sparse vector class.
+def _coalesce(ind, val):
+    """Sort indices in increasing order and sum values of duplicate indices."""
+    if len(ind) > 1 and not numpy.all(ind[1:] > ind[:-1]):
+        uind, inv = numpy.unique(ind, return_inverse=True)
+        val = numpy.bincount(inv, weights=val, minlength=len(uind))
+        ind = uind
+    return ind, val
+
+
+class SparseVector(object):
+    """An array-based sparse vector class.
 
+    Nonzero elements are stored in two arrays: `ind` holds the (0-based)
+    indices in increasing order and `val` holds the corresponding values.
     To initialize a sparse vector in R^1000, use, e.g.,
+        v = SparseVector(1000, [1, 10, 100], [0.1, 0.01, 0.001])
+    or, equivalently,
         v = SparseVector(1000, { 1 : 0.1, 10: 0.01, 100 : 0.001 })
     v contains only 3 nonzero elements, at (0-based) indices
     1, 10 and 100 with respective values 0.1, 0.01 and 0.001.
     To initialize an empty sparse vector, use
-        v = SparseVector(1000, {})
+        v = SparseVector(1000)
+    Duplicate indices are summed.
     """
 
-    def __init__(self, n, d0):
-        if not isinstance(n, types.IntType):
+    def __init__(self, n, ind=None, val=None):
+        if not isinstance(n, (int, long, numpy.integer)):
             raise TypeError("Vector size must be integer")
         if n <= 0:
             raise ValueError("Vector size must be positive")
-        if not isinstance(d0, types.DictType):
-            raise TypeError("Vector contents must be a dictionary")
 
-        self.n = n
-        self.values = {}
-        for k in d0.keys():
-            self.values[k] = d0[k]
+        self.n = int(n)
+        if isinstance(ind, dict):
+            if val is not None:
+                raise TypeError("Values must be given in the dictionary")
+            val = ind.values()
+            ind = ind.keys()
+        elif ind is None:
+            ind = []
+            val = []
+        elif val is None:
+            raise TypeError("Vector values must be specified")
+
+        ind = numpy.array(ind, dtype=numpy.int).ravel()
+        val = numpy.array(val, dtype=numpy.double).ravel()
+        if ind.shape != val.shape:
+            raise ValueError("Indices and values must have the same length")
+        if len(ind) > 0 and (ind.min() < 0 or ind.max() >= self.n):
+            raise IndexError("Index out of range")
+        self.ind, self.val = _coalesce(ind, val)
+
+    def _new(self, n, ind, val):
+        """Return a new sparse vector without checking its contents."""
+        rv = SparseVector.__new__(SparseVector)
+        rv.n = n
+        rv.ind = ind
+        rv.val = val
+        return rv
+
+    def _gather(self, ind):
+        """Return the values of the vector at the sorted indices `ind`."""
+        rv = numpy.zeros(len(ind))
+        if len(self.ind):
+            pos = numpy.minimum(numpy.searchsorted(self.ind, ind),
+                                len(self.ind) - 1)
+            found = self.ind[pos] == ind
+            rv[found] = self.val[pos[found]]
+        return rv
 
     # Insert a new item in sparse vector
     # If index is larger than vector size, adjust vector size
     def __setitem__(self, index, item):
-        if not isinstance(index, types.IntType):
+        if not isinstance(index, (int, long, numpy.integer)):
             raise KeyError("Index must be integer")
-        if index > self.n:
-            self.n = index
+        if index >= self.n:
+            self.n = index + 1
         if not operator.isNumberType(item):
             raise TypeError("Value must be numeric")
+        pos = numpy.searchsorted(self.ind, index)
+        present = pos < len(self.ind) and self.ind[pos] == index
         if float(item) != 0.0:
-            dict.__setitem__(self.values, index, item)
+            if present:
+                self.val[pos] = item
+            else:
+                self.ind = numpy.insert(self.ind, pos, index)
+                self.val = numpy.insert(self.val, pos, item)
+        elif present:
+            self.ind = numpy.delete(self.ind, pos)
+            self.val = numpy.delete(self.val, pos)
 
     # Fetch item from sparse vector
     def __getitem__(self, index):
-        if not isinstance(index, types.IntType):
+        if not isinstance(index, (int, long, numpy.integer)):
             raise KeyError("Index must be integer")
         if index >= self.n:
             raise IndexError("Index out of range")
-        if index in self.keys():
-            return dict.__getitem__(self.values, index)
-        else:
-            return 0
+        pos = numpy.searchsorted(self.ind, index)
+        if pos < len(self.ind) and self.ind[pos] == index:
+            return self.val[pos]
+        return 0
 
     # Obtain segment of sparse vector --- treat vector as circular
     def __getslice__(self, i, j):
-        if not isinstance(i, types.IntType) or \
-           not isinstance(j, types.IntType):
+        if not isinstance(i, (int, long)) or not isinstance(j, (int, long)):
             raise KeyError("Indices must be integer")
-        slice = {}
-        K = self.keys()
-        K.sort()
+        j = min(j, self.n)
         if i <= j:
-            size = j-i
-            for k in K:
-                if i <= k and k < j:
-                    slice[k] = self.values[k]
-        else:
-            size = self.n
-            for k in K:
-                if j > k or k >= i:
-                    slice[k] = self.values[k]
-        return SparseVector(size, slice)
+            mask = (self.ind >= i) & (self.ind < j)
+            return SparseVector(max(j - i, 1), self.ind[mask] - i,
+                                self.val[mask])
+        mask = (self.ind < j) | (self.ind >= i)
+        return self._new(self.n, self.ind[mask], self.val[mask])
 
     def __add__(self, other):
         # Order of testing is important!
         if isinstance(other, numpy.ndarray):
             # If adding sparse and dense, result is dense
-            # rv = SparseVector(max(self.n, other.shape[0]), {})
             rv = numpy.zeros(max(self.n, other.shape[0]), 'd')
-            for k in range(other.shape[0]):
-                rv[k] = other[k]
-            for k in self.values.keys():
-                rv[k] += self[k]
+            rv[:other.shape[0]] = other
+            rv[self.ind] += self.val
             return rv
         elif isSparseVector(other):
-            rv = SparseVector(max(self.n, other.n), {})
-            for k in self.values.keys():
-                rv[k] += self[k]
-            for k in other.values.keys():
-                rv[k] += other[k]
-            return rv
+            ind, val = _coalesce(numpy.concatenate((self.ind, other.ind)),
+                                 numpy.concatenate((self.val, other.val)))
+            return self._new(max(self.n, other.n), ind, val)
         elif operator.isNumberType(other):
-            rv = SparseVector(self.n, {})
-            for k in self.values.keys():
-                rv[k] = self[k] + other
-            return rv
+            return self._new(self.n, self.ind.copy(), self.val + other)
         else:
             raise TypeError("Cannot add with SparseVector")
 
@@ -114,21 +154,17 @@ class SparseVector:
     def __iadd__(self, other):
         # Order of testing is important!
         if isinstance(other, numpy.ndarray):
-            self.n = max(self.n, other.shape[0])
-            for k in range(other.shape[0]):
-                self[k] += other[k]
+            rv = self + other
+            self.n = len(rv)
+            self.ind = numpy.nonzero(rv)[0]
+            self.val = rv[self.ind]
             return self
         elif isSparseVector(other):
-            self.n = max(self.n, other.n)
-            inter = filter(self.values.has_key, other.values.keys())
-            other_only = filter(lambda x: not self.values.has_key,
-                                other.values.keys())
-            for k in inter + other_only:
-                self[k] += other[k]
+            rv = self + other
+            self.n, self.ind, self.val = rv.n, rv.ind, rv.val
             return self
         elif operator.isNumberType(other):
-            for k in self.values.keys():
-                self[k] += other
+            self.val += other
             return self
         else:
             raise TypeError("Cannot add to SparseVector")
@@ -141,62 +177,39 @@ class SparseVector:
 
         For dot product, see the helper function dot().
         """
-        if isinstance(other, numpy.ndarray):
-            self.n = max(self.n, other.shape[0])
-            for k in range(other.shape[0]):
-                self.values[k] *= other[k]
-            return self
-        elif isSparseVector(other):
-            self.n = max(self.n, other.n)
-            inter = filter(self.values.has_key, other.values.keys())
-            other_only = filter(lambda x: not self.values.has_key,
-                                other.values.keys())
-            for k in inter + other_only:
-                self.values[k] *= other.values[k]
+        if isinstance(other, numpy.ndarray) or isSparseVector(other):
+            rv = self * other
+            self.n, self.ind, self.val = rv.n, rv.ind, rv.val
             return self
         elif operator.isNumberType(other):
-            for k in self.values.keys():
-                self.values[k] *= other
+            self.val *= other
             return self
         else:
             raise TypeError("Cannot multiply with SparseVector")
 
     def __idiv__(self, other):
         """Element by element division."""
-        if isinstance(other, numpy.ndarray):
-            self.n = max(self.n, other.shape[0])
-            for k in range(other.shape[0]):
-                self[k] /= other[k]
-            return self
-        elif isSparseVector(other):
-            self.n = max(self.n, other.n)
-            inter = filter(self.values.has_key, other.values.keys())
-            other_only = filter(lambda x: not self.values.has_key,
-                                other.values.keys())
-            for k in inter + other_only:
-                self[k] /= other.values[k]
+        if isinstance(other, numpy.ndarray) or isSparseVector(other):
+            rv = self / other
+            self.n, self.ind, self.val = rv.n, rv.ind, rv.val
             return self
         elif operator.isNumberType(other):
-            for k in self.values.keys():
-                self[k] /= other
+            self.val /= other
             return self
         else:
             raise TypeError("Cannot multiply with SparseVector")
 
     def __neg__(self):
         """Element by element opposite."""
-        rv = SparseVector(self.n, {})
-        for k in self.values.keys():
-            rv[k] = -self[k]
-        return rv
+        return self._new(self.n, self.ind.copy(), -self.val)
 
     def __sub__(self, other):
         """Element by element substraction."""
         return SparseVector.__add__(self, -other)
 
     def __rsub__(self, other):
-        """The same as __sub__."""
-        return SparseVector.__sub__(self, other)
+        """Element by element substraction from `other`."""
+        return SparseVector.__add__(-self, other)
 
     def __mul__(self, other):
         """Element by element multiplication.
@@ -204,20 +217,14 @@ class SparseVector:
         For dot product, see the helper function dot().
         """
         if isinstance(other, numpy.ndarray):
-            rv = SparseVector(max(self.n, other.shape[0]), {})
-            for k in self.values.keys():
-                rv[k] = self[k] * other[k]
-            return rv
+            return self._new(max(self.n, other.shape[0]), self.ind.copy(),
+                             self.val * other[self.ind])
         elif isSparseVector(other):
-            rv = SparseVector(max(self.n, other.n), {})
-            for k in filter(self.values.has_key, other.values.keys()):
-                rv[k] = self[k] * other[k]
-            return rv
+            ind, ia, ib = _intersect(self, other)
+            return self._new(max(self.n, other.n), ind,
+                             self.val[ia] * other.val[ib])
         elif operator.isNumberType(other):
-            rv = SparseVector(self.n, {})
-            for k in self.values.keys():
-                rv[k] = self[k] * other
-            return rv
+            return self._new(self.n, self.ind.copy(), self.val * other)
         else:
             raise TypeError("Cannot multiply with SparseVector")
 
@@ -228,20 +235,14 @@ class SparseVector:
     def __div__(self, other):
         """Element by element division."""
         if isinstance(other, numpy.ndarray):
-            rv = SparseVector(max(self.n, other.shape[0]), {})
-            for k in self.values.keys():
-                rv[k] = self[k] / other[k]
-            return rv
+            return self._new(max(self.n, other.shape[0]), self.ind.copy(),
+                             self.val / other[self.ind])
         elif isSparseVector(other):
-            rv = SparseVector(max(self.n, other.n), {})
-            for k in filter(self.values.has_key, other.values.keys()):
-                rv[k] = self[k] / other[k]
-            return rv
+            ind, ia, ib = _intersect(self, other)
+            return self._new(max(self.n, other.n), ind,
+                             self.val[ia] / other.val[ib])
         elif operator.isNumberType(other):
-            rv = SparseVector(self.n, {})
-            for k in self.values.keys():
-                rv[k] = self[k] / other
-            return rv
+            return self._new(self.n, self.ind.copy(), self.val / other)
         else:
             raise TypeError("Cannot multiply with SparseVector")
 
@@ -249,6 +250,9 @@ class SparseVector:
         """The same as __div__."""
         return SparseVector.__div__(self, other)
 
+    __truediv__ = __div__
+    __itruediv__ = __idiv__
+
     def __pow__(self, other):
         """Raise each element of sparse vector to a power.
 
@@ -258,55 +262,50 @@ class SparseVector:
         if not isSparseVector(self):
             raise TypeError("Argument must be a SparseVector")
         if isSparseVector(other):
-            rv = SparseVector(max(self.n, other.n), {})
-            for k in self.values.keys():
-                rv[k] = self[k]**other[k]
-            return rv
-        if not isinstance(other, types.IntType) and \
-           not isinstance(other, types.LongType) and \
-           not isinstance(other, types.FloatType):
+            return self._new(max(self.n, other.n), self.ind.copy(),
+                             self.val ** other._gather(self.ind))
+        if not isinstance(other, (int, long, float)):
                 raise TypeError("Power must be numeric or a sparse vector")
-        rv = SparseVector(self.n, {})
-        for k in self.values.keys():
-            rv[k] = math.pow(self[k], other)
-        return rv
+        return self._new(self.n, self.ind.copy(),
+                         numpy.power(self.val, float(other)))
 
     def __rpow__(self, other):
         """Use each element of sparse vector as power of base."""
         if not isSparseVector(self):
             raise TypeError("Argument must be a SparseVector")
-        if not isinstance(other, types.IntType) and \
-           not isinstance(other, types.LongType) and \
-           not isinstance(other, types.FloatType):
+        if not isinstance(other, (int, long, float)):
                 raise TypeError("Power must be numeric")
-        rv = SparseVector(self.n, {})
-        for k in self.values.keys():
-            rv[k] = math.pow(other, self[k])
-        return rv
+        return self._new(self.n, self.ind.copy(),
+                         numpy.power(float(other), self.val))
+
+    def __len__(self):
+        return self.n
 
     def __repr__(self):
         s = 'SparseVector(%-d, {' % self.n
-        for k in self.values.keys():
+        for k, v in zip(self.ind, self.val):
             s += '%-d' % k
-            s += ' : %-g, ' % self.values[k]
+            s += ' : %-g, ' % v
         s += '})'
         return s
 
     def __str__(self):
         nnz = self.nnz()
         s = ' Sparse Vector of size %-d, %-d nonzeros\n' % (self.size(), nnz)
-        K = self.values.keys()
-        K.sort()
         s += ' Values:\n'
-        for k in K:
-            s += '  %-5d\t%-g\n' % (k, self.values[k])
+        for k, v in zip(self.ind, self.val):
+            s += '  %-5d\t%-g\n' % (k, v)
         return s
 
     ###########################################################################
 
     def keys(self):
-        """Return keys."""
-        return self.values.keys()
+        """Return the indices of the nonzero elements as a list."""
+        return self.ind.tolist()
+
+    def items(self):
+        """Return (index, value) pairs of the nonzero elements as a list."""
+        return zip(self.ind.tolist(), self.val.tolist())
 
     def size(self):
         """Return vector size."""
@@ -314,7 +313,11 @@ class SparseVector:
 
     def nnz(self):
         """Return number of nonzero elements."""
-        return len(self.values)
+        return len(self.ind)
+
+    def copy(self):
+        """Return a copy of the sparse vector."""
+        return self._new(self.n, self.ind.copy(), self.val.copy())
 
     def resize(self, m):
         """Adjust vector size.
@@ -323,39 +326,30 @@ class SparseVector:
         reset current size to m and drop each value whose index is beyond m.
         """
         if m < self.n:
-            # Drop all elements beyon m
-            for k in self.keys():
-                if k >= m:
-                    self.values.__delitem__(k)
-        else:
-            self.n = m
+            # Drop all elements beyond m
+            keep = self.ind < m
+            self.ind = self.ind[keep]
+            self.val = self.val[keep]
+        self.n = m
 
     def shrink(self):
         """Shrink vector size to largest index."""
-        self.n = max(self.values.keys())
+        self.n = int(self.ind[-1]) + 1
 
     def to_list(self):
         """Convert sparse vector to (dense) list."""
-        rv = []
-        for k in range(self.n):
-            if k in self.values.keys():
-                rv.append(self.values[k])
-            else:
-                rv.append(0.0)
-        return rv
+        return self.to_array().tolist()
 
     def to_array(self):
         """Convert sparse vector to (dense) numpy array."""
-        try:
-            import numpy
-        except:
-            raise ImportError("Unable to import module numpy")
-            return None
         rv = numpy.zeros(self.n, 'd')
-        for k in self.values.keys():
-            rv[k] = self.values[k]
+        rv[self.ind] = self.val
         return rv
 
+    def to_csr(self):
+        """Convert sparse vector to a SciPy sparse row of shape (1, n)."""
+        return csr_rows([self])
+
     def out(self):
         """Printable representation."""
         print self
@@ -366,12 +360,45 @@ class SparseVector:
 
 def isSparseVector(x):
     """Determine if the argument is a SparseVector object."""
-    return hasattr(x, '__class__') and x.__class__ is SparseVector
+    return isinstance(x, SparseVector)
+
+
+def _intersect(a, b):
+    """Return common indices of a and b and their positions in a and b."""
+    ia = numpy.nonzero(numpy.in1d(a.ind, b.ind, assume_unique=True))[0]
+    ib = numpy.nonzero(numpy.in1d(b.ind, a.ind, assume_unique=True))[0]
+    return a.ind[ia], ia, ib
+
+
+def csr_rows(vectors, n=None):
+    """Stack sparse vectors as the rows of a SciPy CSR matrix.
+
+    :parameters:
+        :vectors: sequence of sparse vectors
+
+    :keywords:
+        :n: number of columns (default: largest size of the vectors)
+    """
+    if sp is None:
+        raise ImportError("Unable to import module scipy.sparse")
+    vectors = list(vectors)
+    if n is None:
+        n = max([v.n for v in vectors]) if vectors else 0
+    nnz = [v.nnz() for v in vectors]
+    indptr = numpy.zeros(len(vectors) + 1, dtype=numpy.int)
+    numpy.cumsum(nnz, out=indptr[1:])
+    if vectors:
+        indices = numpy.concatenate([v.ind for v in vectors])
+        data = numpy.concatenate([v.val for v in vectors])
+    else:
+        indices = numpy.empty(0, dtype=numpy.int)
+        data = numpy.empty(0)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(vectors), n))
 
 
 def zeros(n):
     """Return a zero vector of length n."""
-    return SparseVector(n, {})
+    return SparseVector(n)
 
 
 def ones(n, indlist=None):
@@ -379,11 +406,8 @@ def ones(n, indlist=None):
     (default: range(n)).
     """
     if indlist is None:
-        indlist = range(n)
-    rv = SparseVector(n, {})
-    for k in indlist:
-        rv.values[k] = 1
-    return rv
+        indlist = numpy.arange(n)
+    return SparseVector(n, indlist, numpy.ones(len(indlist)))
 
 
 def random(n, lmin=0.0, lmax=1.0, indlist=None):
@@ -392,33 +416,22 @@ def random(n, lmin=0.0, lmax=1.0, indlist=None):
     Values are taken in the range [lmin,lmax] in the specified positions
     (default: max(5,n/100) random positions).
     """
-    import whrandom
-    import random
-    gen = whrandom.whrandom()
-    dl = lmax-lmin
-    rv = SparseVector(n, {})
     if indlist is None:
-        nval = max(5, n/100)
-        indlist = random.sample(xrange(n), nval)
-    for k in indlist:
-        rv.values[k] = dl * gen.random()
-    return rv
+        nval = min(n, max(5, n/100))
+        indlist = numpy.random.permutation(n)[:nval]
+    return SparseVector(n, indlist,
+                        lmin + (lmax - lmin) * numpy.random.rand(len(indlist)))
 
 
 def dotss(a, b):
     """dot product of two sparse vectors."""
-    dotproduct = 0.
-    for k in filter(a.values.has_key, b.values.keys()):
-        dotproduct += a[k] * b[k]
-    return dotproduct
+    _, ia, ib = _intersect(a, b)
+    return numpy.dot(a.val[ia], b.val[ib])
 
 
 def dotsn(a, b):
     """dot product of a sparse vector and numpy array."""
-    dotproduct = 0.
-    for k in a.keys():
-        dotproduct += a[k] * b[k]
-    return dotproduct
+    return numpy.dot(a.val, b[a.ind])
 
 
 def dot(a, b):
@@ -439,7 +452,7 @@ def norm(a):
     """Compute the 2-norm of vector a."""
     if not isSparseVector(a):
         raise TypeError("Argument must be a SparseVector")
-    return math.sqrt(dot(a, a))
+    return numpy.linalg.norm(a.val)
 
 
 def norm2(a):
@@ -449,12 +462,12 @@ def norm2(a):
 
 def norm1(a):
     """Compute the 1-norm of vector a."""
-    return sum([abs(a.values[k]) for k in a.values.keys()])
+    return numpy.sum(numpy.abs(a.val))
 
 
 def norm_infty(a):
     """Compute the infinity-norm of vector a."""
-    return max([abs(a.values[k]) for k in a.values.keys()])
+    return numpy.max(numpy.abs(a.val)) if a.nnz() else 0.0
 
 
 def normp(a, p):
@@ -465,156 +478,94 @@ def normp(a, p):
         return norm1(a)
     if p == 2:
         return norm2(a)
-    return sum([abs(a.values[k])**p for k in a.values.keys()])**(1.0/p)
+    return numpy.sum(numpy.abs(a.val)**p)**(1.0/p)
 
 
 def sum(a):
     """Return the sum of the elements of a."""
     if not isSparseVector(a):
         raise TypeError("Argument must be a SparseVector")
-    return sum([a.values[k] for k in a.values.keys()])
+    return numpy.sum(a.val)
 
 
 # elementwise operations
-def log10(a):
-    """log10 of each element of a."""
+def _apply(f, a):
+    """Apply numpy ufunc f to the nonzero elements of a."""
     if not isSparseVector(a):
         raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.log10(a.values[k])
-    return rv
+    return a._new(a.n, a.ind.copy(), f(a.val))
+
+
+def log10(a):
+    """log10 of each element of a."""
+    return _apply(numpy.log10, a)
 
 
 def log(a):
     """log of each element of a."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.log(a.values[k])
-    return rv
+    return _apply(numpy.log, a)
 
 
 def exp(a):
     """Elementwise exponential."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.exp(a.values[k])
-    return rv
+    return _apply(numpy.exp, a)
 
 
 def sin(a):
     """Elementwise sine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.sin(a.values[k])
-    return rv
+    return _apply(numpy.sin, a)
 
 
 def tan(a):
     """Elementwise tangent."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.tan(a.values[k])
-    return rv
+    return _apply(numpy.tan, a)
 
 
 def cos(a):
     """Elementwise cosine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.cos(a.values[k])
-    return rv
+    return _apply(numpy.cos, a)
 
 
 def asin(a):
     """Elementwise inverse sine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.asin(a.values[k])
-    return rv
+    return _apply(numpy.arcsin, a)
 
 
 def atan(a):
     """Elementwise inverse tangent."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.atan(a.values[k])
-    return rv
+    return _apply(numpy.arctan, a)
 
 
 def acos(a):
     """Elementwise inverse cosine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.acos(a.values[k])
-    return rv
+    return _apply(numpy.arccos, a)
 
 
 def sqrt(a):
     """Elementwise sqrt."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.sqrt(a.values[k])
-    return rv
+    return _apply(numpy.sqrt, a)
 
 
 def sinh(a):
     """Elementwise hyperbolic sine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.sinh(a.values[k])
-    return rv
+    return _apply(numpy.sinh, a)
 
 
 def tanh(a):
     """Elementwise hyperbolic tangent."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.tanh(a.values[k])
-    return rv
+    return _apply(numpy.tanh, a)
 
 
 def cosh(a):
     """Elementwise hyperbolic cosine."""
-    if not isSparseVector(a):
-        raise TypeError("Argument must be a SparseVector")
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.cosh(a.values[k])
-    return rv
+    return _apply(numpy.cosh, a)
 
 
 def atan2(a, b):
     """Arc tangent of a/b."""
     if not isSparseVector(a):
         raise TypeError("Argument must be a SparseVector")
-
-    rv = SparseVector(a.n, {})
-    for k in a.values.keys():
-        rv.values[k] = math.atan2(a.values[k], b)
-    return rv
+    return a._new(a.n, a.ind.copy(), numpy.arctan2(a.val, b))
 
 ###############################################################################
 #
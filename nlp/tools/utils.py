@@ -47,6 +47,19 @@ def identical(a, b):
     return False
 
 
+def same_structure(cache, rows, cols):
+    """Check that a cached sparse matrix has sparsity structure (rows, cols).
+
+    `cache` is either `None` or a tuple whose first two members are the
+    row and column indices with which the cached matrix was built.
+    """
+    if cache is None:
+        return False
+    c_rows, c_cols = cache[:2]
+    return (rows is c_rows or identical(rows, c_rows)) and \
+        (cols is c_cols or identical(cols, c_cols))
+
+
 def where(cond):
     """Bypass Numpy's annoyances.
 
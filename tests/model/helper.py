@@ -40,6 +40,8 @@ try:
 except:
     pass
 
+from npad_helper import *
+
 
 class RosenbrockData(object):
 
@@ -208,6 +210,27 @@ class GenericTest(object):
         assert(np.allclose(H, data.expected_H))
         assert(np.allclose(Hv, data.expected_Hv))
 
+    def test_blocks(self):
+        model = self.model
+        x = model.x0
+        V = np.column_stack((np.arange(1, model.nvar + 1, dtype=np.float),
+                             np.ones(model.nvar)))
+        HV = model.hprod_block(x, model.pi0, V)
+        assert(HV.shape == V.shape)
+        for k in xrange(V.shape[1]):
+            assert(np.allclose(HV[:, k], model.hprod(x, model.pi0, V[:, k])))
+
+        if model.m > 0:
+            U = np.column_stack((2 * np.ones(model.ncon),
+                                 np.arange(model.ncon, dtype=np.float)))
+            JV = model.jprod_block(x, V)
+            JTU = model.jtprod_block(x, U)
+            assert(JV.shape == (model.ncon, V.shape[1]))
+            assert(JTU.shape == (model.nvar, U.shape[1]))
+            for k in xrange(V.shape[1]):
+                assert(np.allclose(JV[:, k], model.jprod(x, V[:, k])))
+                assert(np.allclose(JTU[:, k], model.jtprod(x, U[:, k])))
+
 
 class Rosenbrock(GenericTest):
 
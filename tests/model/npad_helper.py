@@ -0,0 +1,20 @@
+import numpy as np
+from nlp.model.npadmodel import NumPyADModel
+from nlp.tools import npad
+
+
+class NumPyADRosenbrock(NumPyADModel):
+    """The standard Rosenbrock function."""
+
+    def obj(self, x, **kwargs):
+        return np.sum(100 * (x[1:] - x[:-1]**2)**2 + (1 - x[:-1])**2)
+
+
+class NumPyADHS7(NumPyADModel):
+    """Problem #7 in the Hock and Schittkowski collection."""
+
+    def obj(self, x, **kwargs):
+        return np.log(1 + x[0]**2) - x[1]
+
+    def cons(self, x, **kwargs):
+        return npad.hstack([(1 + x[0]**2)**2 + x[1]**2 - 4])
@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 from nlp.model.nlpmodel import NLPModel, UnconstrainedNLPModel
 import numpy as np
 
@@ -91,6 +92,48 @@ class SimpleQP(NLPModel):
         return hv
 
 
+class Arrowhead(NLPModel):
+    """Arrowhead problem with constraints x[i] * x[n-1] = 0, i < n-1."""
+
+    def __init__(self, n, **kwargs):
+        super(Arrowhead, self).__init__(n, m=n - 1,
+                                        Lcon=np.zeros(n - 1),
+                                        Ucon=np.zeros(n - 1), **kwargs)
+
+    def obj(self, x):
+        return np.sum((x[:-1]**2 - x[-1])**2)
+
+    def grad(self, x):
+        r = x[:-1]**2 - x[-1]
+        return np.append(4 * x[:-1] * r, -2 * r.sum())
+
+    def cons(self, x):
+        return x[:-1] * x[-1]
+
+    def dense_jac(self, x):
+        J = np.zeros((self.m, self.n))
+        J[:, :-1] = x[-1] * np.eye(self.m)
+        J[:, -1] = x[:-1]
+        return J
+
+    def dense_hess(self, x, z):
+        n = self.n
+        H = np.zeros((n, n))
+        H[:-1, :-1] = np.diag(12 * x[:-1]**2 - 4 * x[-1])
+        H[:-1, -1] = H[-1, :-1] = -4 * x[:-1] - z
+        H[-1, -1] = 2 * (n - 1)
+        return H
+
+    def jprod(self, x, v):
+        return np.dot(self.dense_jac(x), v)
+
+    def jtprod(self, x, v):
+        return np.dot(self.dense_jac(x).T, v)
+
+    def hprod(self, x, z, v):
+        return np.dot(self.dense_hess(x, z), v)
+
+
 class SimpleCubicProb(UnconstrainedNLPModel):
 
     def __init__(self, **kwargs):
@@ -149,3 +192,58 @@ class LineSearchProblem2(UnconstrainedNLPModel):
     def hess(self, x, z=None, *args, **kwargs):
         H = 32 - 204 * x**2 + 30 * x**4
         return H
+
+
+class MixedConstraints(NLPModel):
+    u"""Problem with one constraint of each type.
+
+    minimize    x₁² + x₂² + x₃²
+    subject to  x₁ + x₂ + x₃ = 1
+                x₁² + x₂ ≥ 0.5
+                x₂ x₃ ≤ 2
+                -1 ≤ x₁ - x₃² ≤ 1.
+    """
+
+    def __init__(self, **kwargs):
+        super(MixedConstraints, self).__init__(
+            n=3, m=4,
+            Lcon=np.array([1, 0.5, -np.inf, -1]),
+            Ucon=np.array([1, np.inf, 2, 1]), **kwargs)
+
+    def obj(self, x):
+        return np.dot(x, x)
+
+    def grad(self, x):
+        return 2 * x
+
+    def cons(self, x, out=None):
+        c = np.empty(self.m) if out is None else out
+        c[0] = x[0] + x[1] + x[2]
+        c[1] = x[0]**2 + x[1]
+        c[2] = x[1] * x[2]
+        c[3] = x[0] - x[2]**2
+        return c
+
+    def jac(self, x):
+        return np.array([[1, 1, 1],
+                         [2 * x[0], 1, 0],
+                         [0, x[2], x[1]],
+                         [1, 0, -2 * x[2]]], dtype=np.float)
+
+    def jprod(self, x, v):
+        return np.dot(self.jac(x), v)
+
+    def jtprod(self, x, v):
+        return np.dot(self.jac(x).T, v)
+
+    def hess(self, x, z=None, *args, **kwargs):
+        if z is None:
+            z = np.zeros(self.m)
+        H = 2 * np.eye(self.n)
+        H[0, 0] -= 2 * z[1]
+        H[1, 2] = H[2, 1] = -z[2]
+        H[2, 2] += 2 * z[3]
+        return H
+
+    def hprod(self, x, z, v):
+        return np.dot(self.hess(x, z), v)
@@ -0,0 +1,30 @@
+g3 0 1 0	# problem suffix
+ 2 1 1 0 0	# vars, constraints, objectives, ranges, eqns
+ 0 0	# nonlinear constraints, objectives
+ 0 0	# network constraints: nonlinear, linear
+ 0 0 0	# nonlinear vars in constraints, objectives, both
+ 0 0 0 1	# linear network variables; functions; arith, flags
+ 0 0 0 0 0	# discrete variables: binary, integer, nonlinear (b,c,o)
+ 2 2	# nonzeros in Jacobian, gradients
+ 0 0	# max name lengths: constraints, variables
+ 0 0 0 0 0	# common exprs: b,c,o,c1,o1
+S0 2 sstatus
+0 1
+1 3
+S5 1 dual_init
+0 0.5
+O0 0
+n0
+r
+2 1
+b
+2 0
+2 0
+k1
+1
+J0 2
+0 1
+1 1
+G0 2
+0 1
+1 2
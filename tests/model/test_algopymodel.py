@@ -39,3 +39,14 @@ class Test_AlgopyHS7(TestCase, Hs7):  # Test def'd in Hs7
                                pi0=np.ones(m),
                                Lcon=np.zeros(m),
                                Ucon=np.zeros(m))
+
+    def test_lag_hessian(self):
+        model = self.model
+        x = model.x0
+        z = np.array([3.])
+        H_f = model.hess(x)
+        H_z = model.hess(x, z)
+        assert H_z.shape == (model.nvar, model.nvar)
+        assert np.allclose(model.hess(x, 2 * z) - H_z, H_z - H_f)
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        assert np.allclose(model.hprod(x, z, v), np.dot(H_z, v))
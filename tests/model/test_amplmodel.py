@@ -51,6 +51,82 @@ class Test_AmplHS7(TestCase, Hs7):  # Test also defined in Hs7
         self.model = AmplModel(model)  # x0 = (2, 2)
         self.model.pi0 = np.ones(1)
 
+    def test_jac_pos(self):
+        model = self.model
+        x = model.x0
+        Jpos = ndarray_from_coord(model.ncon + model.nrangeC, model.nvar,
+                                  *model.jac_pos(x))
+        assert np.allclose(Jpos, model.jop_pos(x).to_array())
+
+    def test_jac_cache(self):
+        model = self.model
+        x = model.x0.copy()
+        J = ndarray_from_coord(model.ncon, model.nvar, *model.jac(x))
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        u = np.arange(1, model.ncon + 1, dtype=np.float)
+        assert np.allclose(model.jprod(x, v), np.dot(J, v))
+        Jc = model._jac_cache[2]
+        assert np.allclose(model.jtprod(x, u), np.dot(J.T, u))
+        assert model._jac_cache[2] is Jc
+
+        # Changing x in place must trigger a new evaluation.
+        x += 1
+        J = ndarray_from_coord(model.ncon, model.nvar, *model.jac(x))
+        assert np.allclose(model.jtprod(x, u), np.dot(J.T, u))
+        assert np.allclose(model._jac_cache[2].toarray(), J)
+
+    def test_jop_copy(self):
+        # An operator remains valid after evaluations at another point.
+        model = self.model
+        x = model.x0.copy()
+        J = ndarray_from_coord(model.ncon, model.nvar, *model.jac(x))
+        Jop = model.jop(x)
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        model.jprod(x + 1, v)
+        assert np.allclose(Jop * v, np.dot(J, v))
+
+    def test_structure(self):
+        model = self.model
+        x = model.x0
+        rows, cols = model.jac_structure()
+        assert model.jac_structure()[0] is rows
+        vals = np.empty(model.nnzj)
+        assert model.jac_values(x, out=vals) is vals
+        assert np.allclose(ndarray_from_coord(model.ncon, model.nvar,
+                                              vals, rows, cols),
+                           ndarray_from_coord(model.ncon, model.nvar,
+                                              *model.jac(x)))
+
+        rows, cols = model.hess_structure()
+        vals = np.empty(model.nnzh)
+        assert model.hess_values(x, model.pi0, out=vals) is vals
+        assert np.allclose(ndarray_from_coord(model.nvar, model.nvar,
+                                              vals, rows, cols,
+                                              symmetric=True),
+                           ndarray_from_coord(model.nvar, model.nvar,
+                                              *model.hess(x, model.pi0),
+                                              symmetric=True))
+
+    def test_out(self):
+        model = self.model
+        x = model.x0
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        for func, args, size in [(model.grad, (x,), model.nvar),
+                                 (model.cons, (x,), model.ncon),
+                                 (model.hprod, (x, model.pi0, v), model.nvar)]:
+            out = np.empty(size)
+            assert func(*args, out=out) is out
+            assert np.allclose(out, func(*args))
+
+    def test_static_views(self):
+        model = self.model
+        assert not model.Lvar.flags.writeable
+        assert not model.Ucon.flags.writeable
+        assert np.all(model.model.get_Lvar() == model.Lvar)
+        assert model.model.get_Lvar().flags.writeable
+        with pytest.raises(ValueError):
+            model.model.eval_cons(np.zeros(model.nvar + 1))
+
 
 class Test_AmplMaxProfit(TestCase, MaxProfit):  # Test also defined in MaxProfit
 
@@ -92,6 +168,16 @@ class Test_PySparseAmplHS7(TestCase, Hs7):
         self.model = PySparseAmplModel(model)
         self.model.pi0 = np.ones(1)
 
+    def test_in_place(self):
+        model = self.model
+        x = model.x0
+        H = model.hess(x, model.pi0)
+        H0 = ndarray_from_ll_mat_sym(H)
+        assert model.hess(2 * x, model.pi0) is H
+        assert model.jac(x) is model.jac(2 * x)
+        assert np.allclose(ndarray_from_ll_mat_sym(model.hess(x, model.pi0)),
+                           H0)
+
 
 class Test_PySparseAmplHS9(TestCase, Hs9):
 
@@ -190,6 +276,26 @@ class Test_SciPyAmplHS7(TestCase, Hs7):
         self.model = SciPyAmplModel(model)
         self.model.pi0 = np.ones(1)
 
+    def test_in_place(self):
+        model = self.model
+        x = model.x0
+        J = model.jac(x)
+        H = model.hess(x, model.pi0)
+        J0 = J.toarray()
+        H0 = H.toarray()
+        assert model.jac(2 * x) is J
+        assert model.hess(2 * x, model.pi0) is H
+        assert np.allclose(model.jac(x).toarray(), J0)
+        assert np.allclose(model.hess(x, model.pi0).toarray(), H0)
+
+    def test_hess_op(self):
+        model = self.model
+        x = model.x0
+        H = model.hess(x, model.pi0)
+        assert H.format == 'csr'
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        assert np.allclose(model.hess_op(x, model.pi0) * v, H * v)
+
 
 class Test_SciPyAmplHS9(TestCase, Hs9):
 
@@ -427,6 +533,8 @@ class Test_AmplModelExtrasim(TestCase):
         A = np.array([[1., 2.]])
         for j in range(model.ncon):
             assert np.allclose(model.irow(j).to_array(), A[j, :])
+        assert np.allclose(model.rows().toarray(), A)
+        assert np.allclose(model.rows([0, 0]).toarray(), A[[0, 0], :])
 
     def test_cons_scaling(self):
         model = self.model
@@ -0,0 +1,120 @@
+"""Tests relative to :class:`AmplModelPool`."""
+
+from unittest import TestCase
+from nlp.model.amplpool import AmplModelPool
+from python_models import MixedConstraints
+import numpy as np
+import os
+import pytest
+import shutil
+import tempfile
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+
+
+class FileModel(MixedConstraints):
+    """Stand-in for `AmplModel` that records whether it was closed."""
+
+    def __init__(self, path, **kwargs):
+        super(FileModel, self).__init__(name=path, **kwargs)
+        self.x0 = self.get_x0()
+        self.closed = False
+
+    def get_x0(self):
+        return np.ones(self.n)
+
+    def get_pi0(self):
+        return np.zeros(self.m)
+
+    def close(self):
+        self.closed = True
+
+
+class Test_AmplModelPool(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.stubs = []
+        for i in range(3):
+            stub = os.path.join(self.dir, 'prob%d' % i)
+            with open(stub + '.nl', 'w') as f:
+                f.write('x' * 100)
+            self.stubs.append(stub)
+        self.pool = AmplModelPool(max_bytes=250, model_class=FileModel,
+                                  sizeof=lambda path, model: 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_hits(self):
+        pool = self.pool
+        model = pool.get(self.stubs[0])
+        assert pool.get(self.stubs[0] + '.nl') is model
+        assert pool.stats['hits'] == 1
+        assert pool.stats['misses'] == 1
+        assert len(pool) == 1
+        assert self.stubs[0] in pool
+
+    def test_lru(self):
+        pool = self.pool
+        m0 = pool.get(self.stubs[0])
+        m1 = pool.get(self.stubs[1])
+        pool.get(self.stubs[0])
+        m2 = pool.get(self.stubs[2])  # Evicts m1.
+        assert m1.closed and not m0.closed and not m2.closed
+        assert self.stubs[1] not in pool
+        assert pool.stats['evictions'] == 1
+        assert pool.stats['bytes'] == 200
+
+        pool.clear()
+        assert m0.closed and m2.closed
+        assert len(pool) == 0 and pool.nbytes == 0
+
+    def test_max_models(self):
+        self.pool.max_models = 1
+        m0 = self.pool.get(self.stubs[0])
+        self.pool.get(self.stubs[1])
+        assert m0.closed
+        assert len(self.pool) == 1
+
+    def test_reload(self):
+        pool = self.pool
+        m0 = pool.get(self.stubs[0])
+        mtime = os.path.getmtime(self.stubs[0] + '.nl')
+        os.utime(self.stubs[0] + '.nl', (mtime + 10, mtime + 10))
+        m1 = pool.get(self.stubs[0])
+        assert m1 is not m0
+        assert m0.closed
+        assert pool.stats['reloads'] == 1
+        assert pool.stats['bytes'] == 100
+
+    def test_reset(self):
+        model = self.pool.get(self.stubs[0])
+        x = model.x0
+        model.obj(x)
+        model.compute_scaling_obj()
+        model.x0[0] = 5
+        assert model.obj.ncalls > 0
+        assert model.scale_obj is not None
+
+        assert self.pool.get(self.stubs[0]) is model
+        assert model.obj.ncalls == 0
+        assert model.scale_obj is None
+        assert np.all(model.x0 == 1)
+
+
+class Test_AmplModelPoolHS7(TestCase):
+
+    def setUp(self):
+        pytest.importorskip("nlp.model.amplmodel")
+        self.pool = AmplModelPool()
+        self.stub = os.path.join(this_path, 'hs007')
+
+    def test_release(self):
+        model = self.pool.get(self.stub)
+        assert self.pool.get(self.stub + '.nl') is model
+        self.pool.release(self.stub)
+        assert model.closed
+        with pytest.raises(ValueError):
+            model.obj(model.x0)
+        assert np.all(np.isfinite(model.x0))
@@ -3,7 +3,7 @@
 import os
 from unittest import TestCase
 from helper import *
-from python_models import Rosenbrock, SimpleQP
+from python_models import Rosenbrock, SimpleQP, MixedConstraints
 from nlp.model.augmented_lagrangian import AugmentedLagrangian
 from nlp.tools.dercheck import DerivativeChecker
 from nlp.tools.logs import config_logger
@@ -228,3 +228,65 @@ class TestAugmentedLagrangianScipyAmplModelHS10(AugmentedLagrangianHS10,
         self.model = AugmentedLagrangian(SciPyAmplModel(model), prox=1.0)
         self.model.pi = np.array([3.])
         self.x = np.array([2, 2, 1], dtype=np.float)
+
+
+class TestSlackFreeAugmentedLagrangian(TestCase):
+
+    def setUp(self):
+        self.nlp = MixedConstraints()
+        self.model = AugmentedLagrangian(self.nlp, prox=1.0, slack=False)
+        self.x = np.array([0.5, 1.5, -0.5])
+
+    def test_init(self):
+        assert self.model.nvar == self.nlp.nvar
+        assert self.model.ncon == 0
+        assert self.model.pi.size == self.nlp.m + self.nlp.nrangeC
+        assert self.model.model is self.nlp
+
+    def test_obj(self):
+        # All inequalities are strictly satisfied and pi = 0 so that only
+        # the equality constraint contributes.
+        c = self.nlp.cons(self.x)
+        f = self.nlp.obj(self.x) + 5 * (c[0] - 1)**2
+        assert np.allclose(self.model.obj(self.x),
+                           f + 0.5 * np.linalg.norm(self.x)**2)
+
+    def test_inactive(self):
+        self.model.pi = np.array([1., 2, -1, 3, 4])
+        x = self.x
+        c = self.nlp.cons_pos(x)
+        pi = self.model.pi
+        f = self.nlp.obj(x) - pi[0] * c[0] + 5 * c[0]**2
+        for i in range(1, 5):
+            if pi[i] - 10 * c[i] > 0:
+                f += -pi[i] * c[i] + 5 * c[i]**2
+            else:
+                f -= pi[i]**2 / 20
+        assert np.allclose(self.model.obj(x),
+                           f + 0.5 * np.linalg.norm(x)**2)
+
+    def test_derivatives(self):
+        self.model.pi = np.array([1., 2, -1, 3, 4])
+        for x in [self.x, np.array([0.1, 0.2, 1.2]), -self.x]:
+            dcheck = DerivativeChecker(self.model, x)
+            dcheck.check(chess=False)
+            assert len(dcheck.grad_errs) == 0
+            assert len(dcheck.hess_errs) == 0
+
+    def test_first_order_multipliers(self):
+        self.model.pi = np.array([1., 2, -1, 3, 4])
+        pi = self.model.first_order_multipliers(self.x)
+        assert np.all(pi[1:] >= 0)
+        g = self.model.grad(self.x) - (self.x - self.model.xk)
+        self.model.pi = pi
+        assert np.allclose(self.model.dual_feasibility(self.x), g)
+
+    def test_equalities(self):
+        # With equality constraints only, both formulations coincide.
+        slack = AugmentedLagrangian(SimpleQP(), slack=True)
+        noslack = AugmentedLagrangian(SimpleQP(), slack=False)
+        slack.pi = noslack.pi = np.array([3.])
+        x = np.array([1., 2])
+        assert np.allclose(slack.obj(x), noslack.obj(x))
+        assert np.allclose(slack.grad(x), noslack.grad(x))
+        assert np.allclose(slack.hop(x).to_array(), noslack.hop(x).to_array())
@@ -0,0 +1,94 @@
+"""Tests relative to sparse derivatives recovered by graph coloring."""
+
+from unittest import TestCase
+from nlp.model.coloredmodel import ColoredNLPModel, ColoredHessianModel, \
+    ColoredJacobianModel
+from python_models import Rosenbrock, Arrowhead
+import numpy as np
+
+
+class ColoredArrowhead(ColoredNLPModel, Arrowhead):
+    pass
+
+
+class ColoredRosenbrock(ColoredHessianModel, Rosenbrock):
+    pass
+
+
+def dense(nrow, ncol, vals, rows, cols):
+    A = np.zeros((nrow, ncol))
+    A[rows, cols] = vals
+    return A
+
+
+class Test_ColoredModel(TestCase):
+
+    def test_products(self):
+        n = 10
+        model = ColoredArrowhead(n, x0=np.arange(1., n + 1))
+        x = model.x0
+        z = np.arange(n - 1.)
+        J = dense(model.m, n, *model.jac(x))
+        assert np.allclose(J, model.dense_jac(x))
+        assert model.jac_colors.max() + 1 == 2
+        H = dense(n, n, *model.hess(x, z))
+        assert np.allclose(H, np.tril(model.dense_hess(x, z)))
+        assert model.hess_colors.max() + 1 == 2
+        H = dense(n, n, *model.hess(x))
+        assert np.allclose(H, np.tril(model.dense_hess(x, 0)))
+
+    def test_differences(self):
+        n = 10
+        model = ColoredArrowhead(n, x0=np.arange(1., n + 1), fd=True)
+        x = model.x0
+        z = np.arange(n - 1.)
+        J = dense(model.m, n, *model.jac(x))
+        assert np.allclose(J, model.dense_jac(x), rtol=1e-5, atol=1e-4)
+        H = dense(n, n, *model.hess(x, z))
+        assert np.allclose(H, np.tril(model.dense_hess(x, z)),
+                           rtol=1e-5, atol=1e-3)
+
+        model = ColoredRosenbrock(n, x0=-np.ones(n), fd=True)
+        x = model.x0
+        vals, rows, cols = model.hess(x)
+        assert np.all(rows >= cols)
+        assert model.nnzh == 2 * n - 1
+        assert model.hess_colors.max() + 1 <= 3
+        H = dense(n, n, vals, rows, cols)
+        assert np.allclose(H, np.tril(Rosenbrock.hess(model, x, None)),
+                           rtol=1e-5, atol=1e-3)
+
+    def test_fd_keyword(self):
+        n = 5
+        model = ColoredArrowhead(n, fd=True)
+        assert model._jac_fd and model._hess_fd
+
+        class ColoredJacobianArrowhead(ColoredJacobianModel, Arrowhead):
+            pass
+
+        # The keyword is not passed on to NLPModel.
+        model = ColoredJacobianArrowhead(n, x0=np.arange(1., n + 1), fd=True)
+        J = dense(model.m, n, *model.jac(model.x0))
+        assert np.allclose(J, model.dense_jac(model.x0), rtol=1e-5,
+                           atol=1e-4)
+        assert model.jprod.ncalls == 0
+
+    def test_pattern_at_zero(self):
+        # Most derivatives vanish at x = 0 but the pattern must not.
+        n = 5
+        model = ColoredArrowhead(n, x0=np.zeros(n))
+        x = model.x0
+        z = np.arange(1., n)
+        J = dense(model.m, n, *model.jac(x))
+        assert model.nnzj == 2 * (n - 1)
+        assert np.allclose(J, model.dense_jac(x))
+        H = dense(n, n, *model.hess(x, z))
+        assert model.nnzh == 2 * n - 1
+        assert np.allclose(H, np.tril(model.dense_hess(x, z)))
+
+        # The detected pattern serves at other points.
+        x = np.arange(1., n + 1)
+        J = dense(model.m, n, *model.jac(x))
+        assert np.allclose(J, model.dense_jac(x))
+        H = dense(n, n, *model.hess(x, z))
+        assert np.allclose(H, np.tril(model.dense_hess(x, z)))
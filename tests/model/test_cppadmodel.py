@@ -33,3 +33,29 @@ class Test_CppADHS7(TestCase, Hs7):  # Test def'd in Hs7
                               pi0=np.ones(m),
                               Lcon=4 * np.ones(m),
                               Ucon=4 * np.ones(m))
+
+    def test_sweep_reuse(self):
+        model = self.model
+        x0, z0 = model.x0, model.pi0
+        H = model.hess(x0, z0)
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        assert np.allclose(model.hprod(x0, z0, v), np.dot(H, v))
+        assert np.allclose(model.hprod(x0, z0, 2 * v), np.dot(H, 2 * v))
+        assert np.allclose(model.hprod_block(x0, z0, np.eye(model.nvar)), H)
+        x1 = x0 + 1
+        H1 = model.hess(x1, z0)
+        assert np.allclose(model.hprod(x1, z0, v), np.dot(H1, v))
+        J = model.jac(x0)
+        w = np.ones(model.ncon)
+        assert np.allclose(model.jprod(x0, v), np.dot(J, v))
+        assert np.allclose(model.jtprod(x0, w), np.dot(J.T, w))
+        assert np.allclose(model.jprod(x1, v), np.dot(model.jac(x1), v))
+
+    def test_lag_hessian(self):
+        model = self.model
+        x = model.x0
+        z = np.array([3.])
+        H_f = model.hess(x)
+        H_z = model.hess(x, z)
+        assert H_z.shape == (model.nvar, model.nvar)
+        assert np.allclose(model.hess(x, 2 * z) - H_z, H_z - H_f)
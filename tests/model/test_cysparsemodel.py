@@ -34,6 +34,16 @@ class Test_CySparseAmplHS7(TestCase, Hs7):
         self.model = CySparseAmplModel(model)
         self.model.pi0 = np.ones(1)
 
+    def test_in_place(self):
+        model = self.model
+        x = model.x0
+        H = model.hess(x, model.pi0)
+        H0 = ndarray_from_ll_mat_sym(H)
+        assert model.hess(2 * x, model.pi0) is H
+        assert model.jac(x) is model.jac(2 * x)
+        assert np.allclose(ndarray_from_ll_mat_sym(model.hess(x, model.pi0)),
+                           H0)
+
 
 class Test_CySparseAmplHS9(TestCase, Hs9):
 
@@ -0,0 +1,120 @@
+"""Tests relative to models with finite-difference derivatives."""
+
+from unittest import TestCase
+from nlp.model.fdmodel import FDHessianModel, FDGradientModel
+from python_models import Rosenbrock, Arrowhead
+import multiprocessing.dummy
+import numpy as np
+import pytest
+
+
+class Test_FDHessianModel(TestCase):
+
+    def setUp(self):
+        n = 5
+        self.rosenbrock = Rosenbrock(n, x0=-np.ones(n))
+        self.arrowhead = Arrowhead(n, x0=np.arange(1., n + 1))
+
+    def test_hprod(self):
+        for central in (False, True):
+            model = FDHessianModel(self.rosenbrock, central=central)
+            x = model.x0
+            H = Rosenbrock.hess(self.rosenbrock, x, None)
+            v = np.arange(1., model.n + 1)
+            model.grad(x)
+            ngrad = self.rosenbrock.grad.ncalls
+            Hv = model.hop(x) * v
+            assert np.allclose(Hv, np.dot(H, v), rtol=1e-6)
+            expected = 2 if central else 1
+            assert self.rosenbrock.grad.ncalls - ngrad == expected
+            assert np.allclose(model.hess(x), H, rtol=1e-6)
+
+    def test_lagrangian(self):
+        model = FDHessianModel(self.arrowhead, central=True)
+        x = model.x0
+        z = np.arange(model.m, dtype=np.float)
+        H = self.arrowhead.dense_hess(x, z)
+        v = np.ones(model.n)
+        assert np.allclose(model.hprod(x, z, v), np.dot(H, v), rtol=1e-6)
+        assert np.allclose(model.hess(x, z), H, rtol=1e-6, atol=1e-6)
+
+
+class BlockRosenbrock(Rosenbrock):
+    """Rosenbrock problem with objective evaluations at blocks of points."""
+
+    def obj_block(self, X):
+        return np.sum(100 * (X[1:] - X[:-1]**2)**2 + (1 - X[:-1])**2, axis=0)
+
+
+class Test_FDGradientModel(TestCase):
+
+    def setUp(self):
+        n = 5
+        self.rosenbrock = Rosenbrock(n, x0=-np.ones(n))
+        self.x = np.linspace(-1, 1, n)
+        self.g = Rosenbrock.grad(self.rosenbrock, self.x)
+
+    def test_methods(self):
+        for method in ('forward', 'central', 'complex'):
+            model = FDGradientModel(self.rosenbrock, method=method)
+            rtol = 1e-5 if method == 'forward' else 1e-8
+            assert np.allclose(model.grad(self.x), self.g, rtol=rtol)
+        with pytest.raises(ValueError):
+            FDGradientModel(self.rosenbrock, method='backward')
+
+    def test_reuse(self):
+        model = FDGradientModel(self.rosenbrock)
+        x = self.x
+        model.obj(x)
+        nobj = self.rosenbrock.obj.ncalls
+        model.grad(x)
+        model.grad(x)
+        assert self.rosenbrock.obj.ncalls - nobj == 2 * model.n
+
+    def test_failed_grad(self):
+        # A failed evaluation must not leave a stale objective value.
+        class Failing(Rosenbrock):
+            def obj(self, x):
+                if x[0] > 0.5:
+                    raise ValueError
+                return Rosenbrock.obj(self, x)
+
+        n = self.rosenbrock.n
+        model = FDGradientModel(Failing(n))
+        x = self.x.copy()
+        model.obj(x)
+        x[0] = 0.5
+        with pytest.raises(ValueError):
+            model.grad(x)
+        assert model.obj(x) == Rosenbrock.obj(self.rosenbrock, x)
+
+    def test_pools(self):
+        for processes in (False, True):
+            model = FDGradientModel(self.rosenbrock, method='central',
+                                    workers=2, processes=processes)
+            assert np.allclose(model.grad(self.x), self.g, rtol=1e-8)
+            model.close()
+        n = self.rosenbrock.n
+        model = FDGradientModel(BlockRosenbrock(n), workers=2)
+        assert np.allclose(model.grad(self.x), self.g, rtol=1e-5)
+        model.close()
+
+    def test_given_pool(self):
+        n = self.rosenbrock.n
+        blocks = []
+
+        class Recorder(BlockRosenbrock):
+            def obj_block(self, X):
+                blocks.append(X.shape)
+                return BlockRosenbrock.obj_block(self, X)
+
+        pool = multiprocessing.dummy.Pool(2)
+        with pytest.raises(ValueError):
+            FDGradientModel(Recorder(n), pool=pool)
+        model = FDGradientModel(Recorder(n), pool=pool, workers=2,
+                                method='central')
+        assert np.allclose(model.grad(self.x), self.g, rtol=1e-8)
+        # Each worker evaluates one block of n of the 2n perturbed points.
+        assert blocks == [(n, n), (n, n)]
+        pool.close()
+        pool.join()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Tests relative to the l1 elastic merit functions."""
+
+from unittest import TestCase
+from nlp.model.nlpmodel import NLPModel
+import numpy as np
+import pytest
+
+pytest.importorskip("pysparse")
+
+from pysparse.sparse.pysparseMatrix import PysparseMatrix as sp
+from nlp.model.l1 import L1MeritFunction, L1BarrierMeritFunction
+
+
+def dense(A, symmetric=False):
+    """Return a dense copy of a Pysparse matrix."""
+    (vals, rows, cols) = A.find()
+    D = np.zeros(A.shape)
+    D[rows, cols] = vals
+    if symmetric:
+        D += np.tril(D, -1).T
+    return D
+
+
+class AllKinds(NLPModel):
+    u"""A problem with every kind of bound and of general constraint.
+
+    Variables: x0 ∈ [-1, 2], x1 free, x2 ≤ 3, x3 ≥ -2.
+
+    Constraints, given in an order that mixes their kinds:
+
+        x0 x1 + x3         ≥ -1
+        x0² + x1²          = 1
+        -1 ≤ sin(x2) + x3  ≤ 1
+        x1 + x2³           ≤ 2.
+    """
+
+    def __init__(self, **kwargs):
+        inf = np.inf
+        super(AllKinds, self).__init__(
+            n=4, m=4, name='allkinds',
+            x0=np.array([0.5, -0.3, 0.8, 1.2]),
+            Lvar=np.array([-1., -inf, -inf, -2.]),
+            Uvar=np.array([2., inf, 3., inf]),
+            Lcon=np.array([-1., 1., -1., -inf]),
+            Ucon=np.array([inf, 1., 1., 2.]), **kwargs)
+        self.nnzj = 10
+        self.nnzh = 7
+
+    def obj(self, x):
+        return 0.5 * np.dot(x, x) + x[0] * x[3]**2
+
+    def grad(self, x):
+        g = x.copy()
+        g[0] += x[3]**2
+        g[3] += 2 * x[0] * x[3]
+        return g
+
+    def cons(self, x, out=None):
+        c = np.empty(self.m) if out is None else out
+        c[0] = x[0] * x[1] + x[3]
+        c[1] = x[0]**2 + x[1]**2
+        c[2] = np.sin(x[2]) + x[3]
+        c[3] = x[1] + x[2]**3
+        return c
+
+    def dense_jac(self, x):
+        return np.array([[x[1], x[0], 0, 1],
+                         [2 * x[0], 2 * x[1], 0, 0],
+                         [0, 0, np.cos(x[2]), 1],
+                         [0, 1, 3 * x[2]**2, 0]])
+
+    def jac(self, x, **kwargs):
+        J = sp(nrow=self.m, ncol=self.n, sizeHint=10)
+        (rows, cols) = np.nonzero(self.dense_jac(x))
+        J.put(self.dense_jac(x)[rows, cols], rows, cols)
+        return J
+
+    def jtprod(self, x, v):
+        return np.dot(self.dense_jac(x).T, v)
+
+    def dense_hess(self, x, z, obj_weight=1.0):
+        """Hessian of obj_weight * f(x) - zᵀc(x)."""
+        H = obj_weight * np.eye(self.n)
+        H[0, 3] = H[3, 0] = 2 * obj_weight * x[3]
+        H[3, 3] += 2 * obj_weight * x[0]
+        H[0, 1] -= z[0]
+        H[1, 0] -= z[0]
+        H[0, 0] -= 2 * z[1]
+        H[1, 1] -= 2 * z[1]
+        H[2, 2] += z[2] * np.sin(x[2]) - 6 * z[3] * x[2]
+        return H
+
+    def hess(self, x, z=None, **kwargs):
+        if z is None:
+            z = np.zeros(self.m)
+        H = np.tril(self.dense_hess(x, z, **kwargs))
+        (rows, cols) = np.nonzero(H)
+        Hs = sp(nrow=self.n, ncol=self.n, symmetric=True, sizeHint=10)
+        Hs.put(H[rows, cols], rows, cols)
+        return Hs
+
+
+class Test_L1MeritFunction(TestCase):
+
+    def setUp(self):
+        self.model = AllKinds()
+        self.l1 = L1MeritFunction(self.model, nuE=2.0, nuS=3.0, nuT=5.0)
+        np.random.seed(0)
+        self.xst = self.l1.x0 + 0.1 * np.random.random(self.l1.n)
+
+    def test_dimensions(self):
+        model = self.model
+        l1 = self.l1
+        assert l1.n == model.n + model.m + 3
+        assert l1.m == model.m + 1 + 4
+        x = model.x0
+        c = model.cons(x)
+        cp = l1.cons_pos(x)
+        # Regression: the upper side of range constraints is appended once.
+        assert cp.shape == (model.m + model.nrangeC,)
+        assert np.allclose(cp, [c[0] + 1, c[1] - 1, c[2] + 1, 2 - c[3],
+                                1 - c[2]])
+
+    def test_initial_point(self):
+        l1 = self.l1
+        (x, s, t) = l1.get_xst(l1.x0)
+        assert np.all(x == self.model.x0)
+        assert np.all(s > 0)
+        assert np.all(t > 0)
+        assert np.all(l1.cons(l1.x0) > 0)
+
+    def test_obj_cons(self):
+        l1 = self.l1
+        (x, s, t) = l1.get_xst(self.xst)
+        f = self.model.obj(x)
+        c = self.model.cons(x)
+        p = f + 2.0 * (c[1] - 1 + 2 * s[1])
+        p += 3.0 * (s[0] + s[2] + s[3]) + 5.0 * np.sum(t)
+        assert np.allclose(l1.obj(self.xst), p)
+
+        # Former bounds are ordered as lowerB, upperB, rangeB: x3, x2, x0.
+        ec = [c[0] + 1 + s[0], c[1] - 1 + s[1], c[2] + 1 + s[2],
+              2 - c[3] + s[3], 1 - c[2] + s[2],
+              x[3] + 2 + t[0], 3 - x[2] + t[1],
+              x[0] + 1 + t[2], 2 - x[0] + t[2]]
+        assert np.allclose(l1.cons(self.xst), ec)
+        out = np.empty(l1.m)
+        assert l1.cons(self.xst, out=out) is out
+        assert np.allclose(out, ec)
+
+    def test_grad(self):
+        l1 = self.l1
+        (x, s, t) = l1.get_xst(self.xst)
+        J = self.model.dense_jac(x)
+        g = np.concatenate((self.model.grad(x) + 2.0 * J[1],
+                            [3.0, 4.0, 3.0, 3.0], 5.0 * np.ones(3)))
+        assert np.allclose(l1.grad(self.xst), g)
+
+    def test_jac(self):
+        l1 = self.l1
+        (x, s, t) = l1.get_xst(self.xst)
+        J = self.model.dense_jac(x)
+        Jl1 = np.zeros((l1.m, l1.n))
+        Jl1[:4, :4] = J
+        Jl1[3, :4] *= -1
+        Jl1[4, :4] = -J[2]
+        Jl1[:4, 4:8] = np.eye(4)
+        Jl1[4, 6] = 1
+        Jl1[5:, :4] = [[0, 0, 0, 1], [0, 0, -1, 0],
+                       [1, 0, 0, 0], [-1, 0, 0, 0]]
+        Jl1[5:, 8:] = [[1, 0, 0], [0, 1, 0], [0, 0, 1], [0, 0, 1]]
+        assert np.allclose(dense(l1.jac(self.xst)), Jl1)
+
+
+class Test_L1BarrierMeritFunction(TestCase):
+
+    def setUp(self):
+        self.model = AllKinds()
+        self.bar = L1BarrierMeritFunction(self.model, mu=0.5)
+        self.l1 = self.bar.l1
+        np.random.seed(1)
+        self.xst = self.l1.x0 + 0.1 * np.random.random(self.l1.n)
+
+    def fd_hess(self, xst, h=1.0e-6):
+        """Central differences of the barrier gradient."""
+        n = self.bar.n
+        H = np.empty((n, n))
+        for j in range(n):
+            e = np.zeros(n)
+            e[j] = h
+            H[:, j] = (self.bar.grad(xst + e) - self.bar.grad(xst - e)) / (2*h)
+        return 0.5 * (H + H.T)
+
+    def test_obj(self):
+        l1 = self.l1
+        (x, s, t) = l1.get_xst(self.xst)
+        c = l1.cons(self.xst)
+        phi = l1.obj(self.xst)
+        phi -= 0.5 * (np.sum(np.log(c)) + np.sum(np.log(s)) +
+                      np.sum(np.log(t)))
+        assert np.allclose(self.bar.obj(self.xst), phi)
+
+    def test_hess(self):
+        bar = self.bar
+        l1 = self.l1
+        xst = self.xst
+        H = dense(bar.hess(xst), symmetric=True)
+        assert np.allclose(H, self.fd_hess(xst), rtol=1e-5, atol=1e-5)
+
+        # Primal-dual Hessian with given multipliers.
+        n = self.model.n
+        yzuv = np.random.random(l1.m + l1.n - n)
+        (y, z, u, v) = l1.get_yzuv(yzuv)
+        y2 = y[:4].copy()
+        y2[3] *= -1
+        y2[1] -= l1.nuE
+        y2[2] -= y[4]
+        c = l1.cons(xst)
+        J = dense(l1.jac(xst))
+        Hbar = np.dot(J.T, (yzuv[:l1.m] / c)[:, np.newaxis] * J)
+        Hbar[:n, :n] += self.model.dense_hess(xst[:n], y2)
+        Hbar[n:, n:] += np.diag(yzuv[l1.m:] / xst[n:])
+        assert np.allclose(dense(bar.hess(xst, yzuv), symmetric=True), Hbar)
+
+        # The pattern is reused and the values are updated in place.
+        H2 = bar.hess(xst)
+        assert np.allclose(dense(H2, symmetric=True), H)
+
+    def test_hess_full_symmetric(self):
+        # Only the lower triangle of a user-supplied H is used, so that
+        # off-diagonal entries are not counted twice.
+        bar = self.bar
+        xst = self.xst
+        H = bar.l1.hess(xst, bar.primal_multipliers(xst))
+        Hfull = sp(nrow=bar.n, ncol=bar.n, sizeHint=2 * H.nnz)
+        D = dense(H, symmetric=True)
+        (rows, cols) = np.nonzero(D)
+        Hfull.put(D[rows, cols], rows, cols)
+        Hbar1 = dense(bar.hess(xst), symmetric=True)
+        Hbar2 = dense(bar.hess(xst, H=Hfull), symmetric=True)
+        assert np.allclose(Hbar1, Hbar2)
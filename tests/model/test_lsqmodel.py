@@ -0,0 +1,83 @@
+"""Tests relative to least-squares models."""
+
+from unittest import TestCase
+from nlp.model.lsqmodel import LSQModel
+from nlp.optimize.lm import LevenbergMarquardt
+from pykrylov.linop import linop_from_ndarray
+import numpy as np
+
+
+class ExpFit(LSQModel):
+    """Fit y = a exp(b t) to data."""
+
+    def __init__(self, **kwargs):
+        self.t = np.linspace(0, 1, 10)
+        self.y = 2 * np.exp(-self.t) + 0.01 * np.cos(10 * self.t)
+        super(ExpFit, self).__init__(2, self.t.size, x0=np.array([1., 0.]),
+                                     **kwargs)
+
+    def res(self, x):
+        return x[0] * np.exp(x[1] * self.t) - self.y
+
+    def jac_res(self, x):
+        e = np.exp(x[1] * self.t)
+        return np.column_stack((e, x[0] * self.t * e))
+
+
+class ExpFitOp(ExpFit):
+    """Same fit with the Jacobian as a linear operator."""
+
+    def jac_res(self, x):
+        return linop_from_ndarray(ExpFit.jac_res(self, x))
+
+
+class Test_LSQModel(TestCase):
+
+    def setUp(self):
+        self.model = ExpFit()
+        self.x = np.array([1.5, -0.5])
+
+    def test_derivatives(self):
+        model = self.model
+        x = self.x
+        J = ExpFit.jac_res(model, x)
+        r = model.res(x)
+        assert np.allclose(model.obj(x), 0.5 * np.dot(r, r))
+        assert np.allclose(model.grad(x), np.dot(J.T, r))
+
+        v = np.array([1., -2.])
+        V = np.column_stack((v, np.ones(2)))
+        assert np.allclose(model.hess(x), np.dot(J.T, J))
+        assert np.allclose(model.hprod(x, None, v), np.dot(J.T, np.dot(J, v)))
+        assert np.allclose(model.hprod_block(x, None, V),
+                           np.dot(J.T, np.dot(J, V)))
+        assert np.allclose(model.hprod(x, None, v, obj_weight=2),
+                           2 * np.dot(J.T, np.dot(J, v)))
+
+        op = ExpFitOp()
+        assert np.allclose(op.grad(x), np.dot(J.T, r))
+        assert np.allclose(op.hess(x) * v, np.dot(J.T, np.dot(J, v)))
+
+    def test_cache(self):
+        model = self.model
+        x = self.x.copy()
+        with model.at(x):
+            model.obj(x)
+            model.grad(x)
+            model.hprod(x, None, x)
+        assert model.res.ncalls == 1
+        assert model.jac_res.ncalls == 1
+
+        # Changing x in place must trigger new evaluations.
+        x += 1
+        model.grad(x)
+        assert model.res.ncalls == 2
+        assert model.jac_res.ncalls == 2
+
+    def test_levenberg_marquardt(self):
+        model = self.model
+        lm = LevenbergMarquardt(model, reltol=1.0e-8)
+        lm.solve()
+        assert lm.status == "opt"
+        assert np.allclose(lm.x, [2, -1], atol=0.05)
+        assert np.linalg.norm(model.grad(lm.x)) <= 1.0e-6
@@ -2,8 +2,10 @@
 
 from unittest import TestCase
 from nlp.model.nlpmodel import QPModel, LPModel
+from python_models import MixedConstraints
 from pykrylov.linop.linop import LinearOperator, linop_from_ndarray
 import numpy as np
+import pytest
 
 
 class Test_LPModel(TestCase):
@@ -96,3 +98,127 @@ class Test_QPModel(TestCase):
 
         H = qp.hess(x, 0)
         assert (np.allclose(H * x, np.dot(self.H, x)))
+
+    def test_blocks(self):
+        x = np.random.random(self.n)
+        V = np.random.random((self.n, 4))
+        U = np.random.random((self.m, 4))
+        qp2 = QPModel(self.c, self.H, A=self.A)
+        for qp in (self.qp, qp2):
+            assert (np.allclose(qp.hprod_block(x, 0, V), np.dot(self.H, V)))
+            assert (np.allclose(qp.jprod_block(x, V), np.dot(self.A, V)))
+            assert (np.allclose(qp.jtprod_block(x, U), np.dot(self.A.T, U)))
+        assert (qp2.hprod_block.ncalls == 1)
+        assert (qp2.hprod.ncalls == 0)
+        assert (self.qp.hprod.ncalls == 4)
+
+    def test_sparse_blocks(self):
+        sp = pytest.importorskip("scipy.sparse")
+        x = np.random.random(self.n)
+        V = np.random.random((self.n, 4))
+        U = np.random.random((self.m, 4))
+        qp = QPModel(self.c, sp.csr_matrix(self.H), A=sp.csr_matrix(self.A))
+        assert (np.allclose(qp.hprod_block(x, 0, V), np.dot(self.H, V)))
+        assert (np.allclose(qp.jprod_block(x, V), np.dot(self.A, V)))
+        assert (np.allclose(qp.jtprod_block(x, U), np.dot(self.A.T, U)))
+        assert (qp.hprod.ncalls == 0)
+        assert (qp.jprod.ncalls == 0 and qp.jtprod.ncalls == 0)
+
+
+class Test_PosReformulation(TestCase):
+    def setUp(self):
+        self.model = MixedConstraints(Lvar=np.array([-1, -np.inf, 0.]),
+                                      Uvar=np.array([1, 2, np.inf]))
+        self.x = np.array([0.5, 1.5, -0.5])
+
+    def test_cons_pos(self):
+        x = self.x
+        c = self.model.cons(x)
+        expected = np.array([c[0] - 1, c[1] - 0.5, 2 - c[2], c[3] + 1,
+                             1 - c[3]])
+        assert np.allclose(self.model.cons_pos(x), expected)
+
+    def test_bounds(self):
+        x = self.x
+        expected = np.array([x[2], 2 - x[1], x[0] + 1, 1 - x[0]])
+        assert np.allclose(self.model.bounds(x), expected)
+        x = np.array([0, 1, 2])
+        expected = np.array([2, 1, 1, 1])
+        assert np.allclose(self.model.bounds(x), expected)
+
+    def test_jac_pos(self):
+        model = self.model
+        x = self.x
+        J = model.jac(x)
+        expected = np.vstack((J[0], J[1], -J[2], J[3], -J[3]))
+
+        Jpos = model.jop_pos(x)
+        assert Jpos.shape == (5, 3)
+        assert np.allclose(Jpos.to_array(), expected)
+        assert np.allclose(Jpos.T.to_array(), expected.T)
+
+        rows, cols = np.nonzero(J)
+        vals, rows, cols = model._jac_pos_coord(J[rows, cols], rows, cols)
+        Jpos = np.zeros((5, 3))
+        Jpos[rows, cols] = vals
+        assert np.allclose(Jpos, expected)
+
+
+class PinnedMixedConstraints(MixedConstraints):
+
+    def __init__(self, **kwargs):
+        super(PinnedMixedConstraints, self).__init__(**kwargs)
+        self.calls = []
+
+    def set_x(self, x):
+        self.calls.append(('set', tuple(x)))
+
+    def unset_x(self):
+        self.calls.append(('unset',))
+
+
+class Test_At(TestCase):
+
+    def setUp(self):
+        self.model = PinnedMixedConstraints()
+
+    def test_at(self):
+        model = self.model
+        x = np.array([1., 2, 3])
+        with model.at(x) as m:
+            assert m is model
+            assert model.obj(x) == 14
+        assert model.calls == [('set', (1, 2, 3)), ('unset',)]
+
+    def test_nested(self):
+        model = self.model
+        x = np.array([1., 2, 3])
+        y = np.array([4., 5, 6])
+        with model.at(x):
+            with model.at(x.copy()):  # Same point: nothing to do.
+                pass
+            with model.at(y):
+                pass
+        assert model.calls == [('set', (1, 2, 3)), ('set', (4, 5, 6)),
+                               ('set', (1, 2, 3)), ('unset',)]
+
+    def test_in_place(self):
+        model = self.model
+        x = np.array([1., 2, 3])
+        with model.at(x):
+            x += 1
+            with model.at(x):
+                pass
+        assert model.calls == [('set', (1, 2, 3)), ('set', (2, 3, 4)),
+                               ('set', (1, 2, 3)), ('unset',)]
+
+    def test_exception(self):
+        model = self.model
+        x = np.array([1., 2, 3])
+        try:
+            with model.at(x):
+                raise ValueError
+        except ValueError:
+            pass
+        assert model.calls[-1] == ('unset',)
+        assert model._pinned_x is None
@@ -0,0 +1,83 @@
+"""Tests relative to the `nl` reader."""
+
+from unittest import TestCase
+from nlp.model.nlpmodel import LPModel, QPModel
+from nlp.model.nlreader import NlReader, read_nl
+import numpy as np
+import glob
+import os
+import pytest
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+examples_path = os.path.join(this_path, '..', '..', 'examples')
+nl_files = sorted(glob.glob(os.path.join(this_path, '*.nl')) +
+                  glob.glob(os.path.join(examples_path, '*.nl')))
+
+
+class Test_NlReader(TestCase):
+
+    def test_text(self):
+        reader = NlReader(os.path.join(this_path, 'hs010.nl'))
+        assert reader.n == 2 and reader.m == 1
+        assert reader.nlc == 1 and reader.nlo == 0
+        assert np.allclose(reader.c, [1, -1])
+        assert np.allclose(reader.x0, [0, 1])
+        assert np.allclose(reader.Lcon, [-1]) and np.all(reader.Ucon == np.inf)
+        with pytest.raises(ValueError):
+            reader.model()
+
+    def test_suffixes(self):
+        # Suffix names are plain tokens in text files.
+        model = read_nl(os.path.join(this_path, 'suffix.nl'))
+        assert isinstance(model, LPModel)
+        assert np.allclose(model.c, [1., 2.])
+        assert np.allclose(model.A.toarray(), [[1., 1.]])
+        assert np.allclose(model.Lvar, 0) and np.all(model.Uvar == np.inf)
+        assert np.allclose(model.Lcon, [1.]) and np.all(model.Ucon == np.inf)
+
+    def test_binary(self):
+        reader = NlReader(os.path.join(this_path, 'hs009.nl'))
+        assert np.allclose(reader.A.toarray(), [[4., -3.]])
+        assert np.allclose(reader.Lcon, 0) and np.allclose(reader.Ucon, 0)
+        assert reader.H is None
+        with pytest.raises(ValueError):
+            reader.model()
+
+    def test_lp(self):
+        model = read_nl(os.path.join(this_path, 'extrasim'))
+        assert isinstance(model, LPModel)
+        assert np.allclose(model.A.toarray(), [[1., 2.]])
+        assert np.allclose(model.c, [1., 0.])
+        assert np.allclose(model.Lvar, [0., -np.inf])
+        assert np.allclose(model.Lcon, [2.]) and np.allclose(model.Ucon, [2.])
+
+    def test_qp(self):
+        model = read_nl(os.path.join(examples_path, 'ncvxqp1.nl'))
+        assert isinstance(model, QPModel)
+        assert model.n == 1000 and model.m == 500
+        H = model.H.toarray()
+        assert np.allclose(H, H.T)
+        x = np.random.random(model.n)
+        assert np.allclose(model.grad(x), model.c + np.dot(H, x))
+
+
+class Test_NlReaderAmpl(TestCase):
+
+    def setUp(self):
+        pytest.importorskip("nlp.model.amplmodel")
+
+    def test_A(self):
+        from nlp.model.amplmodel import AmplModel
+        for stub in nl_files:
+            reader = NlReader(stub)
+            model = AmplModel(stub)
+            vals, rows, cols = model.A()
+            A = np.zeros((model.m, model.n))
+            A[rows, cols] = vals
+            assert np.allclose(reader.A.toarray(), A)
+            assert np.allclose(reader.Lvar, model.Lvar)
+            assert np.allclose(reader.Uvar, model.Uvar)
+            assert np.allclose(reader.Lcon, model.Lcon)
+            assert np.allclose(reader.Ucon, model.Ucon)
+            assert np.allclose(reader.x0, model.x0)
+            model.close()
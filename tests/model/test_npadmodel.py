@@ -0,0 +1,66 @@
+"""Tests relative to NumPy array-level AD."""
+
+from unittest import TestCase
+from helper import *
+import numpy as np
+
+
+class Test_NumPyADRosenbrock(TestCase, Rosenbrock):
+    # Test def'd in Rosenbrock
+
+    def get_derivatives(self, model):
+        return get_derivatives_plain(model)
+
+    def setUp(self):
+        n = 5
+        self.model = NumPyADRosenbrock(n, name='Rosenbrock', x0=-np.ones(n))
+
+    def test_replay(self):
+        model = self.model
+        x = np.linspace(-1, 1, model.nvar)
+        g = model.grad(model.x0)
+        tape = model._tape_obj
+        assert np.allclose(model.grad(x), RosenbrockGradient(x))
+        assert model._tape_obj is tape
+        assert np.allclose(model.grad(model.x0), g)
+
+
+def RosenbrockGradient(x):
+    g = np.zeros(x.size)
+    g[:-1] = -400 * x[:-1] * (x[1:] - x[:-1]**2) - 2 * (1 - x[:-1])
+    g[1:] += 200 * (x[1:] - x[:-1]**2)
+    return g
+
+
+class Test_NumPyADHS7(TestCase, Hs7):  # Test def'd in Hs7
+    def get_expected(self):
+        hs7_data = Hs7Data()
+        # The constraint is shifted so that its bounds are zero.
+        hs7_data.expected_c = np.array([25.])
+        return hs7_data
+
+    def get_derivatives(self, model):
+        return get_derivatives_plain(model)
+
+    def setUp(self):
+        n = 2
+        m = 1
+        self.model = NumPyADHS7(n,
+                                m=m,
+                                name='HS7',
+                                x0=2 * np.ones(n),
+                                pi0=np.ones(m),
+                                Lcon=np.zeros(m),
+                                Ucon=np.zeros(m))
+
+    def test_lag_hessian(self):
+        model = self.model
+        x = model.x0
+        z = np.array([3.])
+        H_f = model.hess(x)
+        H_z = model.hess(x, z)
+        assert np.allclose(model.hess(x, 2 * z) - H_z, H_z - H_f)
+        assert np.allclose(model.hess(x, z, obj_weight=0), H_z - H_f)
+        v = np.arange(1, model.nvar + 1, dtype=np.float)
+        assert np.allclose(model.hprod(x, z, v), np.dot(H_z, v))
+        assert np.allclose(model.jac_pos(x), model.jac(x))
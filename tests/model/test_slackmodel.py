@@ -0,0 +1,114 @@
+"""Tests relative to :class:`SlackModel` and the `out` keyword."""
+
+from unittest import TestCase
+from python_models import MixedConstraints, Rosenbrock
+from nlp.model.snlp import SlackModel
+from nlp.model.augmented_lagrangian import AugmentedLagrangian
+import numpy as np
+import pytest
+
+
+class AllocationCounter(object):
+    """Count calls to the Numpy array constructors."""
+
+    constructors = ["empty", "zeros", "ones", "empty_like", "zeros_like"]
+
+    def __init__(self, monkeypatch):
+        self.count = 0
+        for name in self.constructors:
+            monkeypatch.setattr(np, name, self._counted(getattr(np, name)))
+
+    def _counted(self, func):
+        def _func(*args, **kwargs):
+            self.count += 1
+            return func(*args, **kwargs)
+        return _func
+
+
+@pytest.fixture
+def allocations(monkeypatch):
+    return AllocationCounter(monkeypatch)
+
+
+@pytest.fixture
+def slack():
+    return SlackModel(MixedConstraints())
+
+
+def test_slack_derivatives(slack):
+    model = slack.model
+    x = np.random.random(slack.n)
+    v = np.random.random(slack.n)
+    y = np.random.random(model.m)
+    on = model.n
+    J = np.hstack([model.jac(x[:on]), np.zeros((model.m, slack.n - on))])
+    J[model.lowerC, slack.sL] = -1
+    J[model.upperC, slack.sU] = -1
+    J[model.rangeC, slack.sR] = -1
+
+    assert np.allclose(slack.grad(x)[:on], model.grad(x[:on]))
+    assert np.allclose(slack.grad(x)[on:], 0)
+    assert np.allclose(slack.jprod(x, v), np.dot(J, v))
+    assert np.allclose(slack.jtprod(x, y), np.dot(J.T, y))
+    Hv = slack.hprod(x, y, v)
+    assert np.allclose(Hv[:on], model.hprod(x[:on], y, v[:on]))
+    assert np.allclose(Hv[on:], 0)
+
+
+def test_slack_out(slack, allocations):
+    x = np.random.random(slack.n)
+    v = np.random.random(slack.n)
+    y = np.random.random(slack.model.m)
+    g = np.empty(slack.n)
+    Jtv = np.empty(slack.n)
+    Hv = np.empty(slack.n)
+    c = np.empty(slack.model.m)
+
+    allocations.count = 0
+    assert slack.grad(x, out=g) is g
+    assert slack.jtprod(x, y, out=Jtv) is Jtv
+    assert slack.hprod(x, y, v, out=Hv) is Hv
+    assert slack.cons(x, out=c) is c
+    assert allocations.count == 0
+
+    assert np.allclose(g, slack.grad(x))
+    assert np.allclose(Jtv, slack.jtprod(x, y))
+    assert np.allclose(Hv, slack.hprod(x, y, v))
+    assert np.allclose(c, slack.cons(x))
+
+
+def test_cons_pos_out(allocations):
+    model = MixedConstraints()
+    x = np.random.random(model.n)
+    c = np.empty(model.m + model.nrangeC)
+
+    allocations.count = 0
+    assert model.cons_pos(x, out=c) is c
+    assert allocations.count == 0
+    assert np.allclose(c, model.cons_pos(x))
+
+
+def test_out_fallback():
+    # Rosenbrock.grad() does not accept the `out` keyword.
+    model = Rosenbrock(5)
+    x = np.random.random(model.n)
+    g = np.empty(model.n)
+    assert model.grad(x, out=g) is g
+    assert np.allclose(g, model.grad(x))
+    assert model.grad.ncalls == 2
+
+
+class TestAugmentedLagrangianOut(TestCase):
+
+    def test_out(self):
+        for slack in [True, False]:
+            model = AugmentedLagrangian(MixedConstraints(), slack=slack)
+            model.pi = np.random.random(model.pi.size)
+            x = np.random.random(model.n)
+            v = np.random.random(model.n)
+            g = np.empty(model.n)
+            Hv = np.empty(model.n)
+            assert model.grad(x, out=g) is g
+            assert model.hprod(x, None, v, out=Hv) is Hv
+            assert np.allclose(g, model.grad(x))
+            assert np.allclose(Hv, model.hprod(x, None, v))
@@ -0,0 +1,60 @@
+from unittest import TestCase
+import numpy as np
+
+from nlp.tools import coloring
+
+
+def arrowhead(n):
+    """Pattern of the lower triangle of a tridiagonal arrowhead matrix."""
+    i = np.arange(n)
+    rows = np.concatenate((i, i[1:], (n - 1) * np.ones(n - 2, dtype=np.int)))
+    cols = np.concatenate((i, i[:-1], i[:-2]))
+    return (rows, cols)
+
+
+class Test_Coloring(TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def test_column_coloring(self):
+        m, n = 8, 12
+        J = (self.rng.rand(m, n) < 0.3) * self.rng.randn(m, n)
+        rows, cols = np.nonzero(J)
+        colors = coloring.column_coloring(rows, cols, (m, n))
+        for i in range(m):
+            row_colors = colors[cols[rows == i]]
+            assert np.unique(row_colors).size == row_colors.size
+        B = np.dot(J, coloring.seed_matrix(colors))
+        vals = coloring.recover_jacobian(B, rows, cols, colors)
+        assert np.allclose(vals, J[rows, cols])
+
+    def test_star_coloring(self):
+        n = 50
+        rows, cols = arrowhead(n)
+        colors = coloring.star_coloring(rows, cols, n)
+        assert colors.max() + 1 <= 4
+        H = np.zeros((n, n))
+        H[rows, cols] = self.rng.randn(rows.size)
+        H = H + np.tril(H, -1).T
+        B = np.dot(H, coloring.seed_matrix(colors))
+        assert np.allclose(coloring.recover_hessian(B, rows, cols, colors),
+                           H[rows, cols])
+
+    def test_random_star_coloring(self):
+        for _ in range(20):
+            n = self.rng.randint(2, 20)
+            A = np.tril(self.rng.rand(n, n) < 0.3) | np.eye(n, dtype=np.bool)
+            rows, cols = np.nonzero(A)
+            colors = coloring.star_coloring(rows, cols, n)
+            H = np.zeros((n, n))
+            H[rows, cols] = self.rng.randn(rows.size)
+            H = H + np.tril(H, -1).T
+            B = np.dot(H, coloring.seed_matrix(colors))
+            vals = coloring.recover_hessian(B, rows, cols, colors)
+            assert np.allclose(vals, H[rows, cols])
+
+    def test_probe_pattern(self):
+        J = np.array([[1., 0., 2.], [0., 0., 3.]])
+        rows, cols = coloring.probe_pattern(lambda v: np.dot(J, v), 3)
+        assert sorted(zip(rows, cols)) == [(0, 0), (0, 2), (1, 2)]
@@ -1,5 +1,6 @@
 from nlp.model.nlpmodel import NLPModel, UnconstrainedNLPModel
 from nlp.tools.dercheck import DerivativeChecker
+import multiprocessing.dummy
 import numpy as np
 import pytest
 
@@ -117,3 +118,144 @@ def test_erroneous(erroneous_checker):
     m = erroneous_checker.model.ncon
     for j in xrange(m):
         assert (len(erroneous_checker.chess_errs[j]) == 0)
+
+
+def test_batches_and_pool():
+    model = Rosenbrock(10)
+    model.obj_block = lambda X: np.array([model.obj(X[:, j])
+                                          for j in xrange(X.shape[1])])
+    x = np.ones(model.nvar)
+    x[1::2] = -1
+    pool = multiprocessing.dummy.Pool(2)
+    for kwargs in ({'batch': 3}, {'batch': 4, 'pool': pool}):
+        dcheck = DerivativeChecker(model, x, tol=1.0e-4, **kwargs)
+        dcheck.check()
+        assert (len(dcheck.grad_errs) == 0)
+        assert (len(dcheck.hess_errs) == 0)
+    pool.close()
+    pool.join()
+
+
+def test_random_check():
+    model = Rosenbrock(10)
+    x = np.ones(model.nvar)
+    x[1::2] = -1
+    dcheck = DerivativeChecker(model, x, tol=1.0e-4)
+    dcheck.check(random=20)
+    assert (len(dcheck.random_errs) == 0)
+    assert (sorted(dcheck.random_bounds.keys()) == ['grad', 'hess'])
+
+    model = Erroneous(10)
+    dcheck = DerivativeChecker(model, np.random.random(model.nvar),
+                               tol=1.0e-5)
+    dcheck.check(random=20)
+    assert (sorted(dcheck.random_errs.keys()) == ['grad', 'hess', 'jac'])
+    assert (dcheck.random_bounds['chess'] < 1.0e-5)
+
+    with pytest.raises(ValueError):
+        dcheck.random_check(5)
+    with pytest.raises(ValueError):
+        dcheck.check(random=20, sparse=True)
+
+
+class SparseChain(NLPModel):
+    """f(x) = sum x[i]^2 x[i+1], c[i](x) = x[i] x[i+1].
+
+    Derivatives are in coordinate format. If `erroneous` is True, J[0, 1]
+    is wrong and H[n-1, n-2] is missing from the Hessian structure.
+    """
+
+    def __init__(self, nvar, erroneous=False, **kwargs):
+        super(SparseChain, self).__init__(nvar, m=nvar - 1, **kwargs)
+        self.erroneous = erroneous
+
+    def obj(self, x):
+        return np.sum(x[:-1]**2 * x[1:])
+
+    def grad(self, x):
+        g = np.zeros(self.nvar)
+        g[:-1] = 2 * x[:-1] * x[1:]
+        g[1:] += x[:-1]**2
+        return g
+
+    def cons(self, x):
+        return x[:-1] * x[1:]
+
+    def igrad(self, i, x):
+        g = np.zeros(self.nvar)
+        g[i] = x[i + 1]
+        g[i + 1] = x[i]
+        return g
+
+    def jac(self, x):
+        i = np.arange(self.ncon)
+        vals = np.concatenate((x[1:], x[:-1]))
+        if self.erroneous:
+            vals[self.ncon] += 1
+        return (vals, np.concatenate((i, i)), np.concatenate((i, i + 1)))
+
+    def hess(self, x, z=None, **kwargs):
+        obj_weight = kwargs.get('obj_weight', 1.0)
+        if z is None:
+            z = np.zeros(self.ncon)
+        i = np.arange(self.nvar - 1)
+        vals = np.concatenate((obj_weight * 2 * x[1:],
+                               obj_weight * 2 * x[:-1] - z))
+        rows = np.concatenate((i, i + 1))
+        cols = np.concatenate((i, i))
+        if self.erroneous:
+            return (vals[:-1], rows[:-1], cols[:-1])
+        return (vals, rows, cols)
+
+
+def test_sparse_check():
+    model = SparseChain(20)
+    dcheck = DerivativeChecker(model, np.random.random(model.nvar),
+                               tol=1.0e-5)
+    dcheck.check(sparse=True)
+    for errs in (dcheck.grad_errs, dcheck.jac_errs, dcheck.hess_errs,
+                 dcheck.jac_zero_errs, dcheck.hess_zero_errs):
+        assert (len(errs) == 0)
+    for k in xrange(model.ncon):
+        assert (len(dcheck.chess_errs[k]) == 0)
+        assert (len(dcheck.chess_zero_errs[k]) == 0)
+    # One difference per color instead of one per variable.
+    assert (model.cons.ncalls == 4)
+
+    model = SparseChain(20, erroneous=True)
+    n = model.nvar
+    dcheck = DerivativeChecker(model, np.random.random(n), tol=1.0e-5)
+    dcheck.check(sparse=True, chess=False)
+    assert (dcheck.jac_errs.keys() == [(0, 1)])
+    assert (len(dcheck.jac_zero_errs) == 0)
+    # The missing element may also spoil the recovery of its neighbors.
+    assert (dcheck.hess_zero_errs.keys() == [(n - 1, n - 2)])
+
+
+class ProductChain(SparseChain):
+    """`SparseChain` with Jacobian and Hessian products."""
+
+    def jtprod(self, x, y):
+        g = np.zeros(self.nvar)
+        g[:-1] = y * x[1:]
+        g[1:] += y * x[:-1]
+        return g
+
+    def hprod(self, x, z, v, **kwargs):
+        vals, rows, cols = self.hess(x, z, **kwargs)
+        Hv = np.zeros(self.nvar)
+        np.add.at(Hv, rows, vals * v[cols])
+        off = rows != cols
+        np.add.at(Hv, cols[off], vals[off] * v[rows[off]])
+        return Hv
+
+
+def test_random_chess_products():
+    model = ProductChain(10)
+    dcheck = DerivativeChecker(model, np.random.random(model.nvar),
+                               tol=1.0e-5)
+    dcheck.check(random=20, grad=False, hess=False, jac=False)
+    assert (len(dcheck.random_errs) == 0)
+    # The Jacobian is not evaluated at the perturbed points.
+    assert (model.jac.ncalls == 1)
+    assert (model.jtprod.ncalls == 40)
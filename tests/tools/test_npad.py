@@ -0,0 +1,64 @@
+from nlp.tools import npad
+import numpy as np
+
+
+def func(x):
+    """Vector function exercising each supported operation."""
+    A = np.arange(12, dtype=np.float).reshape(3, 4) / 10
+    y = np.exp(x[:2]) * np.sin(x[2:]) / (1 + x[1:3]**2)
+    z = npad.dot(A, np.tanh(x)) - 2.0**x[:3] + x[[0, 0, 3]]
+    M = x.reshape(2, 2)
+    w = npad.hstack([x[0] * x[1], npad.dot(x, x), np.log1p(x[2]**2),
+                     abs(x[3] - 3), x[0]**x[1], np.sqrt(x[3] + 2)])
+    f = y.sum() + np.sum(z**3) + npad.dot(M, M.T).sum(axis=0).dot(w[:2])
+    return (f, npad.concatenate([z, w / np.arctan(1 + x[1])]))
+
+
+def fd_jacobians(x, h=1.0e-6):
+    """Central-difference Jacobians of the outputs of func."""
+    cols = [[(a - b) / (2 * h) for (a, b) in
+             zip(npad.trace(func, x + h * e).evaluate(x + h * e),
+                 npad.trace(func, x - h * e).evaluate(x - h * e))]
+            for e in np.eye(x.size)]
+    return [np.array([c[k] for c in cols]).T for k in xrange(2)]
+
+
+class TestTape(object):
+
+    def setup_method(self, method):
+        self.x0 = np.array([0.1, 0.2, 0.3, 0.4])
+        self.x = np.array([0.5, -0.3, 0.8, 0.1])
+        self.tape = npad.trace(func, self.x0)
+
+    def test_evaluate(self):
+        # Values computed without a tape.
+        (f, c) = func(self.x)
+        (tf, tc) = self.tape.evaluate(self.x)
+        assert np.allclose(tf, f)
+        assert np.allclose(tc, c)
+
+    def test_products(self):
+        (g, J) = fd_jacobians(self.x)
+        v = np.array([1., -2., 0.5, 3.])
+        w = np.arange(9, dtype=np.float)
+        (gv, Jv) = self.tape.jvp(self.x, v)
+        assert np.allclose(gv, np.dot(g, v), atol=1.0e-6)
+        assert np.allclose(Jv, np.dot(J, v), atol=1.0e-6)
+        assert np.allclose(self.tape.vjp(self.x, [2.0, w]),
+                           2 * g + np.dot(w, J), atol=1.0e-6)
+        assert np.allclose(self.tape.vjp(self.x, [None, w]),
+                           np.dot(w, J), atol=1.0e-6)
+
+    def test_hvp(self):
+        h = 1.0e-6
+        v = np.array([1., -2., 0.5, 3.])
+        w = [2.0, np.arange(9, dtype=np.float)]
+        Hv = (self.tape.vjp(self.x + h * v, w) -
+              self.tape.vjp(self.x - h * v, w)) / (2 * h)
+        assert np.allclose(self.tape.hvp(self.x, w, v), Hv, atol=1.0e-5)
+
+    def test_size(self):
+        # One entry per array operation, independently of the size of x.
+        x = np.ones(1000)
+        tape = npad.trace(lambda x: np.sum((x[1:] - x[:-1]**2)**2), x)
+        assert len(tape) < 10
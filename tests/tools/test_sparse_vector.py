@@ -0,0 +1,59 @@
+from unittest import TestCase
+import numpy as np
+import pytest
+
+from nlp.tools import sparse_vector_class as sv
+
+
+class Test_SparseVector(TestCase):
+
+    def setUp(self):
+        self.a = sv.SparseVector(5, [3, 0], [3., 1.])
+        self.b = sv.SparseVector(5, {0: 2., 1: -1., 4: 5.})
+
+    def test_init(self):
+        a = self.a
+        assert a.nnz() == 2
+        assert np.all(a.ind == [0, 3])
+        assert a[3] == 3. and a[2] == 0
+        c = sv.SparseVector(3, [1, 1], [1., 2.])
+        assert c.nnz() == 1 and c[1] == 3.
+        with pytest.raises(IndexError):
+            sv.SparseVector(3, [3], [1.])
+
+    def test_setitem(self):
+        a = self.a
+        a[2] = 4.
+        assert np.all(a.ind == [0, 2, 3])
+        a[0] = 0
+        assert np.all(a.ind == [2, 3])
+        assert np.allclose(a.to_array(), [0, 0, 4, 3, 0])
+
+    def test_arithmetic(self):
+        a, b = self.a, self.b
+        A, B = a.to_array(), b.to_array()
+        assert np.allclose((a + b).to_array(), A + B)
+        assert np.allclose((a - b).to_array(), A - B)
+        assert np.allclose((a * b).to_array(), A * B)
+        assert np.allclose((2 * a).to_array(), 2 * A)
+        assert np.allclose((-a).to_array(), -A)
+        assert np.allclose(a + B, A + B)
+        assert np.allclose((a * B).to_array(), A * B)
+        assert np.allclose(a[1:4].to_array(), A[1:4])
+        a *= B
+        assert np.allclose(a.to_array(), A * B)
+
+    def test_dot(self):
+        a, b = self.a, self.b
+        assert sv.dot(a, b) == 2.
+        assert sv.dot(a, b.to_array()) == 2.
+        assert sv.dot(b.to_array(), a) == 2.
+        assert np.allclose(sv.norm(b), np.linalg.norm(b.to_array()))
+
+    def test_csr(self):
+        pytest.importorskip("scipy.sparse")
+        a, b = self.a, self.b
+        C = sv.csr_rows([a, b])
+        assert C.shape == (2, 5)
+        assert np.allclose(C.toarray(), [a.to_array(), b.to_array()])
+        assert np.allclose(a.to_csr().toarray(), a.to_array())